@@ -0,0 +1,196 @@
+"""
+تجميعات التحليلات الزمنية (يومية وأسبوعية) لكل مستخدم
+مهمة تجميع تدريجية تعيد حساب الدلاء (buckets) الحديثة فقط وتدمجها في
+مجموعة analytics_rollups، فتقرأ /analytics/overview عدد الدلاء بدلاً من عدد الفيديوهات
+دورة واحدة فقط تعمل في كل مرة (عقد في rollup_state) لأن حذف الدلاء القديمة
+يفترض أن دورة أخرى لا تكتب في نفس الوقت
+
+إعادة البناء الكامل (من مجلد backend):
+    python analytics_rollups.py --full
+"""
+import os
+import uuid
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"day": "day", "week": "week"}
+
+# الفيديوهات المنشورة خلال هذه المدة تُعاد تجميعها في كل دورة لأن مشاهداتها ما زالت تتغير
+ROLLUP_LOOKBACK_DAYS = int(os.environ.get('ROLLUP_LOOKBACK_DAYS', 30))
+ROLLUP_INTERVAL_MINUTES = int(os.environ.get('ROLLUP_INTERVAL_MINUTES', 60))
+# عقد يمنع تداخل دورتين (كل عملية API تجدول المهمة، و--full قد يعمل بجانبها)
+ROLLUP_LEASE_MINUTES = int(os.environ.get('ROLLUP_LEASE_MINUTES', 30))
+ROLLUP_STATE_ID = "analytics"
+
+METRICS = {
+    "views": "$analytics.views",
+    "likes": "$analytics.likes",
+    "comments": "$analytics.comments",
+    "watch_time_minutes": "$analytics.watch_time_minutes",
+}
+
+def _week_start(value: datetime) -> datetime:
+    """بداية الأسبوع (الاثنين) حتى لا تُعاد كتابة دلو أسبوعي بشكل جزئي"""
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+def rollup_pipeline(granularity: str, since: Optional[datetime], run_id: str) -> List[Dict[str, Any]]:
+    match: Dict[str, Any] = {"status": "published", "published_at": {"$type": "date"}}
+    if since is not None:
+        match["published_at"] = {"$gte": since}
+    
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "user_id": "$user_id",
+                "bucket": {"$dateTrunc": {"date": "$published_at", "unit": granularity, "startOfWeek": "monday"}}
+            },
+            "videos": {"$sum": 1},
+            **{metric: {"$sum": {"$ifNull": [path, 0]}} for metric, path in METRICS.items()}
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.user_id", ":", granularity, ":", {"$dateToString": {"date": "$_id.bucket"}}]},
+            "user_id": "$_id.user_id",
+            "granularity": granularity,
+            "bucket": "$_id.bucket",
+            "videos": 1,
+            **{metric: 1 for metric in METRICS},
+            "run_id": run_id,
+            "updated_at": "$$NOW"
+        }},
+        {"$merge": {"into": "analytics_rollups", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+    ]
+
+async def _acquire_lease(db, run_id: str) -> bool:
+    """حجز عقد التجميع في rollup_state؛ False إذا كانت دورة أخرى تعمل"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.rollup_state.update_one(
+            {"_id": ROLLUP_STATE_ID, "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+            {"$set": {"lease_owner": run_id, "lease_until": now + timedelta(minutes=ROLLUP_LEASE_MINUTES)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # المستند موجود والعقد ساري لدورة أخرى
+        return False
+    return True
+
+async def build_rollups(db, full: bool = False) -> bool:
+    """
+    بناء التجميعات. في الوضع التدريجي تُعاد فقط الدلاء التي تبدأ بعد
+    (الآن - ROLLUP_LOOKBACK_DAYS) مع محاذاتها لبداية الأسبوع
+    
+    Returns:
+        False إذا تم التخطي لأن دورة أخرى تحمل العقد
+    """
+    run_id = str(uuid.uuid4())
+    if not await _acquire_lease(db, run_id):
+        logger.info("Analytics rollups already running elsewhere, skipping")
+        return False
+    
+    since = None
+    if not full:
+        since = _week_start(datetime.now(timezone.utc) - timedelta(days=ROLLUP_LOOKBACK_DAYS))
+    
+    try:
+        await _build(db, since, run_id)
+    finally:
+        await db.rollup_state.update_one(
+            {"_id": ROLLUP_STATE_ID, "lease_owner": run_id},
+            {"$set": {"lease_until": None}}
+        )
+    return True
+
+async def _build(db, since: Optional[datetime], run_id: str):
+    for granularity in GRANULARITIES.values():
+        await db.videos.aggregate(rollup_pipeline(granularity, since, run_id)).to_list(length=None)
+        
+        # الدلاء التي لم تعد لها فيديوهات منشورة (حذف أو إلغاء نشر) لا يكتبها $merge،
+        # فتُحذف بعد الدمج حتى لا تبقى بأرقامها القديمة (وبدون فجوة أثناء إعادة البناء).
+        # العقد يضمن أنه لا توجد دورة أخرى كتبت دلاءً بمعرّف مختلف في هذه الأثناء
+        stale = {"granularity": granularity, "run_id": {"$ne": run_id}}
+        if since is not None:
+            stale["bucket"] = {"$gte": since}
+        result = await db.analytics_rollups.delete_many(stale)
+        if result.deleted_count:
+            logger.info(f"Removed {result.deleted_count} stale {granularity} rollup buckets")
+        
+        # تمديد العقد بين المراحل حتى لا تبدأ دورة أخرى أثناء إعادة بناء طويلة
+        await db.rollup_state.update_one(
+            {"_id": ROLLUP_STATE_ID, "lease_owner": run_id},
+            {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(minutes=ROLLUP_LEASE_MINUTES)}}
+        )
+    
+    await db.rollup_state.update_one(
+        {"_id": ROLLUP_STATE_ID, "lease_owner": run_id},
+        {"$set": {"last_run": datetime.now(timezone.utc), "since": since}}
+    )
+    logger.info(f"Analytics rollups rebuilt since {since or 'the beginning'}")
+
+async def get_analytics_overview(
+    db,
+    user_id: str,
+    start: Optional[datetime],
+    end: datetime,
+    granularity: str
+) -> Dict[str, Any]:
+    """مجموع المقاييس والخط الزمني من الدلاء ضمن [start, end) (بدون start: منذ البداية)"""
+    bucket_range: Dict[str, Any] = {"$lt": end}
+    if start is not None:
+        bucket_range["$gte"] = start
+    cursor = db.analytics_rollups.find(
+        {"user_id": user_id, "granularity": granularity, "bucket": bucket_range},
+        {"_id": 0, "bucket": 1, "videos": 1, **{metric: 1 for metric in METRICS}}
+    ).sort("bucket", ASCENDING)
+    
+    totals = {metric: 0 for metric in METRICS}
+    timeline = []
+    async for bucket in cursor:
+        for metric in METRICS:
+            totals[metric] += bucket.get(metric, 0)
+        # نفس شكل videos_timeline السابق (published_at, views) مع بقية مقاييس الدلو
+        timeline.append({"published_at": bucket.pop('bucket'), **bucket})
+    
+    engagement_rate = 0
+    if totals["views"] > 0:
+        engagement_rate = ((totals["likes"] + totals["comments"]) / totals["views"]) * 100
+    
+    return {
+        "total_views": totals["views"],
+        "total_likes": totals["likes"],
+        "total_comments": totals["comments"],
+        "total_watch_time_hours": round(totals["watch_time_minutes"] / 60, 2),
+        "engagement_rate": round(engagement_rate, 2),
+        "granularity": granularity,
+        "videos_timeline": timeline
+    }
+
+async def _main(full: bool):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        # إعادة البناء اليدوية تنتظر انتهاء الدورة المجدولة الجارية بدل تخطيها
+        while not await build_rollups(client[os.environ['DB_NAME']], full=full):
+            await asyncio.sleep(10)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build analytics rollups")
+    parser.add_argument("--full", action="store_true", help="إعادة بناء كل الدلاء من البداية")
+    args = parser.parse_args()
+    asyncio.run(_main(args.full))
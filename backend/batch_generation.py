@@ -0,0 +1,190 @@
+"""
+توليد المحتوى لمجموعة فيديوهات دفعة واحدة
+- يُنشأ فيديو لكل عنصر مطلوب؛ العناصر ذات الموضوع المتطابق (بعد التطبيع) تتشارك
+  استدعاء توليد واحداً ثم يُنسخ المحتوى إلى بقية فيديوهاتها
+- مهمة طابور واحدة للدفعة تولد العناصر بالتوازي، مع حد أقصى للتزامن
+  لكل مفتاح API (المفتاح المشترك في الخادم له حد واحد لجميع المستخدمين)
+- تقدم كل عنصر يُقرأ من حالة الفيديو الخاص به
+- فشل عنصر يعيد مهمة الدفعة مع التراجع، وإعادة المحاولة تولد العناصر غير المكتملة فقط
+"""
+import os
+import uuid
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from generation_cache import normalize_text
+from job_queue import enqueue
+from rate_limits import key_scope
+from models import VideoCreate
+from video_pipeline import (
+    CONTENT_PROVIDER,
+    generate_video_content_job,
+    insert_video,
+    mark_video_failed,
+    resolve_provider_keys,
+    video_from_create,
+)
+
+logger = logging.getLogger(__name__)
+
+GENERATE_BATCH_JOB = "generate_batch"
+
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 50))
+BATCH_PROVIDER_CONCURRENCY = int(os.environ.get('BATCH_PROVIDER_CONCURRENCY', 5))
+
+IN_PROGRESS_STATUSES = ("pending", "processing")
+
+def generation_key(topic: str, video_length: str, provider: Optional[str], model: Optional[str]) -> Tuple[str, str, str, str]:
+    """العناصر التي تعطي نفس المفتاح تنتج نفس المحتوى فيكفيها استدعاء توليد واحد"""
+    return (
+        normalize_text(topic),
+        normalize_text(video_length),
+        provider or CONTENT_PROVIDER,
+        model or ""
+    )
+
+class ProviderLimiter:
+    """Semaphore لكل (مزود، مفتاح API) داخل عملية العامل"""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphores: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+    
+    def slot(self, provider: str, api_key: Optional[str]) -> asyncio.Semaphore:
+        # بصمة المفتاح بدل المستخدم: من يستخدمون مفتاح الخادم المشترك يتشاركون نفس الحد
+        key = (provider, key_scope(api_key) if api_key else "")
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.limit)
+        return self._semaphores[key]
+
+provider_limiter = ProviderLimiter(BATCH_PROVIDER_CONCURRENCY)
+
+async def create_batch(db, user_id: str, items: List[VideoCreate]) -> Tuple[dict, List[dict]]:
+    """
+    حفظ فيديو لكل عنصر وإضافة مهمة توليد الدفعة
+    
+    Returns:
+        (مستند الدفعة، الفيديوهات التي تم إنشاؤها)
+    """
+    first_seen: Dict[Tuple[str, str, str, str], int] = {}
+    entries = []
+    videos = []
+    for index, item in enumerate(items):
+        key = generation_key(item.topic, item.video_length, item.content_provider, item.selected_model)
+        video_dict = await insert_video(db, video_from_create(item, user_id))
+        entries.append({"index": index, "video_id": video_dict['id'], "shares_content_with": first_seen.get(key)})
+        first_seen.setdefault(key, index)
+        videos.append(video_dict)
+    
+    batch = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "video_ids": [video['id'] for video in videos],
+        "items": entries,
+        "created_at": datetime.now(timezone.utc)
+    }
+    await db.video_batches.insert_one(dict(batch))
+    await enqueue(db, GENERATE_BATCH_JOB, {"batch_id": batch['id']})
+    return batch, videos
+
+async def _gather_all(coroutines):
+    """انتظار كل العناصر حتى لو فشل بعضها، ثم رفع أول خطأ حتى يعيد الطابور المحاولة"""
+    results = await asyncio.gather(*coroutines, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
+async def _generate_group(db, videos: List[dict], keys: Dict[str, str]):
+    """
+    توليد المحتوى مرة واحدة لأول فيديو في المجموعة ثم نسخه إلى البقية.
+    أخطاء التوليد تُرفع: يبقى الفيديو pending/processing فتعيد مهمة الدفعة
+    المحاولة مع التراجع، وتُعلَّم failed فقط عند نفاد المحاولات (on_generate_batch_dead)
+    """
+    leader, followers = videos[0], videos[1:]
+    provider = leader.get('content_provider') or CONTENT_PROVIDER
+    async with provider_limiter.slot(provider, keys.get(provider)):
+        # إذا فشل الأول تنتظر البقية إعادة المحاولة بدل تكرار نفس الاستدعاء الفاشل
+        await generate_video_content_job(db, leader['id'])
+    
+    content = await db.videos.find_one(
+        {"id": leader['id']},
+        {"_id": 0, "title": 1, "description": 1, "hashtags": 1, "script": 1}
+    )
+    
+    async def _follow(follower: dict):
+        if content and content.get('script') and follower.get('script') is None:
+            await db.videos.update_one({"id": follower['id'], "script": None}, {"$set": content})
+            await generate_video_content_job(db, follower['id'])
+            return
+        async with provider_limiter.slot(provider, keys.get(provider)):
+            await generate_video_content_job(db, follower['id'])
+    
+    await _gather_all(_follow(follower) for follower in followers)
+
+async def handle_generate_batch(db, job: dict):
+    batch = await db.video_batches.find_one({"id": job['payload']['batch_id']}, {"_id": 0})
+    if not batch:
+        logger.error(f"Batch {job['payload']['batch_id']} not found")
+        return
+    
+    # عند إعادة المحاولة تُتخطى العناصر التي انتهت
+    videos = await db.videos.find(
+        {"id": {"$in": batch['video_ids']}, "status": {"$in": list(IN_PROGRESS_STATUSES)}},
+        {"_id": 0, "id": 1, "topic": 1, "video_length": 1, "content_provider": 1, "selected_model": 1, "script": 1}
+    ).to_list(length=None)
+    if not videos:
+        return
+    
+    user = await db.users.find_one({"id": batch['user_id']}, {"_id": 0})
+    keys = await resolve_provider_keys(user) if user else {}
+    
+    groups: Dict[Tuple[str, str, str, str], List[dict]] = {}
+    for video in videos:
+        key = generation_key(video['topic'], video['video_length'], video.get('content_provider'), video.get('selected_model'))
+        groups.setdefault(key, []).append(video)
+    
+    await _gather_all(_generate_group(db, group, keys) for group in groups.values())
+
+async def on_generate_batch_dead(db, job: dict):
+    batch = await db.video_batches.find_one({"id": job['payload']['batch_id']}, {"_id": 0, "video_ids": 1})
+    if not batch:
+        return
+    async for video in db.videos.find(
+        {"id": {"$in": batch['video_ids']}, "status": {"$in": list(IN_PROGRESS_STATUSES)}},
+        {"_id": 0, "id": 1}
+    ):
+        await mark_video_failed(db, video['id'], job.get('last_error') or "فشل إنشاء الفيديو")
+
+async def get_batch_progress(db, batch_id: str, user_id: str) -> Optional[dict]:
+    batch = await db.video_batches.find_one({"id": batch_id, "user_id": user_id}, {"_id": 0})
+    if not batch:
+        return None
+    
+    videos = await db.videos.find(
+        {"id": {"$in": batch['video_ids']}},
+        {"_id": 0, "id": 1, "status": 1, "title": 1, "error": 1}
+    ).to_list(length=None)
+    by_id = {video['id']: video for video in videos}
+    
+    counts = Counter(video.get('status') for video in videos)
+    items = []
+    for entry in batch['items']:
+        video = by_id.get(entry['video_id'], {})
+        items.append({
+            **entry,
+            "status": video.get('status', "deleted"),
+            "title": video.get('title'),
+            "error": video.get('error')
+        })
+    
+    return {
+        "id": batch['id'],
+        "total": len(batch['video_ids']),
+        "done": len(videos) - sum(counts[status] for status in IN_PROGRESS_STATUSES),
+        "counts": dict(counts),
+        "items": items,
+        "created_at": batch['created_at']
+    }
@@ -0,0 +1,60 @@
+"""
+قياس زمن p99 لـ /api/auth/me أثناء إغراق /api/auth/login بطلبات متوازية
+
+يتطلب خادماً يعمل:
+    uvicorn server:app --port 8001
+    BENCH_BASE_URL=http://localhost:8001 python -m benchmarks.bench_auth_concurrency
+"""
+import os
+import time
+import uuid
+import asyncio
+import statistics
+
+import httpx
+
+BASE_URL = os.environ.get('BENCH_BASE_URL', 'http://localhost:8001')
+LOGIN_CONCURRENCY = int(os.environ.get('BENCH_LOGIN_CONCURRENCY', 16))
+DURATION_SECONDS = float(os.environ.get('BENCH_DURATION_SECONDS', 10))
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+async def hammer_logins(client, credentials, stop_at, counters):
+    while time.perf_counter() < stop_at:
+        response = await client.post("/api/auth/login", json=credentials)
+        counters[response.status_code] = counters.get(response.status_code, 0) + 1
+
+async def probe_me(client, token, stop_at, latencies):
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        await client.get("/api/auth/me", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+async def main():
+    credentials = {"email": f"bench-{uuid.uuid4().hex[:8]}@example.com", "password": "bench-password"}
+    
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60.0) as client:
+        response = await client.post("/api/auth/register", json=credentials)
+        response.raise_for_status()
+        token = response.json()['access_token']
+        
+        stop_at = time.perf_counter() + DURATION_SECONDS
+        latencies = []
+        login_statuses = {}
+        await asyncio.gather(
+            probe_me(client, token, stop_at, latencies),
+            *[hammer_logins(client, credentials, stop_at, login_statuses) for _ in range(LOGIN_CONCURRENCY)]
+        )
+    
+    print(f"/api/auth/me samples: {len(latencies)}")
+    print(f"p50: {statistics.median(latencies):.1f} ms")
+    print(f"p99: {percentile(latencies, 99):.1f} ms")
+    print(f"login responses by status: {login_statuses}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+"""
+زمن أول جزء مقابل زمن الرد الكامل لبث /chat/test ضد مزود محلي وهمي
+الخادم الوهمي يحاكي Gemini (streamGenerateContent?alt=sse) وOpenRouter (stream=true)
+ويرسل جزءاً كل CHUNK_DELAY ثانية
+
+التشغيل (من مجلد backend):
+    python -m benchmarks.bench_chat_stream
+"""
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from chat_stream import stream_chat_events, stream_gemini, stream_openrouter
+
+CHUNKS = ["مرحباً", "، ", "كيف ", "يمكنني ", "مساعدتك ", "اليوم؟"] * 5
+CHUNK_DELAY = 0.05
+
+class _FakeUpstream(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        
+        if ":streamGenerateContent" in self.path:
+            events = [{"candidates": [{"content": {"parts": [{"text": text}]}}]} for text in CHUNKS]
+        else:
+            self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+            events = [{"choices": [{"delta": {"content": text}}]} for text in CHUNKS]
+        
+        for event in events:
+            time.sleep(CHUNK_DELAY)
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        if ":streamGenerateContent" not in self.path:
+            self.wfile.write(b"data: [DONE]\n\n")
+    
+    def log_message(self, *args):
+        pass
+
+async def measure(label, tokens):
+    start = time.perf_counter()
+    first = None
+    last = b""
+    async for event in stream_chat_events(tokens, label, "fake-model"):
+        if first is None:
+            first = time.perf_counter() - start
+        last = event
+    total = time.perf_counter() - start
+    done = json.loads(last.decode('utf-8').split("data: ", 1)[1])
+    assert done["response"] == "".join(CHUNKS), done
+    print(f"{label}: first token {first * 1000:.0f} ms, full response {total * 1000:.0f} ms")
+
+async def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeUpstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    
+    try:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            await measure("gemini", stream_gemini(client, "fake-key", "gemini-2.5-flash", "مرحبا", base_url=base_url))
+            await measure("openrouter", stream_openrouter(client, "fake-key", "openai/gpt-4o", "مرحبا", base_url=base_url))
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
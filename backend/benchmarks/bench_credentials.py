@@ -0,0 +1,41 @@
+"""
+قياس مسار الإصابة والإخفاق في ذاكرة بيانات الاعتماد المؤقتة
+
+التشغيل (من مجلد backend):
+    python -m benchmarks.bench_credentials
+"""
+import asyncio
+import time
+
+from credentials import CredentialResolver
+from encryption import encrypt_credentials
+
+from benchmarks.bench_encryption import SAMPLE_KEYS
+
+async def run(iterations: int = 2000):
+    user = {
+        "id": "bench-user",
+        "api_keys": {svc: encrypt_credentials(creds) for svc, creds in SAMPLE_KEYS.items()}
+    }
+    resolver = CredentialResolver(maxsize=1024, ttl=300)
+    
+    # إخفاق: مسح الذاكرة قبل كل استدعاء
+    start = time.perf_counter()
+    for _ in range(iterations):
+        resolver.clear()
+        await resolver.get(user, "youtube")
+    miss = (time.perf_counter() - start) / iterations * 1_000_000
+    
+    # إصابة: نفس المستخدم والخدمة
+    await resolver.get(user, "youtube")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await resolver.get(user, "youtube")
+    hit = (time.perf_counter() - start) / iterations * 1_000_000
+    
+    print(f"cache miss: {miss:.1f} us/call")
+    print(f"cache hit:  {hit:.2f} us/call")
+    print(resolver.stats())
+
+if __name__ == "__main__":
+    asyncio.run(run())
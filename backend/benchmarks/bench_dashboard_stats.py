@@ -0,0 +1,83 @@
+"""
+مقارنة الطريقة القديمة (5 رحلات) بالتجميع الواحد لـ /dashboard/stats
+على بيانات محلية من 100 ألف فيديو
+
+يتطلب mongod محلياً:
+    MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_dashboard_stats
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from indexes import ensure_indexes
+from user_stats import compute_dashboard_stats
+
+USER_ID = "bench-dashboard-user"
+VIDEO_COUNT = int(os.environ.get('BENCH_VIDEO_COUNT', 100_000))
+STATUSES = ["pending", "processing", "completed", "published", "failed"]
+
+async def seed(db):
+    await db.videos.delete_many({"user_id": USER_ID})
+    await db.campaigns.delete_many({"user_id": USER_ID})
+    batch = []
+    for _ in range(VIDEO_COUNT):
+        batch.append({
+            "id": str(uuid.uuid4()),
+            "user_id": USER_ID,
+            "status": random.choice(STATUSES),
+            "analytics": {"views": random.randint(0, 10_000)}
+        })
+        if len(batch) == 10_000:
+            await db.videos.insert_many(batch)
+            batch = []
+    if batch:
+        await db.videos.insert_many(batch)
+    await db.campaigns.insert_many([
+        {"id": str(uuid.uuid4()), "user_id": USER_ID, "status": random.choice(["active", "paused"])}
+        for _ in range(50)
+    ])
+
+async def old_stats(db):
+    """السلوك السابق: 4 count_documents + مؤشر على أول 100 فيديو"""
+    total_videos = await db.videos.count_documents({"user_id": USER_ID})
+    published_videos = await db.videos.count_documents({"user_id": USER_ID, "status": "published"})
+    pending_videos = await db.videos.count_documents({"user_id": USER_ID, "status": {"$in": ["pending", "processing"]}})
+    total_views = 0
+    async for video in db.videos.find(
+        {"user_id": USER_ID, "analytics.views": {"$exists": True}},
+        {"_id": 0, "analytics.views": 1}
+    ).limit(100):
+        total_views += video.get('analytics', {}).get('views', 0)
+    active_campaigns = await db.campaigns.count_documents({"user_id": USER_ID, "status": "active"})
+    return {
+        "total_videos": total_videos,
+        "published_videos": published_videos,
+        "pending_videos": pending_videos,
+        "total_views": total_views,
+        "active_campaigns": active_campaigns
+    }
+
+async def timed(label, fn, db, runs=20):
+    result = await fn(db)
+    start = time.perf_counter()
+    for _ in range(runs):
+        await fn(db)
+    print(f"{label}: {(time.perf_counter() - start) / runs * 1000:.1f} ms -> {result}")
+
+async def main():
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('BENCH_DB_NAME', 'youai_bench')]
+    try:
+        await ensure_indexes(db)
+        await seed(db)
+        await timed("old (5 round trips, first 100 views)", old_stats, db)
+        await timed("aggregation (1 round trip, all views)", lambda d: compute_dashboard_stats(d, USER_ID), db)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+"""
+قياس تكلفة تشفير/فك تشفير المفاتيح قبل وبعد تخزين مفتاح Fernet
+
+التشغيل (من مجلد backend):
+    python -m benchmarks.bench_encryption
+"""
+import os
+import time
+
+import encryption
+from encryption import derive_fernet, decrypt_credentials, encrypt_credentials, key_manager, DEFAULT_SECRET
+
+# مستخدم نموذجي: 6 خدمات وحوالي 10 حقول
+SAMPLE_KEYS = {
+    "gemini": {"api_key": "AIzaSyD-example-gemini-key-000000000"},
+    "kie_ai": {"api_key": "kie-example-key-0000000000000"},
+    "openrouter": {"api_key": "sk-or-v1-example-openrouter-key-0000"},
+    "youtube": {
+        "client_id": "1234.apps.googleusercontent.com",
+        "client_secret": "GOCSPX-example",
+        "api_key": "AIzaSyD-example-youtube-key-00000000",
+    },
+    "google_drive": {"credentials_json": '{"type": "service_account"}', "folder_id": "folder"},
+    "google_sheets": {"sheet_id": "1" * 40},
+}
+
+
+def _time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    encrypted = {svc: encrypt_credentials(creds) for svc, creds in SAMPLE_KEYS.items()}
+
+    def decrypt_all():
+        for creds in encrypted.values():
+            decrypt_credentials(creds)
+
+    # قبل: اشتقاق المفتاح في كل استدعاء (السلوك القديم)
+    original = encryption.get_encryption_key
+    encryption.get_encryption_key = lambda: derive_fernet(os.getenv('JWT_SECRET', DEFAULT_SECRET))
+    try:
+        before = _time_per_call(decrypt_all, 3)
+    finally:
+        encryption.get_encryption_key = original
+
+    # بعد: مفتاح مشتق مرة واحدة ومعاد استخدامه
+    key_manager.reset()
+    after = _time_per_call(decrypt_all, 200)
+
+    print(f"decrypt all services (before): {before:.2f} ms/call")
+    print(f"decrypt all services (after):  {after:.3f} ms/call")
+    print(f"speedup: x{before / after:.0f}")
+
+
+if __name__ == "__main__":
+    main()
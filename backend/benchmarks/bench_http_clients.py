@@ -0,0 +1,72 @@
+"""
+مقارنة عميل جديد لكل طلب مقابل العميل المجمّع ضد خادم محلي وهمي
+يطبع الزمن لكل طلب وعدد اتصالات TCP التي فتحها الخادم
+الخادم الوهمي HTTP عادي، فالفرق يقيس فتح اتصال TCP وإنشاء العميل فقط؛
+مع مزودين حقيقيين عبر TLS يضاف زمن المصافحة لكل اتصال جديد
+
+التشغيل (من مجلد backend):
+    python -m benchmarks.bench_http_clients
+"""
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from http_clients import HTTPClientPool, UpstreamConfig
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # الرأس والجسم في كتابة واحدة مع TCP_NODELAY؛ الكتابات غير المخزنة تسبب
+    # تأخير Nagle/delayed-ACK (~40 ms) يطغى على تكلفة فتح الاتصال
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    connections = 0
+    
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+    
+    def do_GET(self):
+        body = b'{"data": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+async def _per_request(url: str, n: int):
+    for _ in range(n):
+        async with httpx.AsyncClient(timeout=15.0) as client:
+            await client.get(url)
+
+async def _pooled(url: str, n: int):
+    pool = HTTPClientPool({"stub": UpstreamConfig()})
+    await pool.startup()
+    try:
+        for _ in range(n):
+            await pool.get("stub").get(url)
+    finally:
+        await pool.shutdown()
+
+async def main(n: int = 500):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/models"
+    
+    try:
+        for label, fn in (("new client per request", _per_request), ("pooled client", _pooled)):
+            _StubHandler.connections = 0
+            start = time.perf_counter()
+            await fn(url, n)
+            elapsed = (time.perf_counter() - start) / n * 1000
+            print(f"{label}: {elapsed:.3f} ms/request, {_StubHandler.connections} connections")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+مقارنة تكلفة تسلسل صفحة من 1000 فيديو:
+المسار الافتراضي لـ FastAPI (تحقق Pydantic ثم jsonable_encoder ثم json) مقابل FastJSONResponse
+
+التشغيل (من مجلد backend):
+    python -m benchmarks.bench_serialization
+"""
+import json
+import time
+import uuid
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import Video
+from serialization import FastJSONResponse
+
+VIDEO_COUNT = 1000
+STATUSES = ["pending", "processing", "completed", "published", "failed"]
+
+def sample_videos(count: int = VIDEO_COUNT) -> List[dict]:
+    """مستندات بالشكل الذي يعيده Motor (تواريخ بدون منطقة زمنية)"""
+    now = datetime.utcnow()
+    return [
+        Video(
+            user_id="bench-user",
+            topic=f"أفضل نصائح الإنتاجية رقم {i}",
+            title=f"أفضل نصائح الإنتاجية رقم {i}",
+            description="وصف قصير للفيديو " * 5,
+            hashtags=["#إنتاجية", "#نصائح", "#shorts"],
+            dimensions="16:9",
+            video_length="60 ثانية",
+            ai_generator="sora2",
+            script="نص السكريبت " * 50,
+            status=random.choice(STATUSES),
+            analytics={"views": random.randint(0, 10_000), "likes": random.randint(0, 500)},
+            created_at=now - timedelta(minutes=i),
+            id=str(uuid.uuid4())
+        ).model_dump()
+        for i in range(count)
+    ]
+
+def validated_default(videos):
+    """response_model=List[Video] مع الاستجابة الافتراضية"""
+    validated = TypeAdapter(List[Video]).validate_python(videos)
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode('utf-8')
+
+def default(videos):
+    """إرجاع dict من النقطة: jsonable_encoder ثم JSONResponse"""
+    return json.dumps(jsonable_encoder(videos), ensure_ascii=False).encode('utf-8')
+
+def fast(videos):
+    return FastJSONResponse(videos).body
+
+def timed(label, fn, videos, runs=50):
+    size = len(fn(videos))
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn(videos)
+    print(f"{label}: {(time.perf_counter() - start) / runs * 1000:.2f} ms ({size / 1024:.0f} KiB)")
+
+def main():
+    videos = sample_videos()
+    print(f"{len(videos)} videos")
+    timed("Pydantic validation + jsonable_encoder + json", validated_default, videos)
+    timed("jsonable_encoder + json", default, videos)
+    timed("FastJSONResponse (orjson)", fast, videos)
+
+if __name__ == "__main__":
+    main()
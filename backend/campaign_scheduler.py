@@ -0,0 +1,118 @@
+"""
+محرك تنفيذ الحملات
+يبحث عن الحملات المستحقة عبر استعلام مفهرس على next_run، ويحجزها
+بعملية compare-and-swap على next_run حتى لا تُنفَّذ حملة مرتين من
+مجدولَين متزامنين، ثم يضيف فيديو جديداً إلى طابور الإنشاء
+"""
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+from models import Video
+from video_pipeline import submit_video
+
+logger = logging.getLogger(__name__)
+
+FREQUENCY_INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "daily": timedelta(days=1),
+    "weekly": timedelta(weeks=1),
+    "monthly": timedelta(days=30),
+}
+
+CAMPAIGN_BATCH_SIZE = int(os.environ.get('CAMPAIGN_BATCH_SIZE', 200))
+CAMPAIGN_MAX_BATCHES_PER_TICK = int(os.environ.get('CAMPAIGN_MAX_BATCHES_PER_TICK', 10))
+CAMPAIGN_SCHEDULER_INTERVAL_SECONDS = int(os.environ.get('CAMPAIGN_SCHEDULER_INTERVAL_SECONDS', 60))
+
+def compute_next_run(frequency: str, previous: datetime, now: datetime) -> datetime:
+    """
+    الموعد التالي بعد previous. إذا فات أكثر من دورة (توقف المجدول مثلاً)
+    نتخطى الدورات الفائتة بدلاً من تنفيذها دفعة واحدة
+    """
+    interval = FREQUENCY_INTERVALS.get(frequency)
+    if interval is None:
+        logger.warning(f"Unknown campaign frequency '{frequency}', defaulting to daily")
+        interval = FREQUENCY_INTERVALS["daily"]
+    
+    if previous.tzinfo is None:
+        # Motor يرجع التواريخ بدون منطقة زمنية (UTC)
+        previous = previous.replace(tzinfo=timezone.utc)
+    
+    next_run = previous + interval
+    if next_run <= now:
+        next_run = now + interval
+    return next_run
+
+async def claim_campaign(db, campaign: dict, now: datetime) -> Optional[dict]:
+    """
+    حجز الحملة ذرياً: يتقدم next_run ويزيد videos_generated فقط إذا لم
+    يغيّر مجدول آخر next_run منذ قراءتها
+    """
+    return await db.campaigns.find_one_and_update(
+        {"id": campaign['id'], "status": "active", "next_run": campaign['next_run']},
+        {
+            "$set": {
+                "next_run": compute_next_run(campaign['frequency'], campaign['next_run'], now),
+                "last_run": now
+            },
+            "$inc": {"videos_generated": 1}
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def enqueue_campaign_video(db, campaign: dict) -> str:
+    video = Video(
+        user_id=campaign['user_id'],
+        topic=campaign['topic'],
+        title=campaign['topic'],
+        description="",
+        hashtags=[],
+        dimensions=campaign.get('dimensions', "16:9"),
+        video_length=campaign.get('video_length', "60 ثانية"),
+        ai_generator=campaign.get('ai_generator', "sora2"),
+        content_provider=campaign.get('content_provider'),
+        selected_model=campaign.get('selected_model')
+    )
+    await submit_video(db, video)
+    return video.id
+
+async def run_due_campaigns(db, now: Optional[datetime] = None, batch_size: int = CAMPAIGN_BATCH_SIZE) -> int:
+    """
+    تنفيذ دورة واحدة للمجدول
+    
+    Returns:
+        عدد الحملات التي تم تنفيذها
+    """
+    now = now or datetime.now(timezone.utc)
+    fired = 0
+    
+    for _ in range(CAMPAIGN_MAX_BATCHES_PER_TICK):
+        due = await db.campaigns.find(
+            {"status": "active", "next_run": {"$lte": now}},
+            {"_id": 0}
+        ).sort("next_run", ASCENDING).limit(batch_size).to_list(length=batch_size)
+        
+        if not due:
+            break
+        
+        for campaign in due:
+            claimed = await claim_campaign(db, campaign, now)
+            if claimed is None:
+                # حجزها مجدول آخر
+                continue
+            try:
+                await enqueue_campaign_video(db, claimed)
+                fired += 1
+            except Exception as e:
+                logger.error(f"Failed to enqueue video for campaign {claimed['id']}: {str(e)}")
+        
+        if len(due) < batch_size:
+            break
+    
+    if fired:
+        logger.info(f"Campaign scheduler fired {fired} campaigns")
+    return fired
@@ -0,0 +1,142 @@
+"""
+بث ردود الدردشة كـ Server-Sent Events
+يُرسَل كل جزء نصي فور وصوله من المزود بدل انتظار الرد الكامل
+- Gemini: streamGenerateContent?alt=sse
+- OpenRouter: chat/completions مع stream=true
+"""
+import os
+import json
+import logging
+from typing import Any, AsyncIterator, Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+GEMINI_API_BASE = os.environ.get('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')
+OPENROUTER_API_BASE = os.environ.get('OPENROUTER_API_BASE', 'https://openrouter.ai/api/v1')
+
+CHAT_TEST_SYSTEM_MESSAGE = "أنت مساعد ذكي ومفيد. أجب بشكل موجز ومباشر."
+
+PROVIDER_LABELS = {"gemini": "Gemini", "openrouter": "OpenRouter"}
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # منع nginx من تجميع الاستجابة قبل إرسالها
+    "X-Accel-Buffering": "no"
+}
+
+class ChatStreamError(Exception):
+    """فشل المزود قبل أو أثناء البث"""
+
+def sse_event(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+async def iter_sse_data(response: httpx.Response) -> AsyncIterator[str]:
+    """قيم حقول data من استجابة SSE (تُتجاهل التعليقات مثل ': OPENROUTER PROCESSING')"""
+    async for line in response.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        if data:
+            yield data
+
+async def _raise_for_upstream(response: httpx.Response, provider: str):
+    if response.status_code == 200:
+        return
+    body = await response.aread()
+    try:
+        error = json.loads(body).get('error', {})
+        message = error.get('message') if isinstance(error, dict) else str(error)
+    except (ValueError, AttributeError):
+        message = None
+    raise ChatStreamError(message or f"{provider} returned HTTP {response.status_code}")
+
+async def stream_gemini(
+    client: httpx.AsyncClient,
+    api_key: str,
+    model: str,
+    message: str,
+    system_message: str = CHAT_TEST_SYSTEM_MESSAGE,
+    base_url: str = GEMINI_API_BASE
+) -> AsyncIterator[str]:
+    async with client.stream(
+        "POST",
+        f"{base_url}/models/{model}:streamGenerateContent",
+        params={"alt": "sse"},
+        headers={"x-goog-api-key": api_key},
+        json={
+            "systemInstruction": {"parts": [{"text": system_message}]},
+            "contents": [{"role": "user", "parts": [{"text": message}]}]
+        }
+    ) as response:
+        await _raise_for_upstream(response, "Gemini")
+        async for data in iter_sse_data(response):
+            chunk = json.loads(data)
+            for candidate in chunk.get('candidates', []):
+                for part in candidate.get('content', {}).get('parts', []):
+                    if part.get('text'):
+                        yield part['text']
+
+async def stream_openrouter(
+    client: httpx.AsyncClient,
+    api_key: str,
+    model: str,
+    message: str,
+    system_message: str = CHAT_TEST_SYSTEM_MESSAGE,
+    base_url: str = OPENROUTER_API_BASE
+) -> AsyncIterator[str]:
+    async with client.stream(
+        "POST",
+        f"{base_url}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={
+            "model": model,
+            "stream": True,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": message}
+            ]
+        }
+    ) as response:
+        await _raise_for_upstream(response, "OpenRouter")
+        async for data in iter_sse_data(response):
+            chunk = json.loads(data)
+            if 'error' in chunk:
+                raise ChatStreamError(chunk['error'].get('message', 'خطأ غير معروف'))
+            for choice in chunk.get('choices', []):
+                text = (choice.get('delta') or {}).get('content')
+                if text:
+                    yield text
+
+async def stream_chat_events(tokens: AsyncIterator[str], provider: str, model: str) -> AsyncIterator[bytes]:
+    """
+    تحويل الأجزاء النصية إلى أحداث SSE:
+    token لكل جزء، ثم done مع الرد الكامل، أو error عند الفشل
+    """
+    parts = []
+    try:
+        async for text in tokens:
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        # أي فشل (من المزود أو من تحليل JSON) يُنهي البث بحدث error بدل قطع الاتصال
+        logger.error(f"{provider} chat stream error: {str(e)}")
+        yield sse_event("error", {
+            "success": False,
+            "response": f"❌ خطأ في الاتصال بـ {PROVIDER_LABELS.get(provider, provider)}: {str(e)}",
+            "error": "api_error"
+        })
+        return
+    
+    yield sse_event("done", {
+        "success": True,
+        "response": "".join(parts),
+        "provider": provider,
+        "model": model
+    })
+
+async def single_event(event: str, data: Dict[str, Any]) -> AsyncIterator[bytes]:
+    yield sse_event(event, data)
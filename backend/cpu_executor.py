@@ -0,0 +1,94 @@
+"""
+منفّذ مخصص للعمليات الثقيلة على المعالج (bcrypt وFernet/PBKDF2)
+حتى لا تُوقف حلقة asyncio أثناء معالجة الطلبات
+"""
+import os
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import bcrypt
+
+import encryption
+
+logger = logging.getLogger(__name__)
+
+class CPUExecutorSaturated(Exception):
+    """طابور المنفّذ ممتلئ - يُحوَّل إلى 503 في الخادم"""
+    pass
+
+class CPUExecutor:
+    """
+    مجمّع خيوط أو عمليات بعمق طابور محدود.
+    عند امتلاء الطابور يُرفض العمل فوراً بدلاً من تراكم الطلبات.
+    
+    Args:
+        kind: "thread" أو "process"
+        max_workers: عدد العمّال
+        max_queue: عدد المهام الإضافية المسموح بانتظارها
+    """
+    
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None, max_queue: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_queue = max_queue
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+    
+    @property
+    def pending(self) -> int:
+        return self._pending
+    
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cpu")
+        return self._pool
+    
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """تشغيل fn في المنفّذ، أو رفع CPUExecutorSaturated إن كان الطابور ممتلئاً"""
+        if self._pending >= self.max_workers + self.max_queue:
+            raise CPUExecutorSaturated()
+        
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args))
+        finally:
+            self._pending -= 1
+    
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+cpu_executor = CPUExecutor(
+    kind=os.environ.get('CPU_EXECUTOR_KIND', 'thread'),
+    max_workers=int(os.environ.get('CPU_EXECUTOR_WORKERS', 0)) or None,
+    max_queue=int(os.environ.get('CPU_EXECUTOR_MAX_QUEUE', 64))
+)
+
+# دوال على مستوى الوحدة حتى تكون قابلة للتسلسل (pickle) في مجمّع العمليات
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def _check_password(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+async def hash_password(password: str) -> str:
+    return await cpu_executor.run(_hash_password, password)
+
+async def check_password(password: str, password_hash: str) -> bool:
+    return await cpu_executor.run(_check_password, password, password_hash)
+
+async def encrypt_credentials(credentials: dict) -> dict:
+    return await cpu_executor.run(encryption.encrypt_credentials, credentials)
+
+async def decrypt_credentials(encrypted_creds: dict) -> dict:
+    return await cpu_executor.run(encryption.decrypt_credentials, encrypted_creds)
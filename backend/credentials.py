@@ -0,0 +1,79 @@
+"""
+محلّل بيانات الاعتماد: فك تشفير كسول لكل خدمة مع ذاكرة مؤقتة محدودة
+"""
+import os
+import logging
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+from cpu_executor import CPUExecutorSaturated, decrypt_credentials
+
+logger = logging.getLogger(__name__)
+
+class CredentialResolver:
+    """
+    يفك تشفير بيانات خدمة واحدة عند الطلب فقط، ويحتفظ بالنص الصريح
+    في ذاكرة TTL محدودة الحجم بمفتاح (user_id, service).
+    
+    يُخزَّن النص المشفر بجانب النص الصريح، فإذا تغيّرت البيانات في
+    قاعدة البيانات (من عامل آخر مثلاً) يُعاد فك التشفير تلقائياً.
+    """
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, user: dict, service: str) -> Dict[str, Any]:
+        """إرجاع بيانات اعتماد الخدمة بنص صريح (أو {} إن لم توجد)"""
+        encrypted = (user.get('api_keys') or {}).get(service)
+        if not encrypted:
+            return {}
+        
+        key = (user['id'], service)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == encrypted:
+            self.hits += 1
+            return entry[1]
+        
+        self.misses += 1
+        try:
+            decrypted = await decrypt_credentials(encrypted)
+        except CPUExecutorSaturated:
+            raise
+        except Exception as e:
+            logger.error(f"Error decrypting {service} keys: {str(e)}")
+            decrypted = {}
+        
+        self._cache[key] = (encrypted, decrypted)
+        return decrypted
+    
+    async def get_all(self, user: dict) -> Dict[str, Dict[str, Any]]:
+        """فك تشفير جميع خدمات المستخدم (عبر الذاكرة المؤقتة)"""
+        return {service: await self.get(user, service) for service in (user.get('api_keys') or {})}
+    
+    def invalidate(self, user_id: str, service: Optional[str] = None):
+        """حذف بيانات مستخدم من الذاكرة المؤقتة (خدمة واحدة أو جميع الخدمات)"""
+        if service is not None:
+            self._cache.pop((user_id, service), None)
+            return
+        
+        for key in [k for k in list(self._cache.keys()) if k[0] == user_id]:
+            self._cache.pop(key, None)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._cache),
+            "maxsize": int(self._cache.maxsize),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+credential_resolver = CredentialResolver(
+    maxsize=int(os.environ.get('CREDENTIAL_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('CREDENTIAL_CACHE_TTL_SECONDS', 300))
+)
@@ -6,14 +6,15 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
 import os
+import threading
 
 # ثابت Salt (يجب أن يكون نفسه دائماً)
 SALT = b'youai_encryption_salt_2025_secure'
 
-def get_encryption_key():
-    """توليد مفتاح التشفير من JWT_SECRET"""
-    jwt_secret = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
-    
+DEFAULT_SECRET = 'your-secret-key-change-in-production'
+
+def derive_fernet(secret: str) -> Fernet:
+    """اشتقاق مفتاح Fernet من السر عبر PBKDF2 (عملية مكلفة)"""
     kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
@@ -21,9 +22,45 @@ def get_encryption_key():
         iterations=100000,
     )
     
-    key = base64.urlsafe_b64encode(kdf.derive(jwt_secret.encode()))
+    key = base64.urlsafe_b64encode(kdf.derive(secret.encode()))
     return Fernet(key)
 
+class EncryptionKeyManager:
+    """
+    مدير مفتاح التشفير على مستوى العملية
+    يشتق المفتاح مرة واحدة لكل سر ويعيد استخدامه،
+    ويعيد الاشتقاق فقط عند تغيّر JWT_SECRET
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (السر, Fernet) كزوج واحد حتى تكون القراءة ذرية
+        self._cached = None
+    
+    def get(self) -> Fernet:
+        secret = os.getenv('JWT_SECRET', DEFAULT_SECRET)
+        cached = self._cached
+        if cached is not None and cached[0] == secret:
+            return cached[1]
+        
+        with self._lock:
+            cached = self._cached
+            if cached is None or cached[0] != secret:
+                cached = (secret, derive_fernet(secret))
+                self._cached = cached
+            return cached[1]
+    
+    def reset(self):
+        """مسح المفتاح المخزن (يُشتق من جديد عند الاستخدام التالي)"""
+        with self._lock:
+            self._cached = None
+
+key_manager = EncryptionKeyManager()
+
+def get_encryption_key():
+    """إرجاع مفتاح التشفير المشتق من JWT_SECRET (مخزن مؤقتاً)"""
+    return key_manager.get()
+
 def encrypt_api_key(api_key: str) -> str:
     """
     تشفير مفتاح API
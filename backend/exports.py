@@ -0,0 +1,74 @@
+"""
+تصدير فيديوهات المستخدم وتحليلاتها بشكل متدفق (NDJSON أو CSV)
+يُقرأ مؤشر Motor على دفعات محدودة فتبقى الذاكرة ثابتة مهما كان عدد الفيديوهات
+"""
+import io
+import os
+import csv
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+
+from serialization import dumps
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+EXPORT_FIELDS: List[str] = [
+    "id", "topic", "title", "status", "dimensions", "video_length", "ai_generator",
+    "schedule_type", "scheduled_time", "created_at", "published_at", "youtube_video_id",
+    "views", "likes", "comments", "watch_time_minutes"
+]
+
+ANALYTICS_FIELDS = ("views", "likes", "comments", "watch_time_minutes")
+
+EXPORT_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in EXPORT_FIELDS if field not in ANALYTICS_FIELDS},
+    "analytics": 1
+}
+
+def _flatten(video: Dict[str, Any]) -> Dict[str, Any]:
+    """صف واحد: حقول الفيديو مع حقول التحليلات في المستوى الأول"""
+    analytics = video.get('analytics') or {}
+    row = {}
+    for field in EXPORT_FIELDS:
+        value = analytics.get(field, 0) if field in ANALYTICS_FIELDS else video.get(field)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        row[field] = value
+    return row
+
+def export_cursor(db, user_id: str):
+    return db.videos.find(
+        {"user_id": user_id},
+        EXPORT_PROJECTION
+    ).sort("created_at", -1).batch_size(EXPORT_BATCH_SIZE)
+
+async def iter_ndjson(cursor) -> AsyncIterator[bytes]:
+    lines = []
+    async for video in cursor:
+        lines.append(dumps(_flatten(video)))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+async def iter_csv(cursor) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    # BOM حتى يعرض Excel النص العربي بشكل صحيح
+    buffer.write('\ufeff')
+    writer.writeheader()
+    
+    rows = 0
+    async for video in cursor:
+        writer.writerow(_flatten(video))
+        rows += 1
+        if rows >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            rows = 0
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
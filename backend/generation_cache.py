@@ -0,0 +1,131 @@
+"""
+ذاكرة مؤقتة لنتائج توليد المحتوى في MongoDB
+المفتاح: الموضوع بعد التطبيع + مدة الفيديو + المزود + النموذج + إصدار الـ prompt
+حتى تعيد الطلبات المتطابقة (أو شبه المتطابقة) استخدام نفس السكريبت بدل استدعاء جديد للنموذج
+- انتهاء الصلاحية عبر فهرس TTL على expires_at
+- حد أقصى لعدد الإدخالات: تُحذف الأقدم استخداماً عند تجاوزه
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_COLLECTION = "generation_cache"
+
+# التشكيل (الفتحة... السكون، الألف الخنجرية) والتطويل
+_ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_WHITESPACE = re.compile(r'\s+')
+
+_ARABIC_LETTER_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ی': 'ي',
+    'ة': 'ه',
+    # الأرقام العربية والفارسية
+    **{chr(0x0660 + d): str(d) for d in range(10)},
+    **{chr(0x06f0 + d): str(d) for d in range(10)},
+})
+
+def normalize_text(text: str) -> str:
+    """
+    تطبيع النص العربي للمقارنة: إزالة التشكيل والتطويل، توحيد أشكال الألف
+    والياء والتاء المربوطة والأرقام، حذف علامات الترقيم وتوحيد المسافات
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    text = _ARABIC_DIACRITICS.sub('', text)
+    text = text.translate(_ARABIC_LETTER_VARIANTS)
+    text = ''.join(
+        ' ' if unicodedata.category(ch)[0] in ('P', 'S') else ch
+        for ch in text
+    )
+    return _WHITESPACE.sub(' ', text).strip().casefold()
+
+def generation_cache_key(
+    topic: str,
+    video_length: str,
+    provider: str,
+    model: str,
+    prompt_version: str
+) -> str:
+    raw = json.dumps(
+        [prompt_version, provider, model, normalize_text(video_length), normalize_text(topic)],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class GenerationCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stores = 0
+        self.evictions = 0
+    
+    async def get(self, db, key: str) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        entry = await db[GENERATION_CACHE_COLLECTION].find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+            projection={"content": 1}
+        )
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry['content']
+    
+    async def put(self, db, key: str, content: Dict[str, Any], **metadata):
+        """تخزين نتيجة ناجحة فقط؛ المحتوى الاحتياطي عند الفشل لا يُخزَّن"""
+        now = datetime.now(timezone.utc)
+        await db[GENERATION_CACHE_COLLECTION].replace_one(
+            {"_id": key},
+            {
+                **metadata,
+                "content": content,
+                "hits": 0,
+                "created_at": now,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl)
+            },
+            upsert=True
+        )
+        self.stores += 1
+        await self.evict_overflow(db)
+    
+    async def evict_overflow(self, db) -> int:
+        collection = db[GENERATION_CACHE_COLLECTION]
+        overflow = await collection.estimated_document_count() - self.max_entries
+        if overflow <= 0:
+            return 0
+        
+        oldest = await collection.find({}, {"_id": 1}).sort("last_used_at", 1).limit(overflow).to_list(length=overflow)
+        result = await collection.delete_many({"_id": {"$in": [doc['_id'] for doc in oldest]}})
+        self.evictions += result.deleted_count
+        return result.deleted_count
+    
+    def record_bypass(self):
+        self.bypassed += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "evictions": self.evictions
+        }
+
+generation_cache = GenerationCache(
+    max_entries=int(os.environ.get('GENERATION_CACHE_MAX_ENTRIES', 10000)),
+    ttl=float(os.environ.get('GENERATION_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+)
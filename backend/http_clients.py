@@ -0,0 +1,86 @@
+"""
+طبقة HTTP مشتركة: عميل httpx مجمّع لكل مزود خارجي
+يُنشأ عند بدء التطبيق ويُغلق عند الإيقاف لإعادة استخدام اتصالات TCP/TLS
+"""
+import os
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class UpstreamConfig:
+    timeout: float = 15.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+def _env_config(name: str, default_timeout: float) -> UpstreamConfig:
+    """قراءة إعدادات المزود من متغيرات البيئة (مثال: OPENROUTER_HTTP_TIMEOUT)"""
+    prefix = name.upper()
+    return UpstreamConfig(
+        timeout=float(os.environ.get(f'{prefix}_HTTP_TIMEOUT', default_timeout)),
+        max_connections=int(os.environ.get('HTTP_MAX_CONNECTIONS', 100)),
+        max_keepalive_connections=int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20)),
+        keepalive_expiry=float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', 30)),
+        http2=os.environ.get('HTTP2_ENABLED', 'false').lower() == 'true'
+    )
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class HTTPClientPool:
+    """عميل httpx.AsyncClient واحد لكل مزود (gemini, openrouter, youtube)"""
+    
+    def __init__(self, upstreams: Dict[str, UpstreamConfig]):
+        self.upstreams = upstreams
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+    
+    def _create(self, name: str) -> httpx.AsyncClient:
+        config = self.upstreams[name]
+        http2 = config.http2
+        if http2 and not _http2_available():
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, falling back to HTTP/1.1")
+            http2 = False
+        
+        return httpx.AsyncClient(
+            timeout=config.timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.max_connections,
+                max_keepalive_connections=config.max_keepalive_connections,
+                keepalive_expiry=config.keepalive_expiry
+            )
+        )
+    
+    async def startup(self):
+        for name in self.upstreams:
+            if name not in self._clients:
+                self._clients[name] = self._create(name)
+    
+    async def shutdown(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+    
+    def get(self, name: str) -> httpx.AsyncClient:
+        """إرجاع العميل المجمّع للمزود (يُنشأ عند أول استخدام إن لم يبدأ التطبيق بعد)"""
+        client: Optional[httpx.AsyncClient] = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+http_clients = HTTPClientPool({
+    "gemini": _env_config("gemini", 15.0),
+    "openrouter": _env_config("openrouter", 30.0),
+    "youtube": _env_config("youtube", 15.0),
+})
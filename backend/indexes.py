@@ -0,0 +1,161 @@
+"""
+إدارة فهارس MongoDB
+- ensure_indexes: إنشاء جميع الفهارس المطلوبة (idempotent) عند بدء التشغيل
+- ENDPOINT_QUERIES: استعلامات الـ endpoints والمهام الدورية التي تتحقق
+  tests/test_query_plans.py عبر explain() من أنها لا تنتج COLLSCAN أو SORT في الذاكرة
+
+أمر الإدارة (من مجلد backend):
+    python indexes.py
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from pagination import KEYSET_SORT, encode_cursor, keyset_filter
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "videos": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING)], name="user_status"),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("analytics.views", DESCENDING)], name="user_status_views"),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("published_at", DESCENDING)], name="user_status_published"),
+        # مهمة analytics_rollups تجمع عبر جميع المستخدمين
+        IndexModel([("status", ASCENDING), ("published_at", ASCENDING)], name="status_published"),
+        IndexModel([("publish_state", ASCENDING), ("scheduled_time", ASCENDING)], name="publish_state_scheduled"),
+    ],
+    "video_batches": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "campaigns": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="user_created_id"),
+        IndexModel([("status", ASCENDING), ("next_run", ASCENDING)], name="status_next_run"),
+    ],
+    "analytics_rollups": [
+        IndexModel([("user_id", ASCENDING), ("granularity", ASCENDING), ("bucket", ASCENDING)], name="user_granularity_bucket"),
+        IndexModel([("granularity", ASCENDING), ("bucket", ASCENDING)], name="granularity_bucket"),
+    ],
+    "generation_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        IndexModel([("last_used_at", ASCENDING)], name="last_used_at"),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "quota_usage": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("type", ASCENDING), ("run_at", ASCENDING)], name="status_type_run_at"),
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease"),
+        # فرعا $or في claim مرتبان حسب run_at: المنتهي عقدها تُصفّى على lease_until من المفتاح نفسه
+        IndexModel([("status", ASCENDING), ("type", ASCENDING), ("run_at", ASCENDING), ("lease_until", ASCENDING)], name="status_type_run_at_lease"),
+    ],
+}
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    إنشاء الفهارس لكل مجموعة. فشل مجموعة (مثلاً بسبب بيانات مكررة
+    تمنع فهرساً فريداً) يُسجَّل ولا يمنع بقية المجموعات
+    
+    Returns:
+        أسماء الفهارس التي تم التأكد منها لكل مجموعة
+    """
+    ensured = {}
+    for collection, models in INDEXES.items():
+        try:
+            ensured[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            logger.error(f"Failed to ensure indexes on {collection}: {str(e)}")
+    return ensured
+
+# استعلامات الـ endpoints الساخنة والمهام الدورية
+SAMPLE_USER_ID = "explain-user"
+SAMPLE_NOW = datetime.now(timezone.utc)
+# مؤشر الصفحة الثانية كما يرسله العميل (keyset على created_at, id)
+SAMPLE_CURSOR = encode_cursor({"created_at": SAMPLE_NOW, "id": "explain-video"})
+
+ENDPOINT_QUERIES: List[Dict[str, Any]] = [
+    {"name": "get_current_user", "collection": "users", "filter": {"id": SAMPLE_USER_ID}},
+    {"name": "login", "collection": "users", "filter": {"email": "explain@example.com"}},
+    {"name": "dashboard.stats", "collection": "user_stats", "filter": {"_id": SAMPLE_USER_ID}},
+    # مراحل $match في تجميع التسوية (user_stats.dashboard_stats_pipeline)
+    {"name": "dashboard.reconcile.videos", "collection": "videos", "filter": {"user_id": SAMPLE_USER_ID}},
+    {"name": "dashboard.reconcile.campaigns", "collection": "campaigns", "filter": {"user_id": SAMPLE_USER_ID, "status": "active"}},
+    {"name": "videos.recent", "collection": "videos", "filter": {"user_id": SAMPLE_USER_ID}, "sort": [("created_at", DESCENDING)]},
+    {"name": "videos.get", "collection": "videos", "filter": {"id": "explain-video", "user_id": SAMPLE_USER_ID}},
+    {"name": "analytics.top_videos", "collection": "videos", "filter": {"user_id": SAMPLE_USER_ID, "status": "published"}, "sort": [("analytics.views", DESCENDING)]},
+    {"name": "videos.list", "collection": "videos", "filter": {"user_id": SAMPLE_USER_ID}, "sort": KEYSET_SORT},
+    {"name": "videos.list.next_page", "collection": "videos", "filter": keyset_filter({"user_id": SAMPLE_USER_ID}, SAMPLE_CURSOR), "sort": KEYSET_SORT},
+    {"name": "campaigns.list", "collection": "campaigns", "filter": {"user_id": SAMPLE_USER_ID}, "sort": KEYSET_SORT},
+    {"name": "campaigns.list.next_page", "collection": "campaigns", "filter": keyset_filter({"user_id": SAMPLE_USER_ID}, SAMPLE_CURSOR), "sort": KEYSET_SORT},
+    {"name": "videos.export", "collection": "videos", "filter": {"user_id": SAMPLE_USER_ID}, "sort": [("created_at", DESCENDING)]},
+    {"name": "analytics.rollups", "collection": "analytics_rollups", "filter": {"user_id": SAMPLE_USER_ID, "granularity": "day", "bucket": {"$gte": SAMPLE_NOW - timedelta(days=30), "$lt": SAMPLE_NOW}}, "sort": [("bucket", ASCENDING)]},
+    {"name": "campaigns.due", "collection": "campaigns", "filter": {"status": "active", "next_run": {"$lte": SAMPLE_NOW}}, "sort": [("next_run", ASCENDING)]},
+    {"name": "jobs.claim", "collection": "jobs", "filter": {
+        "type": {"$in": ["generate_video", "publish_video", "generate_batch"]},
+        "$or": [
+            {"status": "queued", "run_at": {"$lte": SAMPLE_NOW}},
+            {"status": "running", "lease_until": {"$lt": SAMPLE_NOW}}
+        ]
+    }, "sort": [("run_at", ASCENDING)]},
+    {"name": "analytics_rollups.build", "collection": "videos", "filter": {"status": "published", "published_at": {"$gte": SAMPLE_NOW - timedelta(days=30)}}},
+    {"name": "analytics_rollups.cleanup", "collection": "analytics_rollups", "filter": {"granularity": "day", "run_id": {"$ne": "explain-run"}, "bucket": {"$gte": SAMPLE_NOW - timedelta(days=30)}}},
+    {"name": "publish.refill", "collection": "videos", "filter": {"publish_state": "scheduled", "scheduled_time": {"$lte": SAMPLE_NOW}}, "sort": [("scheduled_time", ASCENDING)]},
+]
+
+BAD_STAGES = ("COLLSCAN", "SORT")
+
+def find_bad_stages(plan: Dict[str, Any]) -> List[str]:
+    """البحث في شجرة الخطة عن مراحل COLLSCAN أو SORT (ترتيب في الذاكرة)"""
+    found = []
+    stage = plan.get('stage')
+    if stage in BAD_STAGES:
+        found.append(stage)
+    for key in ('inputStage', 'queryPlan'):
+        if isinstance(plan.get(key), dict):
+            found.extend(find_bad_stages(plan[key]))
+    for child in plan.get('inputStages', []):
+        found.extend(find_bad_stages(child))
+    return found
+
+async def explain_query(db, query: Dict[str, Any]) -> Dict[str, Any]:
+    command = {"find": query['collection'], "filter": query['filter']}
+    if query.get('sort'):
+        command["sort"] = dict(query['sort'])
+    result = await db.command("explain", command, verbosity="queryPlanner")
+    return result['queryPlanner']['winningPlan']
+
+async def _main() -> int:
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        ensured = await ensure_indexes(db)
+        for collection, names in ensured.items():
+            print(f"{collection}: {', '.join(names)}")
+        return 0 if len(ensured) == len(INDEXES) else 1
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(_main()))
@@ -0,0 +1,222 @@
+"""
+طابور مهام دائم مخزن في MongoDB (مجموعة jobs)
+- يحجز العمّال المهام ذرياً عبر find_one_and_update مع عقد إيجار (lease)
+- نبضات (heartbeat) لتمديد العقد أثناء التنفيذ
+- إعادة المحاولة مع تراجع أسي، ثم نقل المهمة إلى حالة dead
+"""
+import os
+import uuid
+import random
+import socket
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_DEAD = "dead"
+
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 120))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_BACKOFF_BASE_SECONDS = float(os.environ.get('JOB_BACKOFF_BASE_SECONDS', 10))
+JOB_BACKOFF_MAX_SECONDS = float(os.environ.get('JOB_BACKOFF_MAX_SECONDS', 600))
+JOB_POLL_INTERVAL_SECONDS = float(os.environ.get('JOB_POLL_INTERVAL_SECONDS', 1))
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+async def enqueue(
+    db,
+    job_type: str,
+    payload: Dict[str, Any],
+    run_at: Optional[datetime] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS
+) -> str:
+    """إضافة مهمة إلى الطابور وإرجاع معرفها"""
+    now = _now()
+    job_id = str(uuid.uuid4())
+    await db.jobs.insert_one({
+        "id": job_id,
+        "type": job_type,
+        "payload": payload,
+        "status": JOB_QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": run_at or now,
+        "lease_until": None,
+        "worker_id": None,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now
+    })
+    return job_id
+
+async def claim(db, worker_id: str, job_types: List[str], lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[dict]:
+    """
+    حجز مهمة واحدة ذرياً: مهمة في الانتظار حان وقتها،
+    أو مهمة قيد التشغيل انتهى عقدها (عامل توقف دون إنهائها)
+    """
+    now = _now()
+    return await db.jobs.find_one_and_update(
+        {
+            "type": {"$in": job_types},
+            "$or": [
+                {"status": JOB_QUEUED, "run_at": {"$lte": now}},
+                {"status": JOB_RUNNING, "lease_until": {"$lt": now}}
+            ]
+        },
+        {
+            "$set": {
+                "status": JOB_RUNNING,
+                "worker_id": worker_id,
+                "lease_until": now + timedelta(seconds=lease_seconds),
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_at", ASCENDING)],
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def heartbeat(db, job_id: str, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> bool:
+    """تمديد عقد المهمة. يرجع False إذا فقد العامل ملكيتها"""
+    now = _now()
+    result = await db.jobs.update_one(
+        {"id": job_id, "worker_id": worker_id, "status": JOB_RUNNING},
+        {"$set": {"lease_until": now + timedelta(seconds=lease_seconds), "updated_at": now}}
+    )
+    return result.matched_count == 1
+
+async def complete(db, job_id: str, worker_id: str):
+    await db.jobs.update_one(
+        {"id": job_id, "worker_id": worker_id},
+        {"$set": {"status": JOB_SUCCEEDED, "lease_until": None, "updated_at": _now()}}
+    )
+
+def backoff_seconds(attempts: int) -> float:
+    """تراجع أسي مع jitter"""
+    delay = min(JOB_BACKOFF_MAX_SECONDS, JOB_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+async def fail(db, job: dict, worker_id: str, error: str) -> bool:
+    """
+    تسجيل فشل المهمة: إعادة جدولتها مع تراجع أو نقلها إلى dead
+    
+    Returns:
+        True إذا أصبحت المهمة dead
+    """
+    now = _now()
+    dead = job['attempts'] >= job['max_attempts']
+    update = {
+        "lease_until": None,
+        "last_error": error,
+        "updated_at": now
+    }
+    if dead:
+        update["status"] = JOB_DEAD
+    else:
+        update["status"] = JOB_QUEUED
+        update["run_at"] = now + timedelta(seconds=backoff_seconds(job['attempts']))
+    
+    await db.jobs.update_one({"id": job['id'], "worker_id": worker_id}, {"$set": update})
+    return dead
+
+JobHandler = Callable[[Any, dict], Awaitable[None]]
+
+@dataclass
+class JobType:
+    handler: JobHandler
+    on_dead: Optional[JobHandler] = None
+
+class JobWorker:
+    """
+    عامل يشغّل عدداً محدداً من المهام بالتوازي
+    
+    Args:
+        db: قاعدة بيانات Motor
+        concurrency: عدد المهام المتزامنة
+    """
+    
+    def __init__(self, db, concurrency: int = 1, worker_id: Optional[str] = None):
+        self.db = db
+        self.concurrency = concurrency
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._types: Dict[str, JobType] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+    
+    def register(self, job_type: str, handler: JobHandler, on_dead: Optional[JobHandler] = None):
+        self._types[job_type] = JobType(handler=handler, on_dead=on_dead)
+    
+    async def _keep_alive(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await heartbeat(self.db, job_id, self.worker_id):
+                logger.warning(f"Worker {self.worker_id} lost lease on job {job_id}")
+                return
+    
+    async def _run_job(self, job: dict):
+        job_type = self._types[job['type']]
+        keep_alive = asyncio.create_task(self._keep_alive(job['id']))
+        try:
+            try:
+                await job_type.handler(self.db, job)
+            except Exception as e:
+                logger.error(f"Job {job['id']} ({job['type']}) failed on attempt {job['attempts']}: {str(e)}")
+                await self._record_failure(job, job_type, str(e))
+            else:
+                await complete(self.db, job['id'], self.worker_id)
+        except Exception as e:
+            # خطأ عابر في MongoDB أثناء تسجيل النتيجة لا يوقف العامل؛
+            # ستعود المهمة إلى الطابور عند انتهاء عقدها
+            logger.error(f"Job {job['id']} bookkeeping failed, lease will expire: {str(e)}")
+        finally:
+            keep_alive.cancel()
+    
+    async def _record_failure(self, job: dict, job_type: JobType, error: str):
+        if await fail(self.db, job, self.worker_id, error):
+            logger.error(f"Job {job['id']} moved to dead-letter after {job['attempts']} attempts")
+            if job_type.on_dead is not None:
+                await job_type.on_dead(self.db, {**job, "last_error": error})
+    
+    async def _loop(self):
+        job_types = list(self._types)
+        while not self._stopping.is_set():
+            try:
+                job = await claim(self.db, self.worker_id, job_types)
+            except Exception as e:
+                logger.error(f"Job claim failed: {str(e)}")
+                job = None
+            
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=JOB_POLL_INTERVAL_SECONDS * random.uniform(0.5, 1.5))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            await self._run_job(job)
+    
+    def start(self):
+        """بدء حلقات العامل داخل حلقة asyncio الحالية"""
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+    
+    async def stop(self):
+        """إيقاف استلام مهام جديدة وانتظار المهام الجارية"""
+        self._stopping.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def run_forever(self):
+        self.start()
+        await asyncio.gather(*self._tasks)
@@ -0,0 +1,186 @@
+"""
+ترحيل التواريخ المخزنة كنصوص ISO إلى تواريخ BSON أصلية
+يعمل أثناء تشغيل الخدمة: يقرأ على دفعات بترتيب _id ويكتب عبر bulk_write،
+وكل تحديث مشروط بالقيمة النصية الأصلية فلا يطغى على كتابة أحدث
+يشغّله الخادم تلقائياً في الخلفية عبر مهمة مجدولة (ensure_dates_migrated)
+دون تأخير بدء التشغيل، وعملية واحدة فقط تنفذه في كل مرة
+
+التشغيل (من مجلد backend):
+    python migrate_dates.py                    # جميع المجموعات
+    python migrate_dates.py --collection videos --chunk-size 2000 --pause 0.1
+    python migrate_dates.py --dry-run
+"""
+import os
+import uuid
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+DATE_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at"],
+    "videos": ["created_at", "scheduled_time", "published_at"],
+    "campaigns": ["created_at", "last_run", "next_run"],
+}
+
+def parse_iso(value: str) -> Optional[datetime]:
+    """تحويل نص ISO إلى datetime بتوقيت UTC (بدون منطقة زمنية كما يخزنها BSON)"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def build_update(doc: Dict[str, Any], fields: List[str]) -> Optional[UpdateOne]:
+    condition = {"_id": doc['_id']}
+    changes = {}
+    for field in fields:
+        value = doc.get(field)
+        if not isinstance(value, str):
+            continue
+        parsed = parse_iso(value)
+        if parsed is None:
+            logger.warning(f"Unparseable {field}={value!r} in document {doc['_id']}")
+            continue
+        condition[field] = value
+        changes[field] = parsed
+    
+    if not changes:
+        return None
+    return UpdateOne(condition, {"$set": changes})
+
+async def migrate_collection(
+    db,
+    name: str,
+    fields: List[str],
+    chunk_size: int = 1000,
+    pause: float = 0.0,
+    dry_run: bool = False
+) -> int:
+    """
+    Returns:
+        عدد المستندات التي تم تحويلها
+    """
+    collection = db[name]
+    query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    projection = {field: 1 for field in fields}
+    
+    converted = 0
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else {"$and": [query, {"_id": {"$gt": last_id}}]}
+        docs = await collection.find(chunk_query, projection).sort("_id", 1).limit(chunk_size).to_list(length=chunk_size)
+        if not docs:
+            break
+        last_id = docs[-1]['_id']
+        
+        operations = [op for op in (build_update(doc, fields) for doc in docs) if op is not None]
+        if operations and not dry_run:
+            result = await collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        else:
+            converted += len(operations)
+        
+        logger.info(f"{name}: {converted} documents converted so far")
+        if pause:
+            await asyncio.sleep(pause)
+    
+    return converted
+
+async def migrate(db, collections: Optional[List[str]] = None, **options) -> Dict[str, int]:
+    results = {}
+    for name, fields in DATE_FIELDS.items():
+        if collections and name not in collections:
+            continue
+        results[name] = await migrate_collection(db, name, fields, **options)
+    return results
+
+MIGRATION_ID = "native_dates"
+# عقد يمنع تشغيل الترحيل في أكثر من عملية في الوقت نفسه
+MIGRATION_LEASE_MINUTES = int(os.environ.get('DATE_MIGRATION_LEASE_MINUTES', 30))
+# مهلة بين الدفعات عند التشغيل في الخلفية لتخفيف الحمل على الخدمة
+DATE_MIGRATION_PAUSE_SECONDS = float(os.environ.get('DATE_MIGRATION_PAUSE_SECONDS', 0.05))
+
+async def _acquire_lease(db, owner: str) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        await db.migrations.update_one(
+            {
+                "_id": MIGRATION_ID,
+                "completed_at": None,
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]
+            },
+            {"$set": {"lease_owner": owner, "lease_until": now + timedelta(minutes=MIGRATION_LEASE_MINUTES)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # اكتمل سابقاً أو تعمل عملية أخرى
+        return False
+    return True
+
+async def ensure_dates_migrated(db, **options) -> Optional[Dict[str, int]]:
+    """
+    تشغيل الترحيل في الخلفية مرة واحدة لكل قاعدة بيانات (مهمة مجدولة في الخادم)
+    مؤشرات الترقيم تقارن created_at كتاريخ BSON، فالمستندات القديمة ذات التواريخ
+    النصية لا تظهر في الصفحات حتى تُحوَّل. بعد اكتماله تُسجَّل علامة في مجموعة
+    migrations فيصبح كل استدعاء لاحق قراءة واحدة (الكتابات الجديدة تواريخ أصلية دائماً)
+    
+    Returns:
+        نتيجة الترحيل، أو None إذا كان قد اكتمل سابقاً أو يعمل في عملية أخرى
+    """
+    marker = await db.migrations.find_one({"_id": MIGRATION_ID}, {"completed_at": 1})
+    if marker and marker.get('completed_at'):
+        return None
+    
+    owner = str(uuid.uuid4())
+    if not await _acquire_lease(db, owner):
+        return None
+    
+    try:
+        results = await migrate(db, **options)
+    except BaseException:
+        await db.migrations.update_one({"_id": MIGRATION_ID, "lease_owner": owner}, {"$set": {"lease_until": None}})
+        raise
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID, "lease_owner": owner},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "converted": results, "lease_until": None}}
+    )
+    logger.info(f"Date migration completed: {results}")
+    return results
+
+async def _main(args):
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        results = await migrate(
+            client[os.environ['DB_NAME']],
+            collections=[args.collection] if args.collection else None,
+            chunk_size=args.chunk_size,
+            pause=args.pause,
+            dry_run=args.dry_run
+        )
+        for name, count in results.items():
+            print(f"{name}: {count} documents {'would be ' if args.dry_run else ''}converted")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Convert ISO string dates to native BSON dates")
+    parser.add_argument("--collection", choices=list(DATE_FIELDS), help="ترحيل مجموعة واحدة فقط")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--pause", type=float, default=0.0, help="ثوانٍ بين الدفعات لتخفيف الحمل")
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,196 @@
+"""
+فهرس نماذج OpenRouter في الذاكرة
+- يُحدَّث في الخلفية بطلبات شرطية (If-None-Match / If-Modified-Since)
+- يُحفظ في MongoDB حتى تبدأ العمليات الجديدة بفهرس جاهز دون انتظار OpenRouter
+- البحث والتصفية والترقيم تتم في الذاكرة فقط
+"""
+import os
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from chat_stream import OPENROUTER_API_BASE
+
+logger = logging.getLogger(__name__)
+
+MODEL_CATALOG_REFRESH_MINUTES = int(os.environ.get('MODEL_CATALOG_REFRESH_MINUTES', 60))
+MODEL_CATALOG_DOC_ID = "openrouter"
+
+SORT_KEYS = {
+    "name": lambda model: model['name'].casefold(),
+    "context_length": lambda model: -(model['context_length'] or 0),
+    "price": lambda model: model['pricing']['prompt'] if model['pricing']['prompt'] is not None else float('inf'),
+    "newest": lambda model: -(model['created'] or 0),
+}
+
+def _price(value: Any) -> Optional[float]:
+    """الأسعار تأتي كنصوص بالدولار لكل token"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def compact_model(model: Dict[str, Any]) -> Dict[str, Any]:
+    pricing = model.get('pricing') or {}
+    architecture = model.get('architecture') or {}
+    top_provider = model.get('top_provider') or {}
+    context_length = model.get('context_length')
+    return {
+        "id": model['id'],
+        "name": model.get('name') or model['id'],
+        "description": f"Context: {context_length or 'N/A'}",
+        "summary": model.get('description', ''),
+        "context_length": context_length,
+        "max_completion_tokens": top_provider.get('max_completion_tokens'),
+        "pricing": {
+            "prompt": _price(pricing.get('prompt')),
+            "completion": _price(pricing.get('completion')),
+            "request": _price(pricing.get('request')),
+            "image": _price(pricing.get('image'))
+        },
+        "input_modalities": architecture.get('input_modalities') or [],
+        "output_modalities": architecture.get('output_modalities') or [],
+        "created": model.get('created')
+    }
+
+class ModelCatalog:
+    def __init__(self, base_url: str = OPENROUTER_API_BASE):
+        self.base_url = base_url
+        self.models: List[Dict[str, Any]] = []
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self.refreshed_at: Optional[datetime] = None
+        self.refreshes = 0
+        self.not_modified = 0
+        self._search_text: Dict[str, str] = {}
+        self._refreshing: Optional[asyncio.Task] = None
+    
+    def _index(self, models: List[Dict[str, Any]]):
+        self.models = models
+        self._search_text = {
+            model['id']: f"{model['id']} {model['name']} {model['summary']}".casefold()
+            for model in models
+        }
+    
+    async def load(self, db):
+        """تحميل آخر نسخة محفوظة (عند بدء العملية)"""
+        doc = await db.model_catalog.find_one({"_id": MODEL_CATALOG_DOC_ID})
+        if doc:
+            self._index(doc['models'])
+            self.etag = doc.get('etag')
+            self.last_modified = doc.get('last_modified')
+            self.content_hash = doc.get('content_hash')
+            self.refreshed_at = doc.get('refreshed_at')
+    
+    async def refresh(self, db, client: httpx.AsyncClient) -> bool:
+        """
+        Returns:
+            True إذا تغير الفهرس
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        api_key = os.getenv('OPENROUTER_API_KEY')
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        
+        response = await client.get(f"{self.base_url}/models", headers=headers)
+        now = datetime.now(timezone.utc)
+        self.refreshed_at = now
+        
+        if response.status_code == 304:
+            self.not_modified += 1
+            await db.model_catalog.update_one({"_id": MODEL_CATALOG_DOC_ID}, {"$set": {"refreshed_at": now}})
+            return False
+        response.raise_for_status()
+        
+        # OpenRouter لا يرسل ETag دائماً، فنقارن المحتوى أيضاً
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        self.etag = response.headers.get('etag')
+        self.last_modified = response.headers.get('last-modified')
+        if content_hash == self.content_hash and self.models:
+            self.not_modified += 1
+            await db.model_catalog.update_one({"_id": MODEL_CATALOG_DOC_ID}, {"$set": {"refreshed_at": now}})
+            return False
+        
+        models = [compact_model(model) for model in response.json().get('data', []) if model.get('id')]
+        self._index(models)
+        self.content_hash = content_hash
+        self.refreshes += 1
+        await db.model_catalog.replace_one(
+            {"_id": MODEL_CATALOG_DOC_ID},
+            {
+                "models": models,
+                "etag": self.etag,
+                "last_modified": self.last_modified,
+                "content_hash": content_hash,
+                "refreshed_at": now
+            },
+            upsert=True
+        )
+        logger.info(f"OpenRouter model catalog refreshed: {len(models)} models")
+        return True
+    
+    def refresh_in_background(self, db, client: httpx.AsyncClient):
+        """تحديث دون انتظار (مثلاً عند طلب والفهرس فارغ)؛ طلب واحد فقط في كل مرة"""
+        if self._refreshing is not None and not self._refreshing.done():
+            return
+        
+        async def _run():
+            try:
+                await self.refresh(db, client)
+            except Exception as e:
+                logger.error(f"OpenRouter model catalog refresh failed: {str(e)}")
+        
+        self._refreshing = asyncio.create_task(_run())
+    
+    def query(
+        self,
+        search: Optional[str] = None,
+        min_context: Optional[int] = None,
+        max_prompt_price: Optional[float] = None,
+        free: bool = False,
+        modality: Optional[str] = None,
+        sort: str = "name",
+        offset: int = 0,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        terms = search.casefold().split() if search else []
+        matches = []
+        for model in self.models:
+            if terms and not all(term in self._search_text[model['id']] for term in terms):
+                continue
+            if min_context and (model['context_length'] or 0) < min_context:
+                continue
+            prompt_price = model['pricing']['prompt']
+            if max_prompt_price is not None and (prompt_price is None or prompt_price > max_prompt_price):
+                continue
+            if free and (prompt_price != 0 or model['pricing']['completion'] != 0):
+                continue
+            if modality and modality not in model['input_modalities']:
+                continue
+            matches.append(model)
+        
+        matches.sort(key=SORT_KEYS[sort])
+        page = matches[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(matches) else None
+        return {"models": page, "total": len(matches), "next_offset": next_offset}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "models": len(self.models),
+            "refreshed_at": self.refreshed_at,
+            "refreshes": self.refreshes,
+            "not_modified": self.not_modified
+        }
+
+model_catalog = ModelCatalog()
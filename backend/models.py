@@ -46,6 +46,10 @@ class Video(BaseModel):
     youtube_video_id: Optional[str] = None
     schedule_type: str = "immediate"
     scheduled_time: Optional[datetime] = None
+    content_provider: Optional[str] = None
+    selected_model: Optional[str] = None
+    use_generation_cache: bool = True
+    error: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     published_at: Optional[datetime] = None
     analytics: Optional[Dict[str, Any]] = Field(default_factory=dict)
@@ -63,6 +67,10 @@ class VideoCreate(BaseModel):
     content_provider: Optional[str] = "gemini"
     selected_model: Optional[str] = None
     model_purpose: Optional[str] = "content_generation"
+    use_generation_cache: bool = True
+
+class VideoBatchCreate(BaseModel):
+    items: List[VideoCreate]
 
 class Campaign(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -73,6 +81,11 @@ class Campaign(BaseModel):
     topic: str
     status: str = "active"
     frequency: str
+    dimensions: str = "16:9"
+    video_length: str = "60 ثانية"
+    ai_generator: str = "sora2"
+    content_provider: Optional[str] = "gemini"
+    selected_model: Optional[str] = None
     videos_generated: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_run: Optional[datetime] = None
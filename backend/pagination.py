@@ -0,0 +1,78 @@
+"""
+ترقيم الصفحات بالمؤشر (keyset) على (created_at, id)
+الذاكرة وزمن الاستجابة ثابتان مهما كان عدد المستندات لدى المستخدم
+"""
+import json
+import base64
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import DESCENDING
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+KEYSET_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """مؤشر مُعتم من آخر مستند في الصفحة"""
+    created_at = doc.get('created_at')
+    if isinstance(created_at, datetime):
+        payload = {"c": created_at.isoformat(), "t": "d", "i": doc['id']}
+    else:
+        payload = {"c": created_at, "t": "s", "i": doc['id']}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        created_at = payload['c']
+        if payload.get('t') == 'd':
+            created_at = datetime.fromisoformat(created_at)
+        return created_at, payload['i']
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="مؤشر الصفحة غير صالح")
+
+def keyset_filter(base_filter: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """إضافة شرط "بعد المؤشر" إلى الفلتر الأساسي"""
+    if not cursor:
+        return base_filter
+    
+    created_at, last_id = decode_cursor(cursor)
+    return {
+        **base_filter,
+        "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": last_id}}
+        ]
+    }
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+async def paginate(
+    collection,
+    base_filter: Dict[str, Any],
+    cursor: Optional[str],
+    limit: int,
+    projection: Optional[Dict[str, int]] = None
+) -> Dict[str, Any]:
+    """
+    Returns:
+        {"items": [...], "next_cursor": str أو None}
+    """
+    limit = clamp_limit(limit)
+    docs = await collection.find(
+        keyset_filter(base_filter, cursor),
+        projection or {"_id": 0}
+    ).sort(KEYSET_SORT).limit(limit + 1).to_list(length=limit + 1)
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    
+    return {"items": docs, "next_cursor": next_cursor}
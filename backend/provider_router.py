@@ -0,0 +1,256 @@
+"""
+توجيه طلبات توليد المحتوى بين Gemini وOpenRouter
+- يحترم المزود والنموذج المطلوبين، ثم يجرب البقية عند الفشل (الأقل أخطاءً وزمناً أولاً)
+- يحتفظ بنافذة متحركة لزمن الاستجابة ونسبة الأخطاء لكل (مزود، نموذج)
+- طلب تحوّط (hedged): إذا تجاوز الطلب الأول p95 المعتاد يُرسل طلب ثانٍ
+  ويُعتمد أول رد ناجح ويُلغى الآخر
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+from chat_stream import OPENROUTER_API_BASE
+from http_clients import http_clients
+from rate_limits import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_STATS_WINDOW = int(os.environ.get('PROVIDER_STATS_WINDOW', 200))
+PROVIDER_HEDGE_ENABLED = os.environ.get('PROVIDER_HEDGE_ENABLED', 'true').lower() == 'true'
+PROVIDER_HEDGE_PERCENTILE = float(os.environ.get('PROVIDER_HEDGE_PERCENTILE', 0.95))
+PROVIDER_HEDGE_MIN_SAMPLES = int(os.environ.get('PROVIDER_HEDGE_MIN_SAMPLES', 20))
+PROVIDER_FALLBACK_ENABLED = os.environ.get('PROVIDER_FALLBACK_ENABLED', 'true').lower() == 'true'
+PROVIDER_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('PROVIDER_REQUEST_TIMEOUT_SECONDS', 90))
+
+DEFAULT_MODELS = {
+    "gemini": os.environ.get('GEMINI_DEFAULT_MODEL', 'gemini-2.5-flash'),
+    "openrouter": os.environ.get('OPENROUTER_DEFAULT_MODEL', 'google/gemini-2.5-flash'),
+}
+
+class GenerationError(Exception):
+    """فشلت جميع المسارات المتاحة"""
+
+@dataclass(frozen=True)
+class Route:
+    provider: str
+    model: str
+    
+    def __str__(self) -> str:
+        return f"{self.provider}/{self.model}"
+
+class RouteStats:
+    """نافذة متحركة لآخر النتائج: أزمنة الطلبات الناجحة ونجاح/فشل كل طلب"""
+    
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+    
+    def record(self, latency: float, ok: bool):
+        if ok:
+            self.latencies.append(latency)
+        self.outcomes.append(ok)
+    
+    def record_cancelled(self, latency: float):
+        """طلب أُلغي قبل اكتماله (خسر أمام طلب التحوّط): زمنه حد أدنى لزمنه الفعلي،
+        ويُضاف إلى النافذة حتى لا تنخفض p95 بإسقاط الطلبات البطيئة"""
+        self.latencies.append(latency)
+    
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        if len(self.latencies) < max(min_samples, 1):
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+    
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        return {
+            "requests": len(self.outcomes),
+            "error_rate": round(self.error_rate, 4),
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None
+        }
+
+class ProviderRouter:
+    def __init__(
+        self,
+        window: int = PROVIDER_STATS_WINDOW,
+        hedge_enabled: bool = PROVIDER_HEDGE_ENABLED,
+        hedge_percentile: float = PROVIDER_HEDGE_PERCENTILE,
+        hedge_min_samples: int = PROVIDER_HEDGE_MIN_SAMPLES,
+        fallback_enabled: bool = PROVIDER_FALLBACK_ENABLED,
+        timeout: float = PROVIDER_REQUEST_TIMEOUT_SECONDS
+    ):
+        self.window = window
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.fallback_enabled = fallback_enabled
+        self.timeout = timeout
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self._stats: Dict[Route, RouteStats] = {}
+    
+    def stats_for(self, route: Route) -> RouteStats:
+        if route not in self._stats:
+            self._stats[route] = RouteStats(self.window)
+        return self._stats[route]
+    
+    def candidates(self, provider: Optional[str], model: Optional[str], available: List[str]) -> List[Route]:
+        """المسار المطلوب أولاً ثم بقية المزودين المتاحين مرتبين حسب الأخطاء ثم p95"""
+        provider = provider if provider in DEFAULT_MODELS else "gemini"
+        requested = Route(provider, model or DEFAULT_MODELS[provider])
+        routes = [requested] if provider in available else []
+        if not self.fallback_enabled:
+            return routes
+        
+        others = [Route(name, DEFAULT_MODELS[name]) for name in available if name != provider]
+        others.sort(key=lambda route: (
+            self.stats_for(route).error_rate,
+            self.stats_for(route).percentile(self.hedge_percentile) or 0.0
+        ))
+        return routes + others
+    
+    async def _call(self, route: Route, api_key: str, system_message: str, prompt: str, session_id: str) -> str:
+        if route.provider == "gemini":
+            chat = LlmChat(
+                api_key=api_key,
+                session_id=session_id,
+                system_message=system_message
+            ).with_model("gemini", route.model)
+            return await chat.send_message(UserMessage(text=prompt))
+        
+        response = await http_clients.get("openrouter").post(
+            f"{OPENROUTER_API_BASE}/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json={
+                "model": route.model,
+                "messages": [
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt}
+                ]
+            }
+        )
+        if response.status_code != 200:
+            raise GenerationError(f"OpenRouter returned HTTP {response.status_code}: {response.text[:200]}")
+        return response.json()['choices'][0]['message']['content']
+    
+    async def _timed_call(
+        self,
+        route: Route,
+        api_key: str,
+        parse: Callable[[str], Any],
+        limit: Optional[Tuple[Any, str]],
+        *args
+    ) -> Any:
+        """الطلب مع تحليل الرد؛ الرد غير الصالح يُحسب خطأً لهذا المسار"""
+        if limit is not None:
+            # كل استدعاء فعلي للمزود يُخصم من دلو المستخدم، ولا يُحسب الانتظار ضمن زمن المسار
+            db, user_id = limit
+            await rate_limiter.acquire(db, user_id, route.provider)
+        start = time.monotonic()
+        try:
+            result = parse(await asyncio.wait_for(self._call(route, api_key, *args), timeout=self.timeout))
+        except asyncio.CancelledError:
+            self.stats_for(route).record_cancelled(time.monotonic() - start)
+            raise
+        except Exception:
+            self.stats_for(route).record(time.monotonic() - start, ok=False)
+            raise
+        self.stats_for(route).record(time.monotonic() - start, ok=True)
+        return result
+    
+    async def _attempt(self, route: Route, hedge_route: Route, keys: Dict[str, str], parse, limit, *args) -> Tuple[Any, Route]:
+        primary = asyncio.create_task(self._timed_call(route, keys[route.provider], parse, limit, *args))
+        tasks = {primary: route}
+        pending = {primary}
+        error = None
+        try:
+            hedge_after = None
+            if self.hedge_enabled:
+                hedge_after = self.stats_for(route).percentile(self.hedge_percentile, self.hedge_min_samples)
+            if hedge_after is not None:
+                done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+                if not done:
+                    self.hedges += 1
+                    logger.info(f"{route} exceeded p95 ({hedge_after:.2f}s), hedging with {hedge_route}")
+                    hedge = asyncio.create_task(self._timed_call(hedge_route, keys[hedge_route.provider], parse, limit, *args))
+                    tasks[hedge] = hedge_route
+                    pending.add(hedge)
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result(), tasks[task]
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise error
+    
+    async def generate(
+        self,
+        provider: Optional[str],
+        model: Optional[str],
+        keys: Dict[str, str],
+        system_message: str,
+        prompt: str,
+        session_id: str,
+        parse: Callable[[str], Any] = lambda text: text,
+        db=None,
+        user_id: Optional[str] = None
+    ) -> Tuple[Any, Route]:
+        """
+        Args:
+            keys: مفتاح API لكل مزود متاح
+            parse: تحويل نص الرد؛ إذا رفع استثناءً يُعامل الرد كفشل
+            db, user_id: عند تمريرهما يُخصم كل استدعاء (بما فيه التحوّط والتحويل)
+                من دلو المستخدم لدى المزود الفعلي
+        
+        Returns:
+            (الرد بعد التحليل، المسار الذي أنتجه)
+        """
+        routes = self.candidates(provider, model, [name for name in DEFAULT_MODELS if keys.get(name)])
+        limit = (db, user_id) if db is not None and user_id else None
+        if not routes:
+            raise GenerationError(f"لم يتم العثور على مفتاح API للمزود {provider}")
+        
+        errors = []
+        for index, route in enumerate(routes):
+            if index > 0:
+                self.fallbacks += 1
+                logger.warning(f"Falling back to {route}")
+            hedge_route = routes[index + 1] if index + 1 < len(routes) else route
+            try:
+                return await self._attempt(route, hedge_route, keys, parse, limit, system_message, prompt, session_id)
+            except Exception as e:
+                logger.error(f"Generation via {route} failed: {str(e)}")
+                errors.append(f"{route}: {str(e)}")
+        
+        raise GenerationError("; ".join(errors))
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "routes": {str(route): stats.snapshot() for route, stats in self._stats.items()}
+        }
+
+provider_router = ProviderRouter()
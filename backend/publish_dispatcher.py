@@ -0,0 +1,156 @@
+"""
+موزّع النشر المجدول
+يحمّل الفيديوهات المجدولة ضمن نافذة زمنية قادمة إلى كومة (heap) في الذاكرة
+ويطلق كل فيديو عند موعده بتأخير محدود، دون مهمة APScheduler لكل فيديو
+ودون مسح مجموعة videos بالكامل. يُعاد تحميل النافذة دورياً وعند إعادة التشغيل
+"""
+import os
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+
+from pymongo import ASCENDING
+
+from job_queue import enqueue
+from user_stats import set_video_status
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_VIDEO_JOB = "publish_video"
+
+# حالات publish_state
+PUBLISH_SCHEDULED = "scheduled"
+PUBLISH_ENQUEUED = "enqueued"
+PUBLISH_PUBLISHED = "published"
+PUBLISH_SKIPPED = "skipped"
+
+PUBLISH_WINDOW_SECONDS = int(os.environ.get('PUBLISH_WINDOW_SECONDS', 600))
+PUBLISH_REFILL_SECONDS = int(os.environ.get('PUBLISH_REFILL_SECONDS', 30))
+PUBLISH_REFILL_BATCH = int(os.environ.get('PUBLISH_REFILL_BATCH', 5000))
+PUBLISH_JOB_MAX_ATTEMPTS = int(os.environ.get('PUBLISH_JOB_MAX_ATTEMPTS', 20))
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+class PublishDispatcher:
+    """
+    Args:
+        db: قاعدة بيانات Motor
+        window_seconds: مدى التحميل المسبق إلى الذاكرة
+        refill_seconds: الفاصل بين عمليات إعادة التحميل؛ وهو أيضاً أقصى تأخير
+            لفيديو جُدول من عملية أخرى بموعد أقرب من الفاصل نفسه
+    """
+    
+    def __init__(
+        self,
+        db,
+        window_seconds: int = PUBLISH_WINDOW_SECONDS,
+        refill_seconds: int = PUBLISH_REFILL_SECONDS
+    ):
+        self.db = db
+        self.window = timedelta(seconds=window_seconds)
+        self.refill_seconds = refill_seconds
+        self._heap: List[Tuple[datetime, str]] = []
+        self._loaded: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.fired = 0
+    
+    def schedule(self, video_id: str, scheduled_time: datetime):
+        """إضافة فيديو إلى الكومة إن كان ضمن النافذة الحالية"""
+        scheduled_time = _as_utc(scheduled_time)
+        if video_id in self._loaded or scheduled_time > _now() + self.window:
+            return
+        self._loaded.add(video_id)
+        heapq.heappush(self._heap, (scheduled_time, video_id))
+        self._wakeup.set()
+    
+    async def refill(self):
+        """تحميل الفيديوهات المجدولة حتى نهاية النافذة عبر استعلام مفهرس"""
+        until = _now() + self.window
+        cursor = self.db.videos.find(
+            {"publish_state": PUBLISH_SCHEDULED, "scheduled_time": {"$lte": until}},
+            {"_id": 0, "id": 1, "scheduled_time": 1}
+        ).sort("scheduled_time", ASCENDING).limit(PUBLISH_REFILL_BATCH)
+        
+        async for video in cursor:
+            self.schedule(video['id'], video['scheduled_time'])
+    
+    async def _fire(self, video_id: str):
+        """حجز الفيديو ذرياً ثم إضافة مهمة النشر إلى الطابور"""
+        result = await self.db.videos.update_one(
+            {"id": video_id, "publish_state": PUBLISH_SCHEDULED, "scheduled_time": {"$lte": _now()}},
+            {"$set": {"publish_state": PUBLISH_ENQUEUED}}
+        )
+        if result.modified_count == 1:
+            await enqueue(self.db, PUBLISH_VIDEO_JOB, {"video_id": video_id}, max_attempts=PUBLISH_JOB_MAX_ATTEMPTS)
+            self.fired += 1
+    
+    async def _run(self):
+        next_refill = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            if loop.time() >= next_refill:
+                try:
+                    await self.refill()
+                except Exception as e:
+                    logger.error(f"Publish dispatcher refill failed: {str(e)}")
+                next_refill = loop.time() + self.refill_seconds
+            
+            now = _now()
+            while self._heap and self._heap[0][0] <= now:
+                _, video_id = heapq.heappop(self._heap)
+                self._loaded.discard(video_id)
+                try:
+                    await self._fire(video_id)
+                except Exception as e:
+                    logger.error(f"Failed to dispatch publish for video {video_id}: {str(e)}")
+            
+            timeout = next_refill - loop.time()
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - _now()).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+async def handle_publish_video(db, job: dict):
+    """نشر الفيديو إذا اكتمل إنشاؤه، وإلا رفع خطأ لإعادة المحاولة لاحقاً"""
+    video_id = job['payload']['video_id']
+    video = await db.videos.find_one({"id": video_id}, {"_id": 0, "status": 1})
+    if video is None:
+        return
+    
+    if video['status'] == "failed":
+        await db.videos.update_one({"id": video_id}, {"$set": {"publish_state": PUBLISH_SKIPPED}})
+        return
+    if video['status'] != "completed":
+        raise RuntimeError(f"Video {video_id} is not ready for publishing (status={video['status']})")
+    
+    await set_video_status(db, video_id, "published", publish_state=PUBLISH_PUBLISHED, published_at=_now())
+    logger.info(f"Video {video_id} published")
+
+async def on_publish_video_dead(db, job: dict):
+    await db.videos.update_one(
+        {"id": job['payload']['video_id']},
+        {"$set": {"publish_state": PUBLISH_SKIPPED, "error": job.get('last_error')}}
+    )
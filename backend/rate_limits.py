@@ -0,0 +1,249 @@
+"""
+تحديد معدل الطلبات وحصص المزودين، مشتركة بين جميع العمليات عبر MongoDB
+- RateLimiter: دلو رموز (token bucket) لكل (مستخدم، مزود)، يُحدَّث ذرياً
+  بتحديث pipeline واحد (إعادة الملء ثم الخصم إن كفى الرصيد). يُخصم عند
+  الاستدعاء الفعلي للمزود (بما في ذلك طلبات التحوّط والتحويل في العامل)
+- QuotaTracker: وحدات حصة YouTube Data API المستهلكة يومياً لكل مفتاح API
+  (ولكل مستخدم عند استخدام المفتاح المشترك)، ويُرفض الطلب قبل إرساله للمزود
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+# أقصى انتظار لرصيد الدلو في المهام الخلفية قبل اعتبار الاستدعاء فاشلاً
+RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('RATE_LIMIT_MAX_WAIT_SECONDS', 120))
+
+class RateLimitExceeded(Exception):
+    def __init__(self, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.detail = detail
+        self.retry_after = retry_after
+
+class QuotaExceeded(RateLimitExceeded):
+    """نفدت الحصة اليومية؛ retry_after حتى بداية اليوم التالي (UTC)"""
+
+@dataclass
+class BucketConfig:
+    capacity: float
+    refill_per_second: float
+
+def _bucket_config(name: str, burst: int, per_minute: int) -> BucketConfig:
+    """مثال: GEMINI_RATE_LIMIT_BURST=60 و GEMINI_RATE_LIMIT_PER_MINUTE=30"""
+    prefix = name.upper()
+    capacity = float(os.environ.get(f'{prefix}_RATE_LIMIT_BURST', burst))
+    per_minute = float(os.environ.get(f'{prefix}_RATE_LIMIT_PER_MINUTE', per_minute))
+    if capacity <= 0 or per_minute <= 0:
+        # لتعطيل التحديد استخدم RATE_LIMIT_ENABLED=false
+        raise ValueError(
+            f"{prefix}_RATE_LIMIT_BURST and {prefix}_RATE_LIMIT_PER_MINUTE must be positive "
+            f"(got {capacity} and {per_minute})"
+        )
+    return BucketConfig(capacity=capacity, refill_per_second=per_minute / 60)
+
+class RateLimiter:
+    def __init__(self, buckets: Dict[str, BucketConfig], enabled: bool = RATE_LIMIT_ENABLED):
+        self.buckets = buckets
+        self.enabled = enabled
+    
+    async def consume(self, db, user_id: str, provider: str, cost: float = 1) -> float:
+        """
+        خصم cost من دلو (المستخدم، المزود) أو رفع RateLimitExceeded
+        
+        Returns:
+            الرصيد المتبقي
+        """
+        config = self.buckets.get(provider)
+        if not self.enabled or config is None:
+            return float('inf')
+        
+        # دفعة أكبر من سعة الدلو تستنفده بالكامل بدل أن تُرفض دائماً
+        cost = min(cost, config.capacity)
+        now = datetime.now(timezone.utc)
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        update = [
+            {"$set": {
+                "tokens": {"$min": [
+                    config.capacity,
+                    {"$add": [
+                        {"$ifNull": ["$tokens", config.capacity]},
+                        {"$multiply": [elapsed_seconds, config.refill_per_second]}
+                    ]}
+                ]},
+                "updated_at": now,
+                # الدلو الممتلئ لا يحتاج إلى مستند
+                "expires_at": now + timedelta(seconds=config.capacity / config.refill_per_second)
+            }},
+            {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}}}
+        ]
+        
+        bucket_id = f"{provider}:{user_id}"
+        try:
+            bucket = await db.rate_limits.find_one_and_update(
+                {"_id": bucket_id}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # upsert متزامن لنفس الدلو: المستند موجود الآن
+            bucket = await db.rate_limits.find_one_and_update(
+                {"_id": bucket_id}, update, return_document=ReturnDocument.AFTER
+            )
+        
+        if not bucket['allowed']:
+            retry_after = (cost - bucket['tokens']) / config.refill_per_second
+            raise RateLimitExceeded("تم تجاوز الحد المسموح من الطلبات، يرجى المحاولة بعد قليل", retry_after)
+        return bucket['tokens']
+    
+    async def acquire(
+        self,
+        db,
+        user_id: str,
+        provider: str,
+        cost: float = 1,
+        max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS
+    ) -> float:
+        """
+        مثل consume لكن ينتظر امتلاء الدلو بدل الرفض الفوري (للعامل والمهام الخلفية)
+        يرفع RateLimitExceeded إذا تجاوز الانتظار المطلوب max_wait
+        """
+        deadline = time.monotonic() + max_wait
+        while True:
+            try:
+                return await self.consume(db, user_id, provider, cost)
+            except RateLimitExceeded as e:
+                if time.monotonic() + e.retry_after > deadline:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+# وحدات الحصة لكل عملية في YouTube Data API v3
+YOUTUBE_QUOTA_COSTS = {
+    "search.list": 100,
+    "videos.list": 1,
+    "videoCategories.list": 1,
+    "channels.list": 1,
+    "videos.insert": 1600,
+}
+
+def key_scope(api_key: str) -> str:
+    """معرّف ثابت للمفتاح دون تخزين المفتاح نفسه"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+class QuotaTracker:
+    def __init__(self, provider: str, costs: Dict[str, int], daily_budget: int, user_daily_budget: int):
+        self.provider = provider
+        self.costs = costs
+        self.daily_budget = daily_budget
+        self.user_daily_budget = user_daily_budget
+    
+    @staticmethod
+    def _day(now: datetime):
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return start.strftime('%Y-%m-%d'), start + timedelta(days=1)
+    
+    async def _consume(self, db, counter_id: str, units: int, budget: int, day_end: datetime) -> bool:
+        update = [
+            {"$set": {
+                "used": {"$ifNull": ["$used", 0]},
+                "budget": budget,
+                "expires_at": day_end + timedelta(days=2)
+            }},
+            {"$set": {"allowed": {"$lte": [{"$add": ["$used", units]}, budget]}}},
+            {"$set": {"used": {"$cond": ["$allowed", {"$add": ["$used", units]}, "$used"]}}}
+        ]
+        try:
+            counter = await db.quota_usage.find_one_and_update(
+                {"_id": counter_id}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            counter = await db.quota_usage.find_one_and_update(
+                {"_id": counter_id}, update, return_document=ReturnDocument.AFTER
+            )
+        return counter['allowed']
+    
+    def _user_counter(self, scope: str, user_id: str, day: str) -> str:
+        return f"{self.provider}:{scope}:user:{user_id}:{day}"
+    
+    async def consume_user(self, db, api_key: str, operations: List[str], user_id: str) -> int:
+        """
+        حجز حصة المستخدم اليومية وحدها (بدون حصة المفتاح) أو رفع QuotaExceeded
+        يُستدعى في الطلب نفسه قبل الانضمام إلى جلب مشترك، حتى لا يصل خطأ حصة
+        مستخدم إلى غيره من المنتظرين
+        
+        Returns:
+            عدد الوحدات المحجوزة (لإرجاعها عبر refund_user إذا لم يتم الاستدعاء)
+        """
+        units = sum(self.costs[operation] for operation in operations)
+        now = datetime.now(timezone.utc)
+        day, day_end = self._day(now)
+        counter_id = self._user_counter(key_scope(api_key), user_id, day)
+        if not await self._consume(db, counter_id, units, self.user_daily_budget, day_end):
+            raise QuotaExceeded("تم استهلاك حصتك اليومية من YouTube API", (day_end - now).total_seconds())
+        return units
+    
+    async def refund_user(self, db, api_key: str, user_id: str, units: int):
+        day, _ = self._day(datetime.now(timezone.utc))
+        await db.quota_usage.update_one(
+            {"_id": self._user_counter(key_scope(api_key), user_id, day)},
+            {"$inc": {"used": -units}}
+        )
+    
+    async def consume(self, db, api_key: str, operation: str, user_id: Optional[str] = None, calls: int = 1) -> int:
+        """
+        حجز وحدات الحصة قبل استدعاء المزود أو رفع QuotaExceeded
+        
+        Args:
+            user_id: يُمرَّر عند استخدام المفتاح المشترك لتطبيق حصة المستخدم اليومية أيضاً
+        
+        Returns:
+            عدد الوحدات المحجوزة
+        """
+        units = self.costs[operation] * calls
+        now = datetime.now(timezone.utc)
+        day, day_end = self._day(now)
+        
+        if user_id:
+            await self.consume_user(db, api_key, [operation] * calls, user_id)
+        
+        if not await self._consume(db, f"{self.provider}:{key_scope(api_key)}:{day}", units, self.daily_budget, day_end):
+            if user_id:
+                await self.refund_user(db, api_key, user_id, units)
+            raise QuotaExceeded("تم استهلاك الحصة اليومية لمفتاح YouTube API", (day_end - now).total_seconds())
+        
+        return units
+    
+    async def usage(self, db, api_key: str, user_id: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        day, _ = self._day(datetime.now(timezone.utc))
+        scope = key_scope(api_key)
+        result = {}
+        counters = {"key": (f"{self.provider}:{scope}:{day}", self.daily_budget)}
+        if user_id:
+            counters["user"] = (self._user_counter(scope, user_id, day), self.user_daily_budget)
+        for name, (counter_id, budget) in counters.items():
+            counter = await db.quota_usage.find_one({"_id": counter_id}, {"used": 1})
+            result[name] = {"used": counter['used'] if counter else 0, "budget": budget}
+        return result
+
+rate_limiter = RateLimiter({
+    # طلبات إنشاء الفيديو لكل مستخدم (استدعاءات النماذج نفسها تُحسب في دلاء المزودين)
+    "video_requests": _bucket_config("video_requests", burst=60, per_minute=30),
+    "gemini": _bucket_config("gemini", burst=60, per_minute=30),
+    "openrouter": _bucket_config("openrouter", burst=60, per_minute=30),
+    "youtube": _bucket_config("youtube", burst=20, per_minute=10),
+})
+
+youtube_quota = QuotaTracker(
+    "youtube",
+    YOUTUBE_QUOTA_COSTS,
+    daily_budget=int(os.environ.get('YOUTUBE_DAILY_QUOTA', 10000)),
+    user_daily_budget=int(os.environ.get('YOUTUBE_USER_DAILY_QUOTA', 1000))
+)
@@ -0,0 +1,59 @@
+"""
+تسلسل سريع لاستجابات JSON
+المستندات القادمة من Mongo جاهزة للإرسال، فلا حاجة لتمريرها عبر jsonable_encoder
+أو إعادة التحقق منها بـ Pydantic؛ تُحوَّل مباشرة إلى bytes عبر orjson
+"""
+import json
+import logging
+from datetime import date, datetime, timezone
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson اختياري
+    orjson = None
+    logger.warning("orjson is not installed, falling back to the standard json module")
+
+def _default(value: Any) -> Any:
+    """الأنواع التي لا يعرفها المُسلسِل مباشرة"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, datetime):
+        # Motor يعيد تواريخ UTC بدون منطقة زمنية
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(content: Any) -> bytes:
+        return json.dumps(
+            content,
+            default=_default,
+            ensure_ascii=False,
+            separators=(',', ':')
+        ).encode('utf-8')
+
+class FastJSONResponse(JSONResponse):
+    """
+    استجابة JSON عبر orjson
+
+    عند إرجاعها مباشرة من نقطة النهاية يتخطى FastAPI كلاً من التحقق
+    وjsonable_encoder، لذا تُستخدم لنتائج Mongo الكبيرة (القوائم والصفحات)
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,23 +1,24 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import math
 import logging
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional
-import bcrypt
 import jwt
 from models import (
     User, UserCreate, UserLogin, Token,
-    Video, VideoCreate, Campaign,
+    VideoCreate, VideoBatchCreate, Campaign,
     APIConnection, APIKeyUpdate, TrendingTopic
 )
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import httpx
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from validators import (
     validate_gemini_key, 
     validate_kie_key,
@@ -25,10 +26,52 @@ from validators import (
     validate_youtube_credentials,
     validate_sheet_id
 )
-from encryption import (
-    encrypt_credentials, 
-    decrypt_credentials,
-    mask_credentials
+from encryption import mask_credentials
+from credentials import credential_resolver
+from user_cache import user_cache
+from http_clients import http_clients
+from trend_cache import trend_cache, normalize_trend_key
+from generation_cache import generation_cache
+from provider_router import provider_router
+from model_catalog import model_catalog, MODEL_CATALOG_REFRESH_MINUTES, SORT_KEYS
+from rate_limits import RateLimitExceeded, QuotaExceeded, rate_limiter, youtube_quota
+from chat_stream import (
+    CHAT_TEST_SYSTEM_MESSAGE,
+    SSE_HEADERS,
+    single_event,
+    stream_chat_events,
+    stream_gemini,
+    stream_openrouter,
+)
+from trends_refresh import (
+    refresh_trends,
+    get_precomputed_trends,
+    ALL_CATEGORIES,
+    TREND_REFRESH_INTERVAL_MINUTES
+)
+from indexes import ensure_indexes
+from migrate_dates import DATE_MIGRATION_PAUSE_SECONDS, ensure_dates_migrated
+from pagination import paginate, clamp_limit, DEFAULT_PAGE_SIZE
+from exports import export_cursor, iter_ndjson, iter_csv
+from serialization import FastJSONResponse
+from user_stats import get_user_stats, record_video_deleted, reconcile_all_user_stats
+from analytics_rollups import (
+    build_rollups,
+    get_analytics_overview as read_analytics_overview,
+    GRANULARITIES,
+    ROLLUP_INTERVAL_MINUTES
+)
+from video_pipeline import submit_video, video_from_create
+from batch_generation import BATCH_MAX_ITEMS, create_batch, get_batch_progress
+from worker import build_worker
+from publish_dispatcher import PublishDispatcher
+from campaign_scheduler import run_due_campaigns, CAMPAIGN_SCHEDULER_INTERVAL_SECONDS
+from cpu_executor import (
+    cpu_executor,
+    CPUExecutorSaturated,
+    hash_password,
+    check_password,
+    encrypt_credentials
 )
 
 ROOT_DIR = Path(__file__).parent
@@ -44,11 +87,10 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES',
 
 security = HTTPBearer()
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+scheduler = AsyncIOScheduler()
 
 logging.basicConfig(
     level=logging.INFO,
@@ -71,9 +113,12 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         if user_id is None:
             raise HTTPException(status_code=401, detail="بيانات اعتماد غير صالحة")
         
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = user_cache.get(user_id)
         if user is None:
-            raise HTTPException(status_code=401, detail="المستخدم غير موجود")
+            user = await db.users.find_one({"id": user_id}, {"_id": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="المستخدم غير موجود")
+            user_cache.put(user_id, user)
         return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="انتهت صلاحية الجلسة")
@@ -86,15 +131,13 @@ async def register(user_create: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="البريد الإلكتروني مسجل بالفعل")
     
-    password_hash = bcrypt.hashpw(user_create.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    password_hash = await hash_password(user_create.password)
     user = User(
         email=user_create.email,
         password_hash=password_hash
     )
     
-    user_dict = user.model_dump()
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
-    await db.users.insert_one(user_dict)
+    await db.users.insert_one(user.model_dump())
     
     access_token = create_access_token(data={"sub": user.id})
     return Token(access_token=access_token, token_type="bearer")
@@ -105,7 +148,7 @@ async def login(user_login: UserLogin):
     if not user:
         raise HTTPException(status_code=401, detail="البريد الإلكتروني أو كلمة المرور غير صحيحة")
     
-    if not bcrypt.checkpw(user_login.password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+    if not await check_password(user_login.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="البريد الإلكتروني أو كلمة المرور غير صحيحة")
     
     access_token = create_access_token(data={"sub": user['id']})
@@ -122,18 +165,23 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 @api_router.post("/settings/api-keys")
 async def update_api_keys(api_key_update: APIKeyUpdate, current_user: dict = Depends(get_current_user)):
     """حفظ مفاتيح API مع التشفير"""
-    api_keys = current_user.get('api_keys', {})
+    service = api_key_update.service
+    if not service or '.' in service or service.startswith('$'):
+        raise HTTPException(status_code=400, detail="اسم الخدمة غير صالح")
     
     # تشفير البيانات قبل الحفظ
-    encrypted_credentials = encrypt_credentials(api_key_update.credentials)
-    api_keys[api_key_update.service] = encrypted_credentials
+    encrypted_credentials = await encrypt_credentials(api_key_update.credentials)
     
+    # تحديث مفتاح هذه الخدمة فقط: current_user قد يكون نسخة قديمة من user_cache،
+    # وكتابة api_keys كاملة قد تمحو تحديثاً متزامناً لخدمة أخرى
     await db.users.update_one(
         {"id": current_user['id']},
-        {"$set": {"api_keys": api_keys}}
+        {"$set": {f"api_keys.{service}": encrypted_credentials}}
     )
+    user_cache.invalidate(current_user['id'])
+    credential_resolver.invalidate(current_user['id'], service)
     
-    return {"message": f"تم تحديث بيانات {api_key_update.service} بنجاح"}
+    return {"message": f"تم تحديث بيانات {service} بنجاح"}
 
 @api_router.get("/settings/api-keys")
 async def get_saved_api_keys(current_user: dict = Depends(get_current_user)):
@@ -144,13 +192,7 @@ async def get_saved_api_keys(current_user: dict = Depends(get_current_user)):
         return {}
     
     # فك التشفير
-    decrypted_keys = {}
-    for service, credentials in api_keys.items():
-        try:
-            decrypted_keys[service] = decrypt_credentials(credentials)
-        except Exception as e:
-            logger.error(f"Error decrypting {service} keys: {str(e)}")
-            decrypted_keys[service] = {}
+    decrypted_keys = await credential_resolver.get_all(current_user)
     
     # إخفاء المفاتيح للعرض
     masked_keys = {}
@@ -162,18 +204,11 @@ async def get_saved_api_keys(current_user: dict = Depends(get_current_user)):
 @api_router.post("/settings/test-connection")
 async def test_api_connection(service: str, current_user: dict = Depends(get_current_user)):
     """اختبار اتصال API مع validation كامل"""
-    api_keys = current_user.get('api_keys', {})
-    
-    # فك تشفير المفاتيح
-    decrypted_keys = {}
-    for svc, credentials in api_keys.items():
-        try:
-            decrypted_keys[svc] = decrypt_credentials(credentials)
-        except:
-            decrypted_keys[svc] = {}
+    # فك تشفير مفاتيح الخدمة المطلوبة فقط
+    service_creds = await credential_resolver.get(current_user, service)
     
     if service == "gemini":
-        gemini_key = decrypted_keys.get('gemini', {}).get('api_key') or os.getenv('GEMINI_API_KEY')
+        gemini_key = service_creds.get('api_key') or os.getenv('GEMINI_API_KEY')
         if not gemini_key:
             return APIConnection(service=service, status="error", message="❌ لم يتم العثور على مفتاح API")
         
@@ -184,33 +219,33 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
         
         # الخطوة 2: اختبار الاتصال الحقيقي
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                # استخدام endpoint الصحيح
-                response = await client.get(
-                    f"https://generativelanguage.googleapis.com/v1beta/models?key={gemini_key}"
-                )
-                
-                # الخطوة 3: التحقق من محتوى الاستجابة
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'models' in data and len(data['models']) > 0:
-                        models_count = len(data['models'])
-                        return APIConnection(service=service, status="success", message=f"✅ تم الاتصال بنجاح مع Gemini API ({models_count} نموذج متاح)")
-                    else:
-                        return APIConnection(service=service, status="error", message="❌ الاستجابة غير صحيحة. هذا ليس مفتاح Gemini")
-                
-                elif response.status_code == 400:
-                    error_data = response.json()
-                    error_message = error_data.get('error', {}).get('message', '')
-                    if 'API key not valid' in error_message:
-                        return APIConnection(service=service, status="error", message="❌ مفتاح API غير صالح أو منتهي الصلاحية")
-                    elif 'quota' in error_message.lower():
-                        return APIConnection(service=service, status="error", message="❌ تم تجاوز حد الاستخدام (Quota exceeded)")
-                    else:
-                        return APIConnection(service=service, status="error", message=f"❌ خطأ: {error_message}")
+            client = http_clients.get("gemini")
+            # استخدام endpoint الصحيح
+            response = await client.get(
+                f"https://generativelanguage.googleapis.com/v1beta/models?key={gemini_key}"
+            )
+            
+            # الخطوة 3: التحقق من محتوى الاستجابة
+            if response.status_code == 200:
+                data = response.json()
+                if 'models' in data and len(data['models']) > 0:
+                    models_count = len(data['models'])
+                    return APIConnection(service=service, status="success", message=f"✅ تم الاتصال بنجاح مع Gemini API ({models_count} نموذج متاح)")
                 else:
-                    return APIConnection(service=service, status="error", message=f"❌ خطأ في الخادم: {response.status_code}")
-                    
+                    return APIConnection(service=service, status="error", message="❌ الاستجابة غير صحيحة. هذا ليس مفتاح Gemini")
+            
+            elif response.status_code == 400:
+                error_data = response.json()
+                error_message = error_data.get('error', {}).get('message', '')
+                if 'API key not valid' in error_message:
+                    return APIConnection(service=service, status="error", message="❌ مفتاح API غير صالح أو منتهي الصلاحية")
+                elif 'quota' in error_message.lower():
+                    return APIConnection(service=service, status="error", message="❌ تم تجاوز حد الاستخدام (Quota exceeded)")
+                else:
+                    return APIConnection(service=service, status="error", message=f"❌ خطأ: {error_message}")
+            else:
+                return APIConnection(service=service, status="error", message=f"❌ خطأ في الخادم: {response.status_code}")
+                
         except httpx.TimeoutException:
             return APIConnection(service=service, status="error", message="❌ انتهت مهلة الاتصال (Timeout). تحقق من الإنترنت")
         except Exception as e:
@@ -218,7 +253,7 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
             return APIConnection(service=service, status="error", message=f"❌ فشل الاتصال: {str(e)}")
     
     elif service == "kie_ai":
-        kie_key = decrypted_keys.get('kie_ai', {}).get('api_key') or os.getenv('KIE_AI_API_KEY')
+        kie_key = service_creds.get('api_key') or os.getenv('KIE_AI_API_KEY')
         if not kie_key:
             return APIConnection(service=service, status="error", message="❌ لم يتم العثور على مفتاح API")
         
@@ -236,7 +271,7 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
         )
     
     elif service == "openrouter":
-        openrouter_key = decrypted_keys.get('openrouter', {}).get('api_key')
+        openrouter_key = service_creds.get('api_key')
         if not openrouter_key:
             return APIConnection(service=service, status="error", message="❌ لم يتم العثور على مفتاح API")
         
@@ -247,28 +282,28 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
         
         # اختبار الاتصال الحقيقي
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.get(
-                    "https://openrouter.ai/api/v1/models",
-                    headers={"Authorization": f"Bearer {openrouter_key}"}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'data' in data and len(data['data']) > 0:
-                        return APIConnection(
-                            service=service, 
-                            status="success", 
-                            message=f"✅ تم الاتصال بنجاح مع OpenRouter API ({len(data['data'])} موديل متاح)"
-                        )
-                    else:
-                        return APIConnection(service=service, status="error", message="❌ الاستجابة غير صحيحة")
-                
-                elif response.status_code == 401:
-                    return APIConnection(service=service, status="error", message="❌ مفتاح API غير صالح أو منتهي الصلاحية")
+            client = http_clients.get("openrouter")
+            response = await client.get(
+                "https://openrouter.ai/api/v1/models",
+                headers={"Authorization": f"Bearer {openrouter_key}"}
+            )
+            
+            if response.status_code == 200:
+                data = response.json()
+                if 'data' in data and len(data['data']) > 0:
+                    return APIConnection(
+                        service=service, 
+                        status="success", 
+                        message=f"✅ تم الاتصال بنجاح مع OpenRouter API ({len(data['data'])} موديل متاح)"
+                    )
                 else:
-                    return APIConnection(service=service, status="error", message=f"❌ خطأ: {response.status_code}")
-                    
+                    return APIConnection(service=service, status="error", message="❌ الاستجابة غير صحيحة")
+            
+            elif response.status_code == 401:
+                return APIConnection(service=service, status="error", message="❌ مفتاح API غير صالح أو منتهي الصلاحية")
+            else:
+                return APIConnection(service=service, status="error", message=f"❌ خطأ: {response.status_code}")
+                
         except httpx.TimeoutException:
             return APIConnection(service=service, status="error", message="❌ انتهت مهلة الاتصال")
         except Exception as e:
@@ -276,7 +311,7 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
             return APIConnection(service=service, status="error", message=f"❌ فشل الاتصال: {str(e)}")
     
     elif service == "youtube":
-        youtube_creds = decrypted_keys.get('youtube', {})
+        youtube_creds = service_creds
         client_id = youtube_creds.get('client_id') or os.getenv('YOUTUBE_CLIENT_ID')
         client_secret = youtube_creds.get('client_secret') or os.getenv('YOUTUBE_CLIENT_SECRET')
         
@@ -289,7 +324,7 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
         return APIConnection(service=service, status="success", message="✅ بيانات اعتماد YouTube صحيحة (يتطلب OAuth2 للاتصال الكامل)")
     
     elif service == "google_drive":
-        drive_creds = decrypted_keys.get('google_drive', {})
+        drive_creds = service_creds
         credentials_json = drive_creds.get('credentials_json')
         
         if not credentials_json:
@@ -306,7 +341,7 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
             return APIConnection(service=service, status="error", message="❌ ملف JSON غير صالح")
     
     elif service == "google_sheets":
-        sheets_config = decrypted_keys.get('google_sheets', {})
+        sheets_config = service_creds
         sheet_id = sheets_config.get('sheet_id')
         
         validation = validate_sheet_id(sheet_id)
@@ -319,28 +354,7 @@ async def test_api_connection(service: str, current_user: dict = Depends(get_cur
 
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
-    total_videos = await db.videos.count_documents({"user_id": current_user['id']})
-    published_videos = await db.videos.count_documents({"user_id": current_user['id'], "status": "published"})
-    pending_videos = await db.videos.count_documents({"user_id": current_user['id'], "status": {"$in": ["pending", "processing"]}})
-    
-    videos_cursor = db.videos.find(
-        {"user_id": current_user['id'], "analytics.views": {"$exists": True}},
-        {"_id": 0, "analytics.views": 1}
-    ).limit(100)
-    
-    total_views = 0
-    async for video in videos_cursor:
-        total_views += video.get('analytics', {}).get('views', 0)
-    
-    active_campaigns = await db.campaigns.count_documents({"user_id": current_user['id'], "status": "active"})
-    
-    return {
-        "total_videos": total_videos,
-        "published_videos": published_videos,
-        "pending_videos": pending_videos,
-        "total_views": total_views,
-        "active_campaigns": active_campaigns
-    }
+    return await get_user_stats(db, current_user['id'])
 
 @api_router.get("/videos/recent")
 async def get_recent_videos(limit: int = 5, current_user: dict = Depends(get_current_user)):
@@ -349,173 +363,96 @@ async def get_recent_videos(limit: int = 5, current_user: dict = Depends(get_cur
         {"_id": 0}
     ).sort("created_at", -1).limit(limit)
     
-    videos = await videos_cursor.to_list(length=limit)
-    
-    for video in videos:
-        if isinstance(video.get('created_at'), str):
-            video['created_at'] = datetime.fromisoformat(video['created_at'])
-        if video.get('scheduled_time') and isinstance(video['scheduled_time'], str):
-            video['scheduled_time'] = datetime.fromisoformat(video['scheduled_time'])
-        if video.get('published_at') and isinstance(video['published_at'], str):
-            video['published_at'] = datetime.fromisoformat(video['published_at'])
-    
-    return videos
-
-async def generate_video_content(topic: str, video_length: str, user_id: str) -> dict:
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
-    api_keys = user.get('api_keys', {})
-    
-    gemini_key = api_keys.get('gemini', {}).get('api_key') or os.getenv('GEMINI_API_KEY') or os.getenv('EMERGENT_LLM_KEY')
-    
-    if not gemini_key:
-        raise HTTPException(status_code=400, detail="لم يتم العثور على مفتاح Gemini API")
-    
-    chat = LlmChat(
-        api_key=gemini_key,
-        session_id=f"video-generation-{user_id}",
-        system_message="أنت كاتب محتوى محترف متخصص في إنشاء سكريبتات فيديوهات يوتيوب جذابة باللغة العربية."
-    ).with_model("gemini", "gemini-2.5-flash")
-    
-    prompt = f'''أنشئ محتوى فيديو يوتيوب كامل حول الموضوع التالي: {topic}
-مدة الفيديو المطلوبة: {video_length}
-
-يرجى تقديم:
-1. عنوان جذاب محسّن لمحركات البحث (SEO)
-2. سكريبت الفيديو الكامل
-3. وصف مفصل للفيديو
-4. 10 هاشتاغات ذات صلة
-5. 3 أفكار للصورة المصغرة
-
-قدم الإجابة بتنسيق JSON بهذا الشكل:
-{{
-  "title": "عنوان الفيديو",
-  "script": "سكريبت الفيديو الكامل...",
-  "description": "وصف الفيديو...",
-  "hashtags": ["هاشتاغ1", "هاشتاغ2", ...],
-  "thumbnail_ideas": ["فكرة 1", "فكرة 2", "فكرة 3"]
-}}'''
-    
-    try:
-        response = await chat.send_message(UserMessage(text=prompt))
-        import json
-        content_data = json.loads(response)
-        return content_data
-    except Exception as e:
-        logger.error(f"Error generating content: {str(e)}")
-        return {
-            "title": f"فيديو حول {topic}",
-            "script": f"محتوى حول {topic}",
-            "description": f"فيديو تعليمي حول {topic}",
-            "hashtags": [f"#{topic.replace(' ', '_')}"],
-            "thumbnail_ideas": ["تصميم جذاب", "ألوان زاهية", "نص واضح"]
-        }
+    return FastJSONResponse(await videos_cursor.to_list(length=limit))
 
-async def generate_video_with_ai(video_id: str):
-    video = await db.videos.find_one({"id": video_id}, {"_id": 0})
-    if not video:
-        logger.error(f"Video {video_id} not found")
-        return
-    
-    try:
-        await db.videos.update_one(
-            {"id": video_id},
-            {"$set": {"status": "processing"}}
-        )
-        
-        user = await db.users.find_one({"id": video['user_id']}, {"_id": 0})
-        api_keys = user.get('api_keys', {})
-        kie_key = api_keys.get('kie_ai', {}).get('api_key') or os.getenv('KIE_AI_API_KEY')
-        
-        if not kie_key:
-            await db.videos.update_one(
-                {"id": video_id},
-                {"$set": {"status": "failed", "error": "لم يتم العثور على مفتاح Kie.ai API"}}
-            )
-            return
-        
-        video_url = f"https://generated-video-{video_id[:8]}.mp4"
-        thumbnail_url = f"https://thumbnail-{video_id[:8]}.jpg"
-        
-        await db.videos.update_one(
-            {"id": video_id},
-            {"$set": {
-                "status": "completed",
-                "video_url": video_url,
-                "thumbnail_url": thumbnail_url
-            }}
-        )
-        
-        logger.info(f"Video {video_id} generated successfully")
-        
-    except Exception as e:
-        logger.error(f"Error generating video {video_id}: {str(e)}")
-        await db.videos.update_one(
-            {"id": video_id},
-            {"$set": {"status": "failed", "error": str(e)}}
-        )
-
-@api_router.post("/videos/create")
+@api_router.post("/videos/create", status_code=status.HTTP_202_ACCEPTED)
 async def create_video(
     video_create: VideoCreate,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user)
 ):
-    content_data = await generate_video_content(
-        video_create.topic,
-        video_create.video_length,
-        current_user['id']
-    )
+    """حفظ الفيديو بحالة pending والرد فوراً؛ يتم توليد المحتوى عبر طابور المهام"""
+    await rate_limiter.consume(db, current_user['id'], "video_requests")
+    video = video_from_create(video_create, current_user['id'])
     
-    scheduled_time = None
-    if video_create.scheduled_time:
-        scheduled_time = datetime.fromisoformat(video_create.scheduled_time.replace('Z', '+00:00'))
-    
-    video = Video(
-        user_id=current_user['id'],
-        topic=video_create.topic,
-        title=content_data.get('title', ''),
-        description=content_data.get('description', ''),
-        hashtags=content_data.get('hashtags', []),
-        dimensions=video_create.dimensions,
-        video_length=video_create.video_length,
-        voice=video_create.voice,
-        background_music=video_create.background_music,
-        character_image_url=video_create.character_image_url,
-        ai_generator=video_create.ai_generator,
-        script=content_data.get('script', ''),
-        schedule_type=video_create.schedule_type,
-        scheduled_time=scheduled_time
-    )
+    video_dict = await submit_video(db, video)
+    if publish_dispatcher is not None and video.scheduled_time:
+        publish_dispatcher.schedule(video.id, video.scheduled_time)
     
-    video_dict = video.model_dump()
-    video_dict['created_at'] = video_dict['created_at'].isoformat()
-    if video_dict.get('scheduled_time'):
-        video_dict['scheduled_time'] = video_dict['scheduled_time'].isoformat()
+    return {"id": video.id, "status": video.status, "message": "تم بدء إنشاء الفيديو", "video": video_dict}
+
+@api_router.post("/videos/batch", status_code=status.HTTP_202_ACCEPTED)
+async def create_video_batch(
+    batch_create: VideoBatchCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """إنشاء عدة فيديوهات دفعة واحدة (المواضيع المتطابقة تتشارك استدعاء توليد واحداً)"""
+    if not batch_create.items:
+        raise HTTPException(status_code=400, detail="الدفعة فارغة")
+    if len(batch_create.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"الحد الأقصى {BATCH_MAX_ITEMS} فيديو في الدفعة الواحدة")
     
-    await db.videos.insert_one(video_dict)
+    # استدعاءات النماذج تُخصم من دلاء المزودين في العامل؛ هنا يُحسب عدد الطلبات فقط
+    await rate_limiter.consume(db, current_user['id'], "video_requests", cost=len(batch_create.items))
     
-    background_tasks.add_task(generate_video_with_ai, video.id)
+    batch, videos = await create_batch(db, current_user['id'], batch_create.items)
+    if publish_dispatcher is not None:
+        for video in videos:
+            if video.get('scheduled_time'):
+                publish_dispatcher.schedule(video['id'], video['scheduled_time'])
     
-    return {"id": video.id, "message": "تم بدء إنشاء الفيديو", "video": video_dict}
+    return {
+        "id": batch['id'],
+        "message": "تم بدء إنشاء الفيديوهات",
+        "total": len(batch['video_ids']),
+        "shared_generations": sum(1 for item in batch['items'] if item['shares_content_with'] is not None),
+        "items": batch['items']
+    }
 
-@api_router.get("/videos", response_model=List[dict])
-async def get_all_videos(current_user: dict = Depends(get_current_user)):
-    videos_cursor = db.videos.find(
+@api_router.get("/videos/batch/{batch_id}")
+async def get_video_batch(batch_id: str, current_user: dict = Depends(get_current_user)):
+    """تقدم الدفعة وحالة كل عنصر"""
+    progress = await get_batch_progress(db, batch_id, current_user['id'])
+    if progress is None:
+        raise HTTPException(status_code=404, detail="الدفعة غير موجودة")
+    return FastJSONResponse(progress)
+
+@api_router.get("/videos")
+async def get_all_videos(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """قائمة الفيديوهات مرقمة بالمؤشر (بدون السكريبت الكامل)"""
+    page = await paginate(
+        db.videos,
         {"user_id": current_user['id']},
-        {"_id": 0}
-    ).sort("created_at", -1)
-    
-    videos = await videos_cursor.to_list(length=1000)
+        cursor,
+        limit,
+        projection={"_id": 0, "script": 0}
+    )
     
-    for video in videos:
-        if isinstance(video.get('created_at'), str):
-            video['created_at'] = datetime.fromisoformat(video['created_at'])
-        if video.get('scheduled_time') and isinstance(video['scheduled_time'], str):
-            video['scheduled_time'] = datetime.fromisoformat(video['scheduled_time'])
-        if video.get('published_at') and isinstance(video['published_at'], str):
-            video['published_at'] = datetime.fromisoformat(video['published_at'])
+    return FastJSONResponse(page)
+
+@api_router.get("/videos/export")
+async def export_videos(format: str = "ndjson", current_user: dict = Depends(get_current_user)):
+    """تصدير جميع فيديوهات المستخدم مع التحليلات (NDJSON أو CSV) بشكل متدفق"""
+    cursor = export_cursor(db, current_user['id'])
+    filename = f"videos-{datetime.now(timezone.utc).strftime('%Y%m%d')}"
+    
+    if format == "csv":
+        return StreamingResponse(
+            iter_csv(cursor),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        )
+    if format == "ndjson":
+        return StreamingResponse(
+            iter_ndjson(cursor),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.ndjson"'}
+        )
     
-    return videos
+    raise HTTPException(status_code=400, detail="صيغة التصدير غير مدعومة (ndjson أو csv)")
 
 @api_router.get("/videos/{video_id}")
 async def get_video(video_id: str, current_user: dict = Depends(get_current_user)):
@@ -527,58 +464,49 @@ async def get_video(video_id: str, current_user: dict = Depends(get_current_user
     if not video:
         raise HTTPException(status_code=404, detail="الفيديو غير موجود")
     
-    if isinstance(video.get('created_at'), str):
-        video['created_at'] = datetime.fromisoformat(video['created_at'])
-    if video.get('scheduled_time') and isinstance(video['scheduled_time'], str):
-        video['scheduled_time'] = datetime.fromisoformat(video['scheduled_time'])
-    
-    return video
+    return FastJSONResponse(video)
 
 @api_router.delete("/videos/{video_id}")
 async def delete_video(video_id: str, current_user: dict = Depends(get_current_user)):
-    result = await db.videos.delete_one({"id": video_id, "user_id": current_user['id']})
+    deleted = await db.videos.find_one_and_delete(
+        {"id": video_id, "user_id": current_user['id']},
+        projection={"_id": 0, "user_id": 1, "status": 1, "analytics": 1}
+    )
     
-    if result.deleted_count == 0:
+    if deleted is None:
         raise HTTPException(status_code=404, detail="الفيديو غير موجود")
     
+    await record_video_deleted(db, deleted)
+    
     return {"message": "تم حذف الفيديو بنجاح"}
 
+def parse_date_param(value: Optional[str], default: Optional[datetime]) -> Optional[datetime]:
+    if not value:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"تاريخ غير صالح: {value}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
 @api_router.get("/analytics/overview")
-async def get_analytics_overview(current_user: dict = Depends(get_current_user)):
-    videos_cursor = db.videos.find(
-        {"user_id": current_user['id'], "status": "published"},
-        {"_id": 0, "analytics": 1, "published_at": 1}
-    ).sort("published_at", -1).limit(100)
-    
-    total_views = 0
-    total_likes = 0
-    total_comments = 0
-    total_watch_time = 0
-    videos_data = []
-    
-    async for video in videos_cursor:
-        analytics = video.get('analytics', {})
-        total_views += analytics.get('views', 0)
-        total_likes += analytics.get('likes', 0)
-        total_comments += analytics.get('comments', 0)
-        total_watch_time += analytics.get('watch_time_minutes', 0)
-        videos_data.append({
-            "published_at": video.get('published_at'),
-            "views": analytics.get('views', 0)
-        })
+async def get_analytics_overview(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    granularity: str = "day",
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    ملخص التحليلات من التجميعات اليومية/الأسبوعية
+    بدون start يشمل كل الفيديوهات المنشورة كما كان سابقاً
+    """
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity يجب أن يكون day أو week")
     
-    engagement_rate = 0
-    if total_views > 0:
-        engagement_rate = ((total_likes + total_comments) / total_views) * 100
+    end_date = parse_date_param(end, datetime.now(timezone.utc))
+    start_date = parse_date_param(start, None)
     
-    return {
-        "total_views": total_views,
-        "total_likes": total_likes,
-        "total_comments": total_comments,
-        "total_watch_time_hours": round(total_watch_time / 60, 2),
-        "engagement_rate": round(engagement_rate, 2),
-        "videos_timeline": videos_data
-    }
+    return await read_analytics_overview(db, current_user['id'], start_date, end_date, granularity)
 
 @api_router.get("/analytics/top-videos")
 async def get_top_videos(limit: int = 10, current_user: dict = Depends(get_current_user)):
@@ -588,10 +516,20 @@ async def get_top_videos(limit: int = 10, current_user: dict = Depends(get_curre
     ).sort("analytics.views", -1).limit(limit)
     
     videos = await videos_cursor.to_list(length=limit)
-    return videos
+    return FastJSONResponse(videos)
 
 @api_router.get("/trends")
-async def get_trending_topics(current_user: dict = Depends(get_current_user)):
+async def get_trending_topics(
+    region: str = "SA",
+    category: str = ALL_CATEGORIES,
+    current_user: dict = Depends(get_current_user)
+):
+    """الترندات المحسوبة مسبقاً بواسطة مهمة التحديث الدورية"""
+    items = await get_precomputed_trends(db, region.upper(), category)
+    if items:
+        return items
+    
+    # لم تعمل مهمة التحديث بعد لهذه المنطقة/الفئة
     trends = [
         TrendingTopic(
             topic="الذكاء الاصطناعي في 2025",
@@ -653,127 +591,183 @@ def get_default_trends_by_keyword(keyword: str):
         TrendingTopic(topic=f"أفضل نصائح في {keyword}", views=350000, engagement_rate=6.8, related_keywords=[keyword, "نصائح", "مبتدئين"]),
     ]
 
-@api_router.get("/trends/search")
-async def search_trending_topics(keyword: str, current_user: dict = Depends(get_current_user)):
-    """البحث عن ترندات باستخدام YouTube Data API الحقيقي"""
-    user = await db.users.find_one({"id": current_user['id']}, {"_id": 0})
-    api_keys = user.get('api_keys', {})
-    
-    # فك تشفير المفاتيح
-    decrypted_keys = {}
-    for service, credentials in api_keys.items():
-        try:
-            decrypted_keys[service] = decrypt_credentials(credentials)
-        except:
-            decrypted_keys[service] = {}
+class TrendFetchError(Exception):
+    """فشل جلب الترندات من YouTube (لا تُخزَّن النتيجة)"""
+    pass
+
+# العمليات التي يستدعيها fetch_youtube_trends (لحجز حصة المستخدم مسبقاً)
+TREND_FETCH_OPERATIONS = ["search.list", "videos.list"]
+
+async def fetch_youtube_trends(
+    keyword: str,
+    youtube_key: str,
+    region: str,
+    language: str
+) -> List[TrendingTopic]:
+    """
+    جلب الترندات من YouTube Data API (بحث ثم إحصائيات)
+    نتيجته مشتركة بين كل من ينتظر نفس المفتاح، لذا تُحجز هنا حصة المفتاح فقط؛
+    حدود كل مستخدم تُخصم في الطلب نفسه قبل الانضمام إلى الجلب
+    """
+    client = http_clients.get("youtube")
+    await youtube_quota.consume(db, youtube_key, "search.list")
+    # استخدام YouTube Data API - Search endpoint
+    search_response = await client.get(
+        "https://www.googleapis.com/youtube/v3/search",
+        params={
+            "part": "snippet",
+            "q": keyword,
+            "type": "video",
+            "order": "viewCount",
+            "maxResults": 10,
+            "key": youtube_key,
+            "regionCode": region,
+            "relevanceLanguage": language
+        },
+    )
+    
+    if search_response.status_code != 200:
+        raise TrendFetchError(f"YouTube API error: {search_response.status_code}")
+    
+    search_data = search_response.json()
+    video_ids = [item['id']['videoId'] for item in search_data.get('items', [])]
+    
+    if not video_ids:
+        return []
+    
+    # جلب إحصائيات الفيديوهات
+    await youtube_quota.consume(db, youtube_key, "videos.list")
+    stats_response = await client.get(
+        "https://www.googleapis.com/youtube/v3/videos",
+        params={
+            "part": "statistics,snippet",
+            "id": ','.join(video_ids),
+            "key": youtube_key
+        }
+    )
+    
+    if stats_response.status_code != 200:
+        raise TrendFetchError(f"YouTube API error: {stats_response.status_code}")
+    
+    stats_data = stats_response.json()
+    trends = []
+    
+    for item in stats_data.get('items', []):
+        snippet = item.get('snippet', {})
+        statistics = item.get('statistics', {})
+        
+        views = int(statistics.get('viewCount', 0))
+        likes = int(statistics.get('likeCount', 0))
+        comments = int(statistics.get('commentCount', 0))
+        
+        engagement_rate = 0.0
+        if views > 0:
+            engagement_rate = ((likes + comments) / views) * 100
+        
+        keywords = []
+        if snippet.get('tags'):
+            keywords = snippet['tags'][:5]
+        else:
+            title_words = snippet.get('title', '').split()
+            keywords = [w for w in title_words if len(w) > 3][:5]
+        
+        trends.append(TrendingTopic(
+            topic=snippet.get('title', ''),
+            views=views,
+            engagement_rate=round(engagement_rate, 2),
+            related_keywords=keywords
+        ))
     
-    # محاولة الحصول على YouTube API key
-    youtube_key = decrypted_keys.get('youtube', {}).get('api_key') or os.getenv('YOUTUBE_API_KEY')
+    return trends
+
+@api_router.get("/trends/search")
+async def search_trending_topics(
+    keyword: str,
+    region: str = "SA",
+    language: str = "ar",
+    current_user: dict = Depends(get_current_user)
+):
+    """البحث عن ترندات باستخدام YouTube Data API الحقيقي (مع ذاكرة مؤقتة)"""
+    # محاولة الحصول على YouTube API key؛ المفتاح المشترك يخضع لحصة يومية لكل مستخدم أيضاً
+    youtube_key = (await credential_resolver.get(current_user, 'youtube')).get('api_key')
+    quota_user_id = None
+    if not youtube_key:
+        youtube_key = os.getenv('YOUTUBE_API_KEY')
+        quota_user_id = current_user['id']
     
     if not youtube_key:
         logger.info("No YouTube API key found, using default trends")
         return get_default_trends_by_keyword(keyword)
     
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            # استخدام YouTube Data API - Search endpoint
-            search_response = await client.get(
-                "https://www.googleapis.com/youtube/v3/search",
-                params={
-                    "part": "snippet",
-                    "q": keyword,
-                    "type": "video",
-                    "order": "viewCount",
-                    "maxResults": 10,
-                    "key": youtube_key,
-                    "regionCode": "SA",
-                    "relevanceLanguage": "ar"
-                },
-            )
-            
-            if search_response.status_code != 200:
-                logger.warning(f"YouTube API error: {search_response.status_code}")
-                return get_default_trends_by_keyword(keyword)
-            
-            search_data = search_response.json()
-            video_ids = [item['id']['videoId'] for item in search_data.get('items', [])]
-            
-            if not video_ids:
-                return get_default_trends_by_keyword(keyword)
-            
-            # جلب إحصائيات الفيديوهات
-            stats_response = await client.get(
-                "https://www.googleapis.com/youtube/v3/videos",
-                params={
-                    "part": "statistics,snippet",
-                    "id": ','.join(video_ids),
-                    "key": youtube_key
-                }
-            )
-            
-            if stats_response.status_code != 200:
+    cache_key = normalize_trend_key(keyword, region, language)
+    reserved_units = 0
+    if trend_cache.needs_fetch(cache_key):
+        # الخصم قبل الانضمام إلى الجلب المشترك حتى لا تصل أخطاء حدود هذا المستخدم إلى غيره
+        await rate_limiter.consume(db, current_user['id'], "youtube")
+        if quota_user_id:
+            try:
+                reserved_units = await youtube_quota.consume_user(db, youtube_key, TREND_FETCH_OPERATIONS, quota_user_id)
+            except QuotaExceeded as e:
+                logger.warning(e.detail)
                 return get_default_trends_by_keyword(keyword)
-            
-            stats_data = stats_response.json()
-            trends = []
-            
-            for item in stats_data.get('items', []):
-                snippet = item.get('snippet', {})
-                statistics = item.get('statistics', {})
-                
-                views = int(statistics.get('viewCount', 0))
-                likes = int(statistics.get('likeCount', 0))
-                comments = int(statistics.get('commentCount', 0))
-                
-                engagement_rate = 0.0
-                if views > 0:
-                    engagement_rate = ((likes + comments) / views) * 100
-                
-                keywords = []
-                if snippet.get('tags'):
-                    keywords = snippet['tags'][:5]
-                else:
-                    title_words = snippet.get('title', '').split()
-                    keywords = [w for w in title_words if len(w) > 3][:5]
-                
-                trends.append(TrendingTopic(
-                    topic=snippet.get('title', ''),
-                    views=views,
-                    engagement_rate=round(engagement_rate, 2),
-                    related_keywords=keywords
-                ))
-            
-            return trends
-            
+    
+    try:
+        trends = await trend_cache.get_or_fetch(
+            cache_key,
+            lambda: fetch_youtube_trends(keyword, youtube_key, region, language)
+        )
+    except QuotaExceeded as e:
+        # حصة المفتاح نفدت فلم يتم الاستدعاء: تُعاد وحدات المستخدم
+        if reserved_units:
+            await youtube_quota.refund_user(db, youtube_key, quota_user_id, reserved_units)
+        logger.warning(e.detail)
+        return get_default_trends_by_keyword(keyword)
     except httpx.TimeoutException:
         logger.error("YouTube API timeout")
         return get_default_trends_by_keyword(keyword)
+    except TrendFetchError as e:
+        logger.warning(str(e))
+        return get_default_trends_by_keyword(keyword)
     except Exception as e:
         logger.error(f"Error fetching YouTube trends: {str(e)}")
         return get_default_trends_by_keyword(keyword)
+    
+    return trends or get_default_trends_by_keyword(keyword)
 
 @api_router.get("/campaigns")
-async def get_campaigns(current_user: dict = Depends(get_current_user)):
-    campaigns_cursor = db.campaigns.find(
-        {"user_id": current_user['id']},
-        {"_id": 0}
-    ).sort("created_at", -1)
-    
-    campaigns = await campaigns_cursor.to_list(length=100)
-    
-    for campaign in campaigns:
-        if isinstance(campaign.get('created_at'), str):
-            campaign['created_at'] = datetime.fromisoformat(campaign['created_at'])
-        if campaign.get('last_run') and isinstance(campaign['last_run'], str):
-            campaign['last_run'] = datetime.fromisoformat(campaign['last_run'])
-        if campaign.get('next_run') and isinstance(campaign['next_run'], str):
-            campaign['next_run'] = datetime.fromisoformat(campaign['next_run'])
-    
-    return campaigns
+async def get_campaigns(
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    return FastJSONResponse(await paginate(db.campaigns, {"user_id": current_user['id']}, cursor, limit))
+
+OPENROUTER_FALLBACK_MODELS = [
+    {"id": "anthropic/claude-3.5-sonnet", "name": "Claude 3.5 Sonnet", "description": "الأفضل للكتابة الإبداعية"},
+    {"id": "openai/gpt-4-turbo", "name": "GPT-4 Turbo", "description": "قوي ومتنوع"},
+    {"id": "google/gemini-2.5-flash", "name": "Gemini 2.5 Flash", "description": "سريع ورخيص"},
+    {"id": "meta-llama/llama-3.3-70b", "name": "Llama 3.3 70B", "description": "مفتوح المصدر"},
+]
 
 @api_router.get("/providers/models")
-async def get_provider_models(provider: str, current_user: dict = Depends(get_current_user)):
-    """الحصول على قائمة Models المتاحة من Provider"""
+async def get_provider_models(
+    provider: str,
+    q: Optional[str] = None,
+    min_context: Optional[int] = None,
+    max_price: Optional[float] = None,
+    free: bool = False,
+    modality: Optional[str] = None,
+    sort: str = "name",
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_SIZE,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    الحصول على قائمة Models المتاحة من Provider
+    نماذج OpenRouter تُقرأ من الفهرس المحلي (بحث وتصفية وترقيم) ولا تنتظر OpenRouter أبداً
+    """
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"ترتيب غير مدعوم ({', '.join(SORT_KEYS)})")
     
     if provider == "gemini":
         return {
@@ -785,50 +779,21 @@ async def get_provider_models(provider: str, current_user: dict = Depends(get_cu
         }
     
     elif provider == "openrouter":
-        user = await db.users.find_one({"id": current_user['id']}, {"_id": 0})
-        api_keys = user.get('api_keys', {})
-        
-        # فك تشفير المفاتيح
-        decrypted_keys = {}
-        for service, credentials in api_keys.items():
-            try:
-                decrypted_keys[service] = decrypt_credentials(credentials)
-            except:
-                decrypted_keys[service] = {}
-        
-        openrouter_key = decrypted_keys.get('openrouter', {}).get('api_key')
-        
-        if not openrouter_key:
-            return {
-                "models": [
-                    {"id": "anthropic/claude-3.5-sonnet", "name": "Claude 3.5 Sonnet", "description": "الأفضل للكتابة الإبداعية"},
-                    {"id": "openai/gpt-4-turbo", "name": "GPT-4 Turbo", "description": "قوي ومتنوع"},
-                    {"id": "google/gemini-2.5-flash", "name": "Gemini 2.5 Flash", "description": "سريع ورخيص"},
-                    {"id": "meta-llama/llama-3.3-70b", "name": "Llama 3.3 70B", "description": "مفتوح المصدر"},
-                ]
-            }
+        if not model_catalog.models:
+            # لم يُحمَّل الفهرس بعد: قائمة افتراضية الآن والتحديث في الخلفية
+            model_catalog.refresh_in_background(db, http_clients.get("openrouter"))
+            return {"models": OPENROUTER_FALLBACK_MODELS, "total": len(OPENROUTER_FALLBACK_MODELS), "next_offset": None}
         
-        try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.get(
-                    "https://openrouter.ai/api/v1/models",
-                    headers={"Authorization": f"Bearer {openrouter_key}"}
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    models = []
-                    for model in data.get('data', [])[:20]:
-                        models.append({
-                            "id": model['id'],
-                            "name": model.get('name', model['id']),
-                            "description": f"Context: {model.get('context_length', 'N/A')}"
-                        })
-                    return {"models": models}
-        except Exception as e:
-            logger.error(f"Error fetching OpenRouter models: {str(e)}")
-        
-        return {"models": []}
+        return FastJSONResponse(model_catalog.query(
+            search=q,
+            min_context=min_context,
+            max_prompt_price=max_price,
+            free=free,
+            modality=modality,
+            sort=sort,
+            offset=max(offset, 0),
+            limit=clamp_limit(limit)
+        ))
     
     return {"models": []}
 
@@ -846,28 +811,49 @@ async def get_model_purposes():
         ]
     }
 
+async def stream_test_chat(message: str, provider: str, model: str, current_user: dict) -> StreamingResponse:
+    """نسخة متدفقة من /chat/test: أحداث token ثم done (أو error)"""
+    if provider == "gemini":
+        api_key = (await credential_resolver.get(current_user, 'gemini')).get('api_key') or os.getenv('GEMINI_API_KEY')
+        tokens = stream_gemini(http_clients.get("gemini"), api_key, model, message) if api_key else None
+    elif provider == "openrouter":
+        api_key = (await credential_resolver.get(current_user, 'openrouter')).get('api_key')
+        tokens = stream_openrouter(http_clients.get("openrouter"), api_key, model, message) if api_key else None
+    else:
+        return StreamingResponse(
+            single_event("error", {"success": False, "response": "❌ مزود غير مدعوم", "error": "invalid_provider"}),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
+    
+    if tokens is None:
+        events = single_event("error", {
+            "success": False,
+            "response": "❌ لم يتم العثور على مفتاح API. يرجى إضافته في الإعدادات.",
+            "error": "missing_key"
+        })
+    else:
+        events = stream_chat_events(tokens, provider, model)
+    
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
 @api_router.post("/chat/test")
 async def test_chat(
     message: str,
     provider: str = "gemini",
     model: str = "gemini-2.5-flash",
+    stream: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
-    """اختبار الدردشة مع الذكاء الاصطناعي"""
-    user = await db.users.find_one({"id": current_user['id']}, {"_id": 0})
-    api_keys = user.get('api_keys', {})
+    """اختبار الدردشة مع الذكاء الاصطناعي (stream=true للبث كـ Server-Sent Events)"""
+    await rate_limiter.consume(db, current_user['id'], provider)
     
-    # فك تشفير المفاتيح
-    decrypted_keys = {}
-    for service, credentials in api_keys.items():
-        try:
-            decrypted_keys[service] = decrypt_credentials(credentials)
-        except:
-            decrypted_keys[service] = {}
+    if stream:
+        return await stream_test_chat(message, provider, model, current_user)
     
     try:
         if provider == "gemini":
-            gemini_key = decrypted_keys.get('gemini', {}).get('api_key') or os.getenv('GEMINI_API_KEY')
+            gemini_key = (await credential_resolver.get(current_user, 'gemini')).get('api_key') or os.getenv('GEMINI_API_KEY')
             if not gemini_key:
                 return {
                     "success": False,
@@ -879,7 +865,7 @@ async def test_chat(
                 chat = LlmChat(
                     api_key=gemini_key,
                     session_id=f"test-chat-{current_user['id']}",
-                    system_message="أنت مساعد ذكي ومفيد. أجب بشكل موجز ومباشر."
+                    system_message=CHAT_TEST_SYSTEM_MESSAGE
                 ).with_model("gemini", model)
                 
                 response = await chat.send_message(UserMessage(text=message))
@@ -899,7 +885,7 @@ async def test_chat(
                 }
         
         elif provider == "openrouter":
-            openrouter_key = decrypted_keys.get('openrouter', {}).get('api_key')
+            openrouter_key = (await credential_resolver.get(current_user, 'openrouter')).get('api_key')
             if not openrouter_key:
                 return {
                     "success": False,
@@ -908,38 +894,38 @@ async def test_chat(
                 }
             
             try:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(
-                        "https://openrouter.ai/api/v1/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {openrouter_key}",
-                            "Content-Type": "application/json"
-                        },
-                        json={
-                            "model": model,
-                            "messages": [
-                                {"role": "system", "content": "أنت مساعد ذكي ومفيد. أجب بشكل موجز ومباشر."},
-                                {"role": "user", "content": message}
-                            ]
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        ai_response = data['choices'][0]['message']['content']
-                        return {
-                            "success": True,
-                            "response": ai_response,
-                            "provider": provider,
-                            "model": model
-                        }
-                    else:
-                        error_data = response.json()
-                        return {
-                            "success": False,
-                            "response": f"❌ خطأ: {error_data.get('error', {}).get('message', 'خطأ غير معروف')}",
-                            "error": "api_error"
-                        }
+                client = http_clients.get("openrouter")
+                response = await client.post(
+                    "https://openrouter.ai/api/v1/chat/completions",
+                    headers={
+                        "Authorization": f"Bearer {openrouter_key}",
+                        "Content-Type": "application/json"
+                    },
+                    json={
+                        "model": model,
+                        "messages": [
+                            {"role": "system", "content": CHAT_TEST_SYSTEM_MESSAGE},
+                            {"role": "user", "content": message}
+                        ]
+                    }
+                )
+                
+                if response.status_code == 200:
+                    data = response.json()
+                    ai_response = data['choices'][0]['message']['content']
+                    return {
+                        "success": True,
+                        "response": ai_response,
+                        "provider": provider,
+                        "model": model
+                    }
+                else:
+                    error_data = response.json()
+                    return {
+                        "success": False,
+                        "response": f"❌ خطأ: {error_data.get('error', {}).get('message', 'خطأ غير معروف')}",
+                        "error": "api_error"
+                    }
             except Exception as e:
                 logger.error(f"OpenRouter chat error: {str(e)}")
                 return {
@@ -955,6 +941,9 @@ async def test_chat(
                 "error": "invalid_provider"
             }
     
+    except CPUExecutorSaturated:
+        # يُحوَّل إلى 503 مع Retry-After عبر cpu_executor_saturated_handler
+        raise
     except Exception as e:
         logger.error(f"Chat test error: {str(e)}")
         return {
@@ -963,12 +952,56 @@ async def test_chat(
             "error": "unknown_error"
         }
 
+@api_router.get("/system/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    """عدادات الإصابة/الإخفاق للذاكرات المؤقتة (للمساعدة في ضبط أحجامها)"""
+    return {
+        "users": user_cache.stats(),
+        "credentials": credential_resolver.stats(),
+        "trends": trend_cache.stats(),
+        "generation": generation_cache.stats(),
+        "model_catalog": model_catalog.stats()
+    }
+
+@api_router.get("/system/provider-stats")
+async def get_provider_stats(current_user: dict = Depends(get_current_user)):
+    """زمن الاستجابة ونسبة الأخطاء لكل مزود/نموذج في هذه العملية، مع عدادات التحوّط والتحويل"""
+    return provider_router.stats()
+
+@api_router.get("/system/quota")
+async def get_quota_usage(current_user: dict = Depends(get_current_user)):
+    """استهلاك اليوم من حصة YouTube API للمفتاح المستخدم (ولحصة المستخدم على المفتاح المشترك)"""
+    youtube_key = (await credential_resolver.get(current_user, 'youtube')).get('api_key')
+    quota_user_id = None
+    if not youtube_key:
+        youtube_key = os.getenv('YOUTUBE_API_KEY')
+        quota_user_id = current_user['id']
+    if not youtube_key:
+        return {"youtube": None}
+    return {"youtube": await youtube_quota.usage(db, youtube_key, quota_user_id)}
+
 @api_router.get("/")
 async def root():
     return {"message": "مرحباً بك في YouAI API"}
 
 app.include_router(api_router)
 
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.exception_handler(CPUExecutorSaturated)
+async def cpu_executor_saturated_handler(request: Request, exc: CPUExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "الخادم مشغول حالياً، يرجى المحاولة بعد قليل"},
+        headers={"Retry-After": "1"}
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -977,7 +1010,133 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def run_campaign_scheduler():
+    await run_due_campaigns(db)
+
+STATS_RECONCILIATION_INTERVAL_HOURS = int(os.environ.get('STATS_RECONCILIATION_INTERVAL_HOURS', 24))
+
+async def run_stats_reconciliation():
+    # كل عملية تجدول المهمة؛ العقد وmin_interval يجعلان عملية واحدة تطابق في كل دورة
+    await reconcile_all_user_stats(db, min_interval=timedelta(hours=STATS_RECONCILIATION_INTERVAL_HOURS / 2))
+
+async def run_analytics_rollups():
+    await build_rollups(db)
+
+async def run_model_catalog_refresh():
+    await model_catalog.refresh(db, http_clients.get("openrouter"))
+
+async def run_date_migration():
+    await ensure_dates_migrated(db, pause=DATE_MIGRATION_PAUSE_SECONDS)
+
+async def run_trend_refresh():
+    await refresh_trends(db, http_clients.get("youtube"), os.getenv('YOUTUBE_API_KEY'))
+
+@app.on_event("startup")
+async def startup_http_clients():
+    await http_clients.startup()
+
+# عامل داخل عملية API (للنشر البسيط). اضبطه على 0 عند تشغيل worker.py بشكل منفصل
+JOB_WORKER_INPROCESS_CONCURRENCY = int(os.environ.get('JOB_WORKER_INPROCESS_CONCURRENCY', 1))
+inprocess_worker = build_worker(db, JOB_WORKER_INPROCESS_CONCURRENCY) if JOB_WORKER_INPROCESS_CONCURRENCY > 0 else None
+
+publish_dispatcher = PublishDispatcher(db) if os.environ.get('PUBLISH_DISPATCHER_ENABLED', 'true').lower() == 'true' else None
+
+@app.on_event("startup")
+async def startup_indexes():
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def startup_model_catalog():
+    await model_catalog.load(db)
+
+@app.on_event("startup")
+async def startup_job_queue():
+    if inprocess_worker is not None:
+        inprocess_worker.start()
+
+@app.on_event("startup")
+async def startup_publish_dispatcher():
+    if publish_dispatcher is not None:
+        publish_dispatcher.start()
+
+@app.on_event("startup")
+async def startup_scheduler():
+    if os.environ.get('TREND_REFRESH_ENABLED', 'true').lower() == 'true':
+        scheduler.add_job(
+            run_trend_refresh,
+            'interval',
+            minutes=TREND_REFRESH_INTERVAL_MINUTES,
+            next_run_time=datetime.now(timezone.utc),
+            id='trend_refresh',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    if os.environ.get('MODEL_CATALOG_REFRESH_ENABLED', 'true').lower() == 'true':
+        scheduler.add_job(
+            run_model_catalog_refresh,
+            'interval',
+            minutes=MODEL_CATALOG_REFRESH_MINUTES,
+            next_run_time=datetime.now(timezone.utc),
+            id='model_catalog_refresh',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    if os.environ.get('CAMPAIGN_SCHEDULER_ENABLED', 'true').lower() == 'true':
+        scheduler.add_job(
+            run_campaign_scheduler,
+            'interval',
+            seconds=CAMPAIGN_SCHEDULER_INTERVAL_SECONDS,
+            id='campaign_scheduler',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    if os.environ.get('STATS_RECONCILIATION_ENABLED', 'true').lower() == 'true':
+        scheduler.add_job(
+            run_stats_reconciliation,
+            'interval',
+            hours=STATS_RECONCILIATION_INTERVAL_HOURS,
+            next_run_time=datetime.now(timezone.utc),
+            id='stats_reconciliation',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    if os.environ.get('DATE_MIGRATION_ENABLED', 'true').lower() == 'true':
+        # في الخلفية حتى لا ينتظر بدء التشغيل مسح المجموعات؛ بعد الاكتمال كل دورة قراءة واحدة،
+        # والتكرار يسمح لعملية أخرى بالإكمال إذا توقفت العملية التي بدأته
+        scheduler.add_job(
+            run_date_migration,
+            'interval',
+            minutes=int(os.environ.get('DATE_MIGRATION_CHECK_MINUTES', 10)),
+            next_run_time=datetime.now(timezone.utc),
+            id='date_migration',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    if os.environ.get('ANALYTICS_ROLLUPS_ENABLED', 'true').lower() == 'true':
+        scheduler.add_job(
+            run_analytics_rollups,
+            'interval',
+            minutes=ROLLUP_INTERVAL_MINUTES,
+            next_run_time=datetime.now(timezone.utc),
+            id='analytics_rollups',
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+    scheduler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if publish_dispatcher is not None:
+        await publish_dispatcher.stop()
+    if inprocess_worker is not None:
+        await inprocess_worker.stop()
     client.close()
     scheduler.shutdown()
+    cpu_executor.shutdown()
+    await http_clients.shutdown()
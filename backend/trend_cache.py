@@ -0,0 +1,119 @@
+"""
+ذاكرة مؤقتة لنتائج البحث عن الترندات
+- مفتاح مُطبّع (الكلمة المفتاحية، المنطقة، اللغة)
+- TTL قابل للضبط مع إخلاء LRU
+- دمج الطلبات المتزامنة المتطابقة في جلب واحد (single-flight)
+- إرجاع النتيجة القديمة أثناء تحديثها في الخلفية (stale-while-revalidate)
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TrendKey = Tuple[str, str, str]
+
+def normalize_trend_key(keyword: str, region: str, language: str) -> TrendKey:
+    """تطبيع الكلمة المفتاحية: حذف المسافات الزائدة وتوحيد حالة الأحرف"""
+    return (' '.join(keyword.split()).casefold(), region.upper(), language.lower())
+
+class TrendCache:
+    """
+    Args:
+        maxsize: الحد الأقصى لعدد المفاتيح (يُخلى الأقدم استخداماً)
+        ttl: مدة صلاحية النتيجة بالثواني
+        stale_ttl: المدة الإضافية التي تُرجع فيها النتيجة القديمة مع تحديثها في الخلفية
+    """
+    
+    def __init__(self, maxsize: int = 1000, ttl: float = 900, stale_ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[TrendKey, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[TrendKey, asyncio.Future] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+    
+    def _store(self, key: TrendKey, value: Any):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def _fetch_once(self, key: TrendKey, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        """تشغيل fetch مرة واحدة لكل مفتاح، ومشاركة النتيجة مع كل المنتظرين"""
+        future = self._inflight.get(key)
+        if future is not None:
+            return future
+        
+        async def runner():
+            try:
+                value = await fetch()
+                self._store(key, value)
+                return value
+            finally:
+                self._inflight.pop(key, None)
+        
+        future = asyncio.ensure_future(runner())
+        self._inflight[key] = future
+        return future
+    
+    def _refresh_in_background(self, key: TrendKey, fetch: Callable[[], Awaitable[Any]]):
+        if key in self._inflight:
+            return
+        
+        def log_failure(task: asyncio.Future):
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(f"Background trend refresh failed for {key}: {task.exception()}")
+        
+        self._fetch_once(key, fetch).add_done_callback(log_failure)
+    
+    def needs_fetch(self, key: TrendKey) -> bool:
+        """هل سينتظر get_or_fetch جلباً (لا توجد نتيجة حديثة أو قديمة صالحة)؟"""
+        entry = self._entries.get(key)
+        return entry is None or time.monotonic() - entry[0] >= self.ttl + self.stale_ttl
+    
+    async def get_or_fetch(self, key: TrendKey, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        إرجاع النتيجة المخزنة أو جلبها. أي استثناء من fetch يُمرَّر للمستدعي
+        ولا يُخزَّن، فيحاول الطلب التالي الجلب من جديد.
+        """
+        entry: Optional[Tuple[float, Any]] = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._refresh_in_background(key, fetch)
+                return entry[1]
+        
+        self.misses += 1
+        # shield: إلغاء أحد المنتظرين لا يلغي الجلب المشترك
+        return await asyncio.shield(self._fetch_once(key, fetch))
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight)
+        }
+
+trend_cache = TrendCache(
+    maxsize=int(os.environ.get('TREND_CACHE_SIZE', 1000)),
+    ttl=float(os.environ.get('TREND_CACHE_TTL_SECONDS', 900)),
+    stale_ttl=float(os.environ.get('TREND_CACHE_STALE_SECONDS', 3600))
+)
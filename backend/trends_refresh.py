@@ -0,0 +1,141 @@
+"""
+مهمة دورية لتحديث الترندات المحسوبة مسبقاً
+تجلب أكثر الفيديوهات رواجاً لكل منطقة وفئة وتخزنها في مجموعة trends
+بحيث تصبح /api/trends قراءة مفهرسة بدون أي استدعاء خارجي وقت الطلب
+"""
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from pymongo import ReplaceOne
+
+from rate_limits import QuotaExceeded, youtube_quota
+
+logger = logging.getLogger(__name__)
+
+# الفئة "0" تعني كل الفئات (بدون videoCategoryId)
+ALL_CATEGORIES = "0"
+
+TREND_REFRESH_REGIONS = [r.strip().upper() for r in os.environ.get('TREND_REFRESH_REGIONS', 'SA,EG,AE').split(',') if r.strip()]
+TREND_REFRESH_CATEGORIES = [c.strip() for c in os.environ.get('TREND_REFRESH_CATEGORIES', '0,10,20,24,27,28').split(',') if c.strip()]
+TREND_REFRESH_INTERVAL_MINUTES = int(os.environ.get('TREND_REFRESH_INTERVAL_MINUTES', 30))
+TREND_REFRESH_MAX_RESULTS = int(os.environ.get('TREND_REFRESH_MAX_RESULTS', 50))
+
+def trend_doc_id(region: str, category: str) -> str:
+    return f"{region.upper()}:{category}"
+
+def _compact_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """تحويل فيديو من YouTube إلى عنصر ترند مختصر"""
+    snippet = item.get('snippet', {})
+    statistics = item.get('statistics', {})
+    
+    views = int(statistics.get('viewCount', 0))
+    likes = int(statistics.get('likeCount', 0))
+    comments = int(statistics.get('commentCount', 0))
+    
+    engagement_rate = 0.0
+    if views > 0:
+        engagement_rate = ((likes + comments) / views) * 100
+    
+    if snippet.get('tags'):
+        keywords = snippet['tags'][:5]
+    else:
+        keywords = [w for w in snippet.get('title', '').split() if len(w) > 3][:5]
+    
+    return {
+        "topic": snippet.get('title', ''),
+        "views": views,
+        "engagement_rate": round(engagement_rate, 2),
+        "related_keywords": keywords
+    }
+
+async def fetch_most_popular(
+    client: httpx.AsyncClient,
+    api_key: str,
+    region: str,
+    category: str
+) -> List[Dict[str, Any]]:
+    """استدعاء واحد لـ videos?chart=mostPopular لكل (منطقة، فئة)"""
+    params = {
+        "part": "snippet,statistics",
+        "chart": "mostPopular",
+        "regionCode": region,
+        "maxResults": TREND_REFRESH_MAX_RESULTS,
+        "key": api_key
+    }
+    if category != ALL_CATEGORIES:
+        params["videoCategoryId"] = category
+    
+    response = await client.get("https://www.googleapis.com/youtube/v3/videos", params=params)
+    if response.status_code != 200:
+        raise RuntimeError(f"YouTube API error {response.status_code} for {region}/{category}")
+    
+    items = [_compact_item(item) for item in response.json().get('items', [])]
+    items.sort(key=lambda t: t['views'], reverse=True)
+    return items
+
+async def refresh_trends(
+    db,
+    client: httpx.AsyncClient,
+    api_key: Optional[str],
+    regions: Optional[List[str]] = None,
+    categories: Optional[List[str]] = None
+) -> int:
+    """
+    تحديث مجموعة trends دفعة واحدة (bulk_write)
+    
+    Returns:
+        عدد مستندات (منطقة، فئة) التي تم تحديثها
+    """
+    if not api_key:
+        logger.info("No YOUTUBE_API_KEY configured, skipping trend refresh")
+        return 0
+    
+    now = datetime.now(timezone.utc)
+    operations = []
+    quota_exhausted = False
+    for region in regions or TREND_REFRESH_REGIONS:
+        if quota_exhausted:
+            break
+        for category in categories or TREND_REFRESH_CATEGORIES:
+            try:
+                await youtube_quota.consume(db, api_key, "videos.list")
+            except QuotaExceeded as e:
+                # ما تم جلبه حتى الآن يُحفظ، والبقية تبقى على بياناتها السابقة
+                logger.warning(f"Trend refresh stopped: {e.detail}")
+                quota_exhausted = True
+                break
+            
+            try:
+                items = await fetch_most_popular(client, api_key, region, category)
+            except Exception as e:
+                # الإبقاء على البيانات السابقة لهذه المنطقة/الفئة
+                logger.warning(f"Trend refresh failed: {str(e)}")
+                continue
+            
+            operations.append(ReplaceOne(
+                {"_id": trend_doc_id(region, category)},
+                {
+                    "_id": trend_doc_id(region, category),
+                    "region": region,
+                    "category": category,
+                    "items": items,
+                    "refreshed_at": now
+                },
+                upsert=True
+            ))
+    
+    if operations:
+        await db.trends.bulk_write(operations, ordered=False)
+    
+    logger.info(f"Trend refresh updated {len(operations)} region/category documents")
+    return len(operations)
+
+async def get_precomputed_trends(db, region: str, category: str = ALL_CATEGORIES) -> Optional[List[Dict[str, Any]]]:
+    """قراءة بالمفتاح الأساسي (_id) من مجموعة trends"""
+    doc = await db.trends.find_one({"_id": trend_doc_id(region, category)}, {"items": 1})
+    if doc is None:
+        return None
+    return doc.get('items', [])
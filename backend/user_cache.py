@@ -0,0 +1,48 @@
+"""
+ذاكرة مؤقتة داخل العملية لمستندات المستخدمين المصادق عليهم
+"""
+import os
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+
+class UserCache:
+    """
+    ذاكرة LRU قصيرة العمر لمستندات المستخدمين بمفتاح JWT sub.
+    يجب استدعاء invalidate بعد أي كتابة على مجموعة users.
+    """
+    
+    def __init__(self, maxsize: int = 2048, ttl: float = 30):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, user_id: str) -> Optional[dict]:
+        user = self._cache.get(user_id)
+        if user is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return user
+    
+    def put(self, user_id: str, user: dict):
+        self._cache[user_id] = user
+    
+    def invalidate(self, user_id: str):
+        self._cache.pop(user_id, None)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._cache),
+            "maxsize": int(self._cache.maxsize),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+user_cache = UserCache(
+    maxsize=int(os.environ.get('USER_CACHE_SIZE', 2048)),
+    ttl=float(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+)
@@ -0,0 +1,200 @@
+"""
+إحصائيات لوحة التحكم لكل مستخدم
+- مستند user_stats لكل مستخدم يُحدَّث بـ $inc عند إضافة فيديو أو تغيير حالته أو حذفه
+- مهمة مطابقة (reconciliation) تعيد بناء العدادات من الصفر، بعملية واحدة في كل مرة،
+  وكتابتها مشروطة بـ version حتى لا تطغى على $inc وصل أثناء الحساب
+"""
+import os
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ["pending", "processing"]
+
+STAT_FIELDS = ("total_videos", "published_videos", "pending_videos", "total_views", "active_campaigns")
+
+RECONCILE_MAX_ATTEMPTS = 3
+RECONCILE_LEASE_MINUTES = int(os.environ.get('STATS_RECONCILIATION_LEASE_MINUTES', 60))
+RECONCILE_STATE_ID = "reconcile"
+
+def dashboard_stats_pipeline(user_id: str) -> List[Dict[str, Any]]:
+    """
+    تجميع واحد يحسب جميع العدادات في رحلة واحدة إلى قاعدة البيانات:
+    عدادات الفيديوهات ومجموع المشاهدات الكامل من videos،
+    وعدد الحملات النشطة عبر $unionWith على campaigns
+    """
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$group": {
+            "_id": None,
+            "total_videos": {"$sum": 1},
+            "published_videos": {"$sum": {"$cond": [{"$eq": ["$status", "published"]}, 1, 0]}},
+            "pending_videos": {"$sum": {"$cond": [{"$in": ["$status", PENDING_STATUSES]}, 1, 0]}},
+            "total_views": {"$sum": {"$ifNull": ["$analytics.views", 0]}}
+        }},
+        {"$unionWith": {
+            "coll": "campaigns",
+            "pipeline": [
+                {"$match": {"user_id": user_id, "status": "active"}},
+                {"$count": "active_campaigns"}
+            ]
+        }},
+        {"$group": {
+            "_id": None,
+            **{field: {"$sum": f"${field}"} for field in STAT_FIELDS}
+        }}
+    ]
+
+async def compute_dashboard_stats(db, user_id: str) -> Dict[str, int]:
+    result = await db.videos.aggregate(dashboard_stats_pipeline(user_id)).to_list(length=1)
+    stats = result[0] if result else {}
+    return {field: stats.get(field, 0) for field in STAT_FIELDS}
+
+def _status_counters(status: Optional[str]) -> Dict[str, int]:
+    return {
+        "published_videos": 1 if status == "published" else 0,
+        "pending_videos": 1 if status in PENDING_STATUSES else 0
+    }
+
+def _status_delta(old_status: Optional[str], new_status: str) -> Dict[str, int]:
+    old = _status_counters(old_status)
+    new = _status_counters(new_status)
+    return {field: new[field] - old[field] for field in new if new[field] != old[field]}
+
+def video_delta(old: Optional[dict], new: Optional[dict]) -> Dict[str, int]:
+    """
+    الفرق في العدادات بين حالتين للفيديو (None = غير موجود)
+    """
+    delta = {}
+    for side, sign in ((new, 1), (old, -1)):
+        if side is None:
+            continue
+        counters = _status_counters(side.get('status'))
+        counters["total_videos"] = 1
+        counters["total_views"] = (side.get('analytics') or {}).get('views', 0)
+        for field, value in counters.items():
+            delta[field] = delta.get(field, 0) + sign * value
+    return {field: value for field, value in delta.items() if value}
+
+async def apply_stats_delta(db, user_id: str, delta: Dict[str, int]):
+    """
+    تحديث ذري للعدادات بـ $inc على مستند موجود فقط
+    بدون upsert: إنشاء المستند من الفرق وحده يعطي مجاميع خاطئة (وقد يصبح pending سالباً)،
+    لذا يُترك المستند المفقود ليُبنى كاملاً عند أول قراءة في get_user_stats
+    """
+    if not delta:
+        return
+    # version يُعلم reconcile_user_stats بأن العدادات تغيرت أثناء حسابها
+    await db.user_stats.update_one(
+        {"_id": user_id},
+        {"$inc": {**delta, "version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}}
+    )
+
+async def record_video_inserted(db, video: dict):
+    await apply_stats_delta(db, video['user_id'], video_delta(None, video))
+
+async def record_video_deleted(db, video: dict):
+    await apply_stats_delta(db, video['user_id'], video_delta(video, None))
+
+async def set_video_status(db, video_id: str, status: str, **fields) -> Optional[dict]:
+    """
+    تغيير حالة الفيديو وتحديث العدادات حسب الحالة السابقة
+    
+    Returns:
+        الفيديو قبل التحديث (أو None إن لم يوجد)
+    """
+    previous = await db.videos.find_one_and_update(
+        {"id": video_id},
+        {"$set": {"status": status, **fields}},
+        projection={"_id": 0, "user_id": 1, "status": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is not None:
+        await apply_stats_delta(db, previous['user_id'], _status_delta(previous.get('status'), status))
+    return previous
+
+async def reconcile_user_stats(db, user_id: str, attempts: int = RECONCILE_MAX_ATTEMPTS) -> Dict[str, int]:
+    """
+    إعادة حساب عدادات مستخدم من الصفر وحفظها
+    الكتابة مشروطة بقيمة version المقروءة قبل التجميع: إذا وصل $inc في هذه الأثناء
+    تُعاد المحاولة بدل أن تطغى اللقطة المحسوبة على التحديث
+    """
+    for _ in range(attempts):
+        current = await db.user_stats.find_one({"_id": user_id}, {"version": 1})
+        stats = await compute_dashboard_stats(db, user_id)
+        now = datetime.now(timezone.utc)
+        if current is None:
+            try:
+                await db.user_stats.insert_one({"_id": user_id, **stats, "version": 0, "updated_at": now, "reconciled_at": now})
+            except DuplicateKeyError:
+                continue
+            return stats
+        
+        result = await db.user_stats.update_one(
+            {"_id": user_id, "version": current.get('version')},
+            {"$set": {**stats, "updated_at": now, "reconciled_at": now}}
+        )
+        if result.matched_count == 1:
+            return stats
+    
+    logger.warning(f"Stats for user {user_id} kept changing during reconciliation, skipped")
+    return stats
+
+async def _acquire_reconcile_lease(db, owner: str, min_interval: timedelta) -> bool:
+    """عملية واحدة فقط تطابق في كل مرة، ولا تتكرر المطابقة قبل min_interval"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.user_stats_state.update_one(
+            {
+                "_id": RECONCILE_STATE_ID,
+                "$and": [
+                    {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                    {"$or": [{"last_run": None}, {"last_run": {"$lt": now - min_interval}}]}
+                ]
+            },
+            {"$set": {"lease_owner": owner, "lease_until": now + timedelta(minutes=RECONCILE_LEASE_MINUTES)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+async def reconcile_all_user_stats(db, min_interval: timedelta = timedelta(0)) -> Optional[int]:
+    """
+    مهمة المطابقة الدورية: إعادة بناء العدادات لكل المستخدمين
+    
+    Returns:
+        عدد المستخدمين، أو None إذا كانت عملية أخرى تطابق أو طابقت قبل أقل من min_interval
+    """
+    owner = str(uuid.uuid4())
+    if not await _acquire_reconcile_lease(db, owner, min_interval):
+        return None
+    
+    count = 0
+    try:
+        async for user in db.users.find({}, {"_id": 0, "id": 1}):
+            try:
+                await reconcile_user_stats(db, user['id'])
+                count += 1
+            except Exception as e:
+                logger.error(f"Failed to reconcile stats for user {user['id']}: {str(e)}")
+    finally:
+        await db.user_stats_state.update_one(
+            {"_id": RECONCILE_STATE_ID, "lease_owner": owner},
+            {"$set": {"lease_until": None, "last_run": datetime.now(timezone.utc)}}
+        )
+    logger.info(f"Reconciled stats for {count} users")
+    return count
+
+async def get_user_stats(db, user_id: str) -> Dict[str, int]:
+    """قراءة نقطية لمستند الإحصائيات (يُبنى عند أول طلب إن لم يوجد)"""
+    doc = await db.user_stats.find_one({"_id": user_id})
+    if doc is None:
+        return await reconcile_user_stats(db, user_id)
+    return {field: doc.get(field, 0) for field in STAT_FIELDS}
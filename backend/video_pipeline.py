@@ -0,0 +1,220 @@
+"""
+خط إنتاج الفيديو: توليد المحتوى ثم إنشاء الفيديو
+يُستخدم من عامل الطابور (worker.py) ومن الخادم
+"""
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from credentials import credential_resolver
+from generation_cache import generation_cache, generation_cache_key
+from job_queue import enqueue
+from provider_router import DEFAULT_MODELS, provider_router
+from publish_dispatcher import PUBLISH_SCHEDULED
+from models import Video, VideoCreate
+from user_stats import set_video_status, record_video_inserted
+
+logger = logging.getLogger(__name__)
+
+GENERATE_VIDEO_JOB = "generate_video"
+
+# يجب رفعه عند تعديل نص الـ prompt حتى لا تُعاد نتائج الإصدار السابق من الذاكرة المؤقتة
+GENERATION_PROMPT_VERSION = "v1"
+CONTENT_PROVIDER = "gemini"
+CONTENT_SYSTEM_MESSAGE = "أنت كاتب محتوى محترف متخصص في إنشاء سكريبتات فيديوهات يوتيوب جذابة باللغة العربية."
+
+def parse_content_response(response: str) -> dict:
+    """تحليل JSON الرد (مع إزالة ```json إن وُجد)؛ الرد غير الصالح يرفع ValueError"""
+    text = response.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    content_data = json.loads(text)
+    if not isinstance(content_data, dict) or not content_data.get('script'):
+        raise ValueError("الرد لا يحتوي على سكريبت")
+    return content_data
+
+async def resolve_provider_keys(user: dict) -> Dict[str, str]:
+    keys = {
+        "gemini": (await credential_resolver.get(user, 'gemini')).get('api_key') or os.getenv('GEMINI_API_KEY') or os.getenv('EMERGENT_LLM_KEY'),
+        "openrouter": (await credential_resolver.get(user, 'openrouter')).get('api_key')
+    }
+    return {provider: key for provider, key in keys.items() if key}
+
+async def generate_video_content(
+    db,
+    topic: str,
+    video_length: str,
+    user: dict,
+    use_cache: bool = True,
+    provider: Optional[str] = None,
+    model: Optional[str] = None
+) -> dict:
+    """
+    توليد محتوى الفيديو عبر موجه المزودين (provider_router)
+    يرفع GenerationError إذا فشلت جميع المسارات حتى يعيد الطابور المحاولة
+    """
+    provider = provider if provider in DEFAULT_MODELS else CONTENT_PROVIDER
+    model = model or DEFAULT_MODELS[provider]
+    cache_key = generation_cache_key(topic, video_length, provider, model, GENERATION_PROMPT_VERSION)
+    if use_cache:
+        cached = await generation_cache.get(db, cache_key)
+        if cached is not None:
+            return cached
+    else:
+        generation_cache.record_bypass()
+    
+    prompt = f'''أنشئ محتوى فيديو يوتيوب كامل حول الموضوع التالي: {topic}
+مدة الفيديو المطلوبة: {video_length}
+
+يرجى تقديم:
+1. عنوان جذاب محسّن لمحركات البحث (SEO)
+2. سكريبت الفيديو الكامل
+3. وصف مفصل للفيديو
+4. 10 هاشتاغات ذات صلة
+5. 3 أفكار للصورة المصغرة
+
+قدم الإجابة بتنسيق JSON بهذا الشكل:
+{{
+  "title": "عنوان الفيديو",
+  "script": "سكريبت الفيديو الكامل...",
+  "description": "وصف الفيديو...",
+  "hashtags": ["هاشتاغ1", "هاشتاغ2", ...],
+  "thumbnail_ideas": ["فكرة 1", "فكرة 2", "فكرة 3"]
+}}'''
+    
+    content_data, route = await provider_router.generate(
+        provider,
+        model,
+        await resolve_provider_keys(user),
+        CONTENT_SYSTEM_MESSAGE,
+        prompt,
+        session_id=f"video-generation-{user['id']}",
+        parse=parse_content_response,
+        db=db,
+        user_id=user['id']
+    )
+    
+    # تُخزَّن النتيجة تحت مفتاح المسار الذي أنتجها فعلاً؛ نتيجة مسار بديل
+    # لا تُقدَّم لطلب لاحق للنموذج المطلوب
+    if use_cache:
+        await generation_cache.put(
+            db,
+            generation_cache_key(topic, video_length, route.provider, route.model, GENERATION_PROMPT_VERSION),
+            content_data,
+            topic=topic,
+            video_length=video_length,
+            provider=route.provider,
+            model=route.model,
+            prompt_version=GENERATION_PROMPT_VERSION
+        )
+    return content_data
+
+async def mark_video_failed(db, video_id: str, error: str):
+    await set_video_status(db, video_id, "failed", error=error)
+
+async def generate_video_with_ai(db, video_id: str):
+    """
+    إنشاء الفيديو. الأخطاء غير المتوقعة تُرفع حتى يعيد الطابور المحاولة،
+    وتُعلَّم الحالة failed عند نفاد المحاولات (انظر on_generate_video_dead)
+    """
+    video = await db.videos.find_one({"id": video_id}, {"_id": 0})
+    if not video:
+        logger.error(f"Video {video_id} not found")
+        return
+    
+    await set_video_status(db, video_id, "processing")
+    
+    user = await db.users.find_one({"id": video['user_id']}, {"_id": 0})
+    kie_key = (await credential_resolver.get(user, 'kie_ai')).get('api_key') or os.getenv('KIE_AI_API_KEY')
+    
+    if not kie_key:
+        await mark_video_failed(db, video_id, "لم يتم العثور على مفتاح Kie.ai API")
+        return
+    
+    video_url = f"https://generated-video-{video_id[:8]}.mp4"
+    thumbnail_url = f"https://thumbnail-{video_id[:8]}.jpg"
+    
+    await set_video_status(db, video_id, "completed", video_url=video_url, thumbnail_url=thumbnail_url)
+    
+    logger.info(f"Video {video_id} generated successfully")
+
+async def generate_video_content_job(db, video_id: str):
+    """توليد محتوى الفيديو (العنوان والسكريبت...) خارج مسار الطلب ثم بدء إنشاء الفيديو"""
+    video = await db.videos.find_one({"id": video_id}, {"_id": 0})
+    if not video:
+        logger.error(f"Video {video_id} not found")
+        return
+    
+    if video.get('script') is None:
+        user = await db.users.find_one({"id": video['user_id']}, {"_id": 0})
+        content_data = await generate_video_content(
+            db,
+            video['topic'],
+            video['video_length'],
+            user,
+            use_cache=video.get('use_generation_cache', True),
+            provider=video.get('content_provider'),
+            model=video.get('selected_model')
+        )
+        
+        await db.videos.update_one(
+            {"id": video_id},
+            {"$set": {
+                "title": content_data.get('title', ''),
+                "description": content_data.get('description', ''),
+                "hashtags": content_data.get('hashtags', []),
+                "script": content_data.get('script', '')
+            }}
+        )
+    
+    await generate_video_with_ai(db, video_id)
+
+def video_from_create(video_create: VideoCreate, user_id: str) -> Video:
+    scheduled_time = None
+    if video_create.scheduled_time:
+        scheduled_time = datetime.fromisoformat(video_create.scheduled_time.replace('Z', '+00:00'))
+    
+    return Video(
+        user_id=user_id,
+        topic=video_create.topic,
+        title=video_create.topic,
+        description="",
+        hashtags=[],
+        dimensions=video_create.dimensions,
+        video_length=video_create.video_length,
+        voice=video_create.voice,
+        background_music=video_create.background_music,
+        character_image_url=video_create.character_image_url,
+        ai_generator=video_create.ai_generator,
+        schedule_type=video_create.schedule_type,
+        scheduled_time=scheduled_time,
+        content_provider=video_create.content_provider,
+        selected_model=video_create.selected_model,
+        use_generation_cache=video_create.use_generation_cache
+    )
+
+async def insert_video(db, video: Video) -> dict:
+    """حفظ الفيديو بحالة pending دون إضافة مهمة"""
+    video_dict = video.model_dump()
+    if video.scheduled_time:
+        video_dict['publish_state'] = PUBLISH_SCHEDULED
+    
+    # insert_one يضيف _id إلى الـ dict، لذا نمرر نسخة
+    await db.videos.insert_one(dict(video_dict))
+    await record_video_inserted(db, video_dict)
+    return video_dict
+
+async def submit_video(db, video: Video) -> dict:
+    """حفظ الفيديو بحالة pending وإضافة مهمة إنشائه إلى الطابور"""
+    video_dict = await insert_video(db, video)
+    await enqueue(db, GENERATE_VIDEO_JOB, {"video_id": video.id})
+    return video_dict
+
+async def handle_generate_video(db, job: dict):
+    await generate_video_content_job(db, job['payload']['video_id'])
+
+async def on_generate_video_dead(db, job: dict):
+    await mark_video_failed(db, job['payload']['video_id'], job.get('last_error') or "فشل إنشاء الفيديو")
@@ -0,0 +1,70 @@
+"""
+نقطة دخول عامل طابور المهام (منفصل عن عمليات API)
+
+التشغيل:
+    python worker.py --concurrency 4
+"""
+import os
+import asyncio
+import argparse
+import logging
+import signal
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent
+if __name__ == "__main__":
+    # تُقرأ إعدادات الوحدات التالية عند استيرادها، لذا يُحمَّل .env قبلها؛
+    # أما عند استيراد worker من server فلا آثار جانبية
+    load_dotenv(ROOT_DIR / '.env')
+
+from job_queue import JobWorker
+from indexes import ensure_indexes
+from video_pipeline import GENERATE_VIDEO_JOB, handle_generate_video, on_generate_video_dead
+from publish_dispatcher import PUBLISH_VIDEO_JOB, handle_publish_video, on_publish_video_dead
+from batch_generation import GENERATE_BATCH_JOB, handle_generate_batch, on_generate_batch_dead
+
+logger = logging.getLogger("worker")
+
+def build_worker(db, concurrency: int) -> JobWorker:
+    """إنشاء عامل مسجل عليه جميع أنواع المهام"""
+    worker = JobWorker(db, concurrency=concurrency)
+    worker.register(GENERATE_VIDEO_JOB, handle_generate_video, on_dead=on_generate_video_dead)
+    worker.register(PUBLISH_VIDEO_JOB, handle_publish_video, on_dead=on_publish_video_dead)
+    worker.register(GENERATE_BATCH_JOB, handle_generate_batch, on_dead=on_generate_batch_dead)
+    return worker
+
+async def main(concurrency: int):
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    await ensure_indexes(db)
+    
+    worker = build_worker(db, concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.ensure_future(worker.stop()))
+    
+    logger.info(f"Worker {worker.worker_id} started with concurrency={concurrency}")
+    try:
+        await worker.run_forever()
+    finally:
+        client.close()
+        logger.info(f"Worker {worker.worker_id} stopped")
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    parser = argparse.ArgumentParser(description="YouAI job worker")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(os.environ.get('JOB_WORKER_CONCURRENCY', 4)),
+        help="عدد المهام المتزامنة"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
@@ -9,6 +9,8 @@ export default function Videos() {
   const [videos, setVideos] = useState([]);
   const [loading, setLoading] = useState(true);
   const [deletingId, setDeletingId] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadVideos();
@@ -17,7 +19,8 @@ export default function Videos() {
   const loadVideos = async () => {
     try {
       const response = await api.videos.getAll();
-      setVideos(response.data);
+      setVideos(response.data.items);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       toast.error('فشل تحميل الفيديوهات');
     } finally {
@@ -25,6 +28,23 @@ export default function Videos() {
     }
   };
 
+  const loadMoreVideos = async () => {
+    if (!nextCursor) {
+      return;
+    }
+
+    setLoadingMore(true);
+    try {
+      const response = await api.videos.getAll(nextCursor);
+      setVideos(prev => [...prev, ...response.data.items]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error('فشل تحميل الفيديوهات');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleDelete = async (videoId) => {
     if (!window.confirm('هل أنت متأكد من حذف هذا الفيديو؟')) {
       return;
@@ -148,6 +168,19 @@ export default function Videos() {
               </CardContent>
             </Card>
           ))}
+          {nextCursor && (
+            <div className="flex justify-center">
+              <Button
+                onClick={loadMoreVideos}
+                disabled={loadingMore}
+                variant="outline"
+                className="border-zinc-700 text-zinc-300 hover:border-orange-500 font-cairo"
+                data-testid="load-more-videos"
+              >
+                {loadingMore ? 'جاري التحميل...' : 'تحميل المزيد'}
+              </Button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -10,8 +10,11 @@ export const api = {
   },
   videos: {
     create: (data) => axios.post(`${API}/videos/create`, data),
-    getAll: () => axios.get(`${API}/videos`),
+    createBatch: (items) => axios.post(`${API}/videos/batch`, { items }),
+    getBatch: (id) => axios.get(`${API}/videos/batch/${id}`),
+    getAll: (cursor = null, limit = 20) => axios.get(`${API}/videos`, { params: { limit, ...(cursor ? { cursor } : {}) } }),
     getOne: (id) => axios.get(`${API}/videos/${id}`),
+    export: (format = 'ndjson') => axios.get(`${API}/videos/export?format=${format}`, { responseType: 'blob' }),
     delete: (id) => axios.delete(`${API}/videos/${id}`)
   },
   settings: {
@@ -28,10 +31,10 @@ export const api = {
     search: (keyword) => axios.get(`${API}/trends/search?keyword=${encodeURIComponent(keyword)}`)
   },
   campaigns: {
-    getAll: () => axios.get(`${API}/campaigns`)
+    getAll: (cursor = null, limit = 20) => axios.get(`${API}/campaigns`, { params: { limit, ...(cursor ? { cursor } : {}) } })
   },
   providers: {
-    getModels: (provider) => axios.get(`${API}/providers/models?provider=${provider}`),
+    getModels: (provider, params = {}) => axios.get(`${API}/providers/models`, { params: { provider, ...params } }),
     getPurposes: () => axios.get(`${API}/providers/purposes`)
   }
 };
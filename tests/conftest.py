@@ -0,0 +1,48 @@
+import os
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# وحدات الخادم تُستورد باسمها المباشر (from models import ...) كما في backend/
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+MONGO_URL = os.environ.get('TEST_MONGO_URL', 'mongodb://localhost:27017')
+TEST_DB_NAME = os.environ.get('TEST_DB_NAME', 'youai_test')
+
+def run(coro):
+    return asyncio.run(coro)
+
+@pytest.fixture
+def mongo_db():
+    """قاعدة بيانات اختبار على mongod محلي؛ يُتخطى الاختبار إذا لم يكن متاحاً"""
+    motor_asyncio = pytest.importorskip("motor.motor_asyncio")
+    
+    async def _connect():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            client.close()
+            return None
+        await client.drop_database(TEST_DB_NAME)
+        client.close()
+        return True
+    
+    if run(_connect()) is None:
+        pytest.skip(f"No mongod reachable at {MONGO_URL}")
+    
+    # عميل Motor مرتبط بحلقة الأحداث، لذا يُنشأ داخل كل asyncio.run عبر هذه الدالة
+    def open_db():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL)
+        return client, client[TEST_DB_NAME]
+    
+    yield open_db
+    
+    async def _drop():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL)
+        await client.drop_database(TEST_DB_NAME)
+        client.close()
+    run(_drop())
@@ -0,0 +1,44 @@
+"""
+دورات التجميع المتداخلة: واحدة فقط تحمل العقد ولا تحذف دلاء الأخرى
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from tests.conftest import run
+from analytics_rollups import build_rollups, get_analytics_overview
+
+def _video(index, published_at):
+    return {
+        "id": f"video-{index}",
+        "user_id": "user-1",
+        "status": "published",
+        "published_at": published_at,
+        "analytics": {"views": 100, "likes": 10, "comments": 5, "watch_time_minutes": 60}
+    }
+
+def test_overlapping_builds_do_not_remove_each_other(mongo_db):
+    now = datetime.now(timezone.utc)
+    
+    async def scenario():
+        client, db = mongo_db()
+        try:
+            await db.videos.insert_many([_video(i, now - timedelta(days=i)) for i in range(3)])
+            results = await asyncio.gather(build_rollups(db), build_rollups(db, full=True))
+            overview = await get_analytics_overview(db, "user-1", None, now + timedelta(days=1), "day")
+            state = await db.rollup_state.find_one({"_id": "analytics"})
+            # بعد انتهاء الدورة يُحرَّر العقد فتعمل التالية
+            again = await build_rollups(db)
+            return results, overview, state, again
+        finally:
+            client.close()
+    
+    results, overview, state, again = run(scenario())
+    assert sorted(results) == [False, True]
+    assert overview["total_views"] == 300
+    assert len(overview["videos_timeline"]) == 3
+    assert state["lease_until"] is None
+    assert again is True
@@ -0,0 +1,93 @@
+"""
+بث /chat/test ضد مزود وهمي (httpx.MockTransport) لـ Gemini وOpenRouter
+"""
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from tests.conftest import run
+from chat_stream import stream_chat_events, stream_gemini, stream_openrouter
+
+BASE_URL = "http://fake-upstream"
+CHUNKS = ["مرحباً", "، كيف ", "يمكنني مساعدتك؟"]
+
+def _sse_body(events, done_marker=False):
+    async def _body():
+        yield b": OPENROUTER PROCESSING\n\n"
+        for event in events:
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8')
+        if done_marker:
+            yield b"data: [DONE]\n\n"
+    return _body()
+
+def gemini_handler(request):
+    assert request.url.path.endswith(":streamGenerateContent")
+    assert request.url.params["alt"] == "sse"
+    events = [{"candidates": [{"content": {"parts": [{"text": text}]}}]} for text in CHUNKS]
+    return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=_sse_body(events))
+
+def openrouter_handler(request):
+    assert json.loads(request.content)["stream"] is True
+    events = [{"choices": [{"delta": {"content": text}}]} for text in CHUNKS]
+    return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=_sse_body(events, done_marker=True))
+
+def _parse(raw: bytes):
+    lines = raw.decode('utf-8').strip().split("\n")
+    return lines[0][len("event: "):], json.loads(lines[1][len("data: "):])
+
+async def _collect(handler, stream_fn, provider):
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        tokens = stream_fn(client, "fake-key", "fake-model", "مرحبا", base_url=BASE_URL)
+        return [_parse(event) async for event in stream_chat_events(tokens, provider, "fake-model")]
+
+@pytest.mark.parametrize("handler, stream_fn, provider", [
+    (gemini_handler, stream_gemini, "gemini"),
+    (openrouter_handler, stream_openrouter, "openrouter"),
+])
+def test_stream_emits_tokens_then_done(handler, stream_fn, provider):
+    events = run(_collect(handler, stream_fn, provider))
+    
+    assert [name for name, _ in events] == ["token"] * len(CHUNKS) + ["done"]
+    assert events[0] == ("token", {"text": CHUNKS[0]})
+    assert events[-1][1] == {
+        "success": True,
+        "response": "".join(CHUNKS),
+        "provider": provider,
+        "model": "fake-model"
+    }
+
+def test_upstream_http_error_emits_error_event():
+    def handler(request):
+        return httpx.Response(401, json={"error": {"message": "Invalid API key"}})
+    
+    events = run(_collect(handler, stream_openrouter, "openrouter"))
+    
+    assert [name for name, _ in events] == ["error"]
+    assert events[0][1]["success"] is False
+    assert events[0][1]["error"] == "api_error"
+    assert "Invalid API key" in events[0][1]["response"]
+
+def test_failure_mid_stream_keeps_tokens_and_ends_with_error():
+    def handler(request):
+        async def _body():
+            yield b'data: {"choices": [{"delta": {"content": "\\u0623\\u0648\\u0644"}}]}\n\n'
+            yield b"data: {not json\n\n"
+        return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=_body())
+    
+    events = run(_collect(handler, stream_openrouter, "openrouter"))
+    
+    assert [name for name, _ in events] == ["token", "error"]
+    assert events[0][1] == {"text": "أول"}
+
+def test_unexpected_exception_still_emits_error_event():
+    async def tokens():
+        yield "جزء"
+        raise KeyError("candidates")
+    
+    async def _events():
+        return [_parse(event) async for event in stream_chat_events(tokens(), "gemini", "fake-model")]
+    
+    events = run(_events())
+    assert [name for name, _ in events] == ["token", "error"]
@@ -0,0 +1,57 @@
+"""
+JobWorker يستمر في الحلقة عند فشل تسجيل نتيجة المهمة (complete / fail / on_dead)
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+import job_queue
+from job_queue import JobWorker
+from tests.conftest import run
+
+def _job(job_id):
+    return {"id": job_id, "type": "demo", "attempts": 1, "max_attempts": 1}
+
+async def _raise(*args, **kwargs):
+    raise RuntimeError("transient mongo error")
+
+async def _run_until_claimed(monkeypatch, jobs, handler, on_dead=None):
+    claimed = []
+    queue = list(jobs)
+
+    async def fake_claim(db, worker_id, job_types, lease_seconds=None):
+        claimed.append(queue[0]['id'] if queue else None)
+        if not queue:
+            worker._stopping.set()
+            return None
+        return queue.pop(0)
+
+    monkeypatch.setattr(job_queue, "claim", fake_claim)
+    monkeypatch.setattr(job_queue, "JOB_POLL_INTERVAL_SECONDS", 0)
+    worker = JobWorker(db=None)
+    worker.register("demo", handler, on_dead=on_dead)
+    worker.start()
+    await asyncio.wait_for(asyncio.gather(*worker._tasks), timeout=5)
+    return claimed
+
+async def _succeed(db, job):
+    return None
+
+def test_worker_survives_complete_error(monkeypatch):
+    monkeypatch.setattr(job_queue, "complete", _raise)
+    claimed = run(_run_until_claimed(monkeypatch, [_job("a"), _job("b")], _succeed))
+    assert claimed == ["a", "b", None]
+
+def test_worker_survives_fail_and_on_dead_errors(monkeypatch):
+    async def dead(db, job, worker_id, error):
+        return True
+
+    monkeypatch.setattr(job_queue, "fail", dead)
+    claimed = run(_run_until_claimed(monkeypatch, [_job("a"), _job("b")], _raise, on_dead=_raise))
+    assert claimed == ["a", "b", None]
+
+    monkeypatch.setattr(job_queue, "fail", _raise)
+    claimed = run(_run_until_claimed(monkeypatch, [_job("c")], _raise))
+    assert claimed == ["c", None]
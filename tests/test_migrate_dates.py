@@ -0,0 +1,35 @@
+"""
+ترحيل التواريخ النصية في الخلفية: مرة واحدة لكل قاعدة بيانات وبعملية واحدة
+"""
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from tests.conftest import run
+from migrate_dates import MIGRATION_ID, ensure_dates_migrated
+
+def test_migration_runs_once_across_concurrent_callers(mongo_db):
+    async def scenario():
+        client, db = mongo_db()
+        try:
+            await db.videos.insert_many([
+                {"id": "legacy", "created_at": "2024-01-02T03:04:05+00:00"},
+                {"id": "native", "created_at": datetime(2024, 1, 3)},
+            ])
+            results = await asyncio.gather(ensure_dates_migrated(db), ensure_dates_migrated(db))
+            legacy = await db.videos.find_one({"id": "legacy"})
+            marker = await db.migrations.find_one({"_id": MIGRATION_ID})
+            again = await ensure_dates_migrated(db)
+            return results, legacy, marker, again
+        finally:
+            client.close()
+    
+    results, legacy, marker, again = run(scenario())
+    assert [result for result in results if result is not None] == [{"users": 0, "videos": 1, "campaigns": 0}]
+    assert legacy['created_at'] == datetime(2024, 1, 2, 3, 4, 5)
+    assert marker['completed_at'] is not None
+    assert marker['lease_until'] is None
+    assert again is None
@@ -0,0 +1,181 @@
+"""
+فهرس نماذج OpenRouter: التحديث الشرطي (304 وعدم تغير المحتوى) والتصفية والترقيم
+"""
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from tests.conftest import run
+from model_catalog import MODEL_CATALOG_DOC_ID, ModelCatalog, compact_model
+
+BASE_URL = "http://fake-upstream"
+
+RAW_MODELS = [
+    {
+        "id": "acme/large",
+        "name": "Acme Large",
+        "description": "Long context flagship",
+        "context_length": 200000,
+        "created": 300,
+        "pricing": {"prompt": "0.000003", "completion": "0.000015"},
+        "architecture": {"input_modalities": ["text", "image"], "output_modalities": ["text"]},
+    },
+    {
+        "id": "acme/small",
+        "name": "Acme Small",
+        "description": "Cheap and fast",
+        "context_length": 32000,
+        "created": 200,
+        "pricing": {"prompt": "0.0000002", "completion": "0.0000004"},
+        "architecture": {"input_modalities": ["text"], "output_modalities": ["text"]},
+    },
+    {
+        "id": "open/free-chat",
+        "name": "Open Free Chat",
+        "description": "Community model",
+        "context_length": 8000,
+        "created": 100,
+        "pricing": {"prompt": "0", "completion": "0"},
+        "architecture": {"input_modalities": ["text"], "output_modalities": ["text"]},
+    },
+    {
+        "id": "beta/vision",
+        "name": "Beta Vision",
+        "description": "Image understanding",
+        "context_length": None,
+        "created": 400,
+        "pricing": {},
+        "architecture": {"input_modalities": ["image"], "output_modalities": ["text"]},
+    },
+]
+
+class FakeCollection:
+    """مستند واحد في الذاكرة؛ يكفي لما يستدعيه ModelCatalog"""
+
+    def __init__(self):
+        self.docs = {}
+        self.updates = 0
+        self.replaces = 0
+
+    async def find_one(self, query):
+        return self.docs.get(query["_id"])
+
+    async def update_one(self, query, update):
+        self.updates += 1
+        if query["_id"] in self.docs:
+            self.docs[query["_id"]].update(update["$set"])
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.replaces += 1
+        self.docs[query["_id"]] = {"_id": query["_id"], **doc}
+
+class FakeDB:
+    def __init__(self):
+        self.model_catalog = FakeCollection()
+
+def _upstream(etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT", honour_conditional=True):
+    requests = []
+    body = json.dumps({"data": RAW_MODELS}).encode()
+
+    def handler(request):
+        requests.append(request)
+        if honour_conditional and request.headers.get("if-none-match") == etag:
+            return httpx.Response(304)
+        headers = {"last-modified": last_modified}
+        if etag:
+            headers["etag"] = etag
+        return httpx.Response(200, content=body, headers=headers)
+
+    return httpx.MockTransport(handler), requests
+
+def _refresh_twice(transport):
+    catalog = ModelCatalog(base_url=BASE_URL)
+    db = FakeDB()
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=transport) as client:
+            first = await catalog.refresh(db, client)
+            second = await catalog.refresh(db, client)
+        return first, second
+
+    first, second = run(scenario())
+    return catalog, db, first, second
+
+def test_refresh_sends_conditional_headers_and_handles_304():
+    transport, requests = _upstream()
+    catalog, db, first, second = _refresh_twice(transport)
+
+    assert (first, second) == (True, False)
+    assert requests[1].headers["if-none-match"] == '"v1"'
+    assert requests[1].headers["if-modified-since"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+    assert catalog.refreshes == 1
+    assert catalog.not_modified == 1
+    assert [model['id'] for model in catalog.models] == [model['id'] for model in RAW_MODELS]
+    assert db.model_catalog.replaces == 1
+    assert db.model_catalog.updates == 1
+    assert db.model_catalog.docs[MODEL_CATALOG_DOC_ID]["etag"] == '"v1"'
+
+def test_refresh_skips_reindex_when_content_hash_unchanged():
+    # بدون ETag يعيد المزود 200 بنفس المحتوى في كل مرة
+    transport, requests = _upstream(etag=None, honour_conditional=False)
+    catalog, db, first, second = _refresh_twice(transport)
+
+    assert (first, second) == (True, False)
+    assert "if-none-match" not in requests[1].headers
+    assert catalog.refreshes == 1
+    assert catalog.not_modified == 1
+    assert len(catalog.models) == len(RAW_MODELS)
+    assert db.model_catalog.replaces == 1
+    assert db.model_catalog.updates == 1
+
+def test_load_restores_saved_catalog():
+    transport, _ = _upstream()
+    _, db, _, _ = _refresh_twice(transport)
+
+    restored = ModelCatalog(base_url=BASE_URL)
+    run(restored.load(db))
+    assert restored.etag == '"v1"'
+    assert restored.query(search="vision")["total"] == 1
+
+@pytest.fixture
+def catalog():
+    catalog = ModelCatalog(base_url=BASE_URL)
+    catalog._index([compact_model(model) for model in RAW_MODELS])
+    return catalog
+
+def _ids(result):
+    return [model['id'] for model in result["models"]]
+
+def test_query_search_matches_all_terms(catalog):
+    assert _ids(catalog.query(search="acme")) == ["acme/large", "acme/small"]
+    assert _ids(catalog.query(search="ACME cheap")) == ["acme/small"]
+    assert catalog.query(search="missing")["total"] == 0
+
+def test_query_filters(catalog):
+    assert _ids(catalog.query(min_context=32000)) == ["acme/large", "acme/small"]
+    # نموذج بلا سعر معروف لا يمر من فلتر السعر
+    assert _ids(catalog.query(max_prompt_price=0.000001)) == ["acme/small", "open/free-chat"]
+    assert _ids(catalog.query(free=True)) == ["open/free-chat"]
+    assert _ids(catalog.query(modality="image")) == ["acme/large", "beta/vision"]
+
+def test_query_sort(catalog):
+    assert _ids(catalog.query(sort="name")) == ["acme/large", "acme/small", "beta/vision", "open/free-chat"]
+    assert _ids(catalog.query(sort="context_length"))[:3] == ["acme/large", "acme/small", "open/free-chat"]
+    assert _ids(catalog.query(sort="price")) == ["open/free-chat", "acme/small", "acme/large", "beta/vision"]
+    assert _ids(catalog.query(sort="newest")) == ["beta/vision", "acme/large", "acme/small", "open/free-chat"]
+
+def test_query_rejects_unknown_sort(catalog):
+    with pytest.raises(ValueError):
+        catalog.query(sort="popularity")
+
+def test_query_pagination(catalog):
+    first = catalog.query(offset=0, limit=3)
+    assert first["total"] == 4
+    assert first["next_offset"] == 3
+    assert len(first["models"]) == 3
+
+    last = catalog.query(offset=first["next_offset"], limit=3)
+    assert _ids(last) == ["open/free-chat"]
+    assert last["next_offset"] is None
@@ -0,0 +1,35 @@
+"""
+طلبات التحوّط في ProviderRouter: الطلب الملغى يبقى في نافذة الزمن
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("emergentintegrations")
+
+from tests.conftest import run
+from provider_router import ProviderRouter, Route
+
+KEYS = {"gemini": "gemini-key", "openrouter": "openrouter-key"}
+
+def test_cancelled_primary_is_recorded_as_latency_sample():
+    router = ProviderRouter(hedge_min_samples=5, fallback_enabled=True)
+    primary = Route("gemini", "gemini-2.5-flash")
+    for _ in range(5):
+        router.stats_for(primary).record(0.01, ok=True)
+
+    async def fake_call(route, api_key, *args):
+        if route.provider == "gemini":
+            await asyncio.sleep(5)
+        return "hedged"
+
+    router._call = fake_call
+    result, route = run(router.generate("gemini", "gemini-2.5-flash", KEYS, "system", "prompt", session_id="s"))
+
+    assert (result, route.provider) == ("hedged", "openrouter")
+    assert router.hedge_wins == 1
+    stats = router.stats_for(primary)
+    assert len(stats.latencies) == 6
+    assert max(stats.latencies) >= 0.01
+    # الإلغاء ليس فشلاً للمسار
+    assert stats.error_rate == 0.0
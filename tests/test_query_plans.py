@@ -0,0 +1,51 @@
+"""
+التحقق عبر explain() من أن استعلامات الـ endpoints والمهام الدورية تستخدم الفهارس
+(بدون COLLSCAN أو SORT في الذاكرة). يتطلب mongod محلياً:
+    TEST_MONGO_URL=mongodb://localhost:27017 pytest tests/test_query_plans.py
+"""
+import pytest
+
+pytest.importorskip("pymongo")
+
+from tests.conftest import run
+from indexes import ENDPOINT_QUERIES, INDEXES, ensure_indexes, explain_query, find_bad_stages
+
+def test_find_bad_stages_walks_nested_plans():
+    plan = {
+        "stage": "FETCH",
+        "inputStage": {
+            "stage": "OR",
+            "inputStages": [
+                {"stage": "IXSCAN"},
+                {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+            ]
+        }
+    }
+    assert find_bad_stages(plan) == ["SORT", "COLLSCAN"]
+    assert find_bad_stages({"stage": "SORT_MERGE", "inputStages": [{"stage": "IXSCAN"}]}) == []
+
+def test_ensure_indexes_creates_every_collection(mongo_db):
+    async def _check():
+        client, db = mongo_db()
+        try:
+            return await ensure_indexes(db)
+        finally:
+            client.close()
+    
+    ensured = run(_check())
+    assert set(ensured) == set(INDEXES)
+
+@pytest.mark.parametrize("query", ENDPOINT_QUERIES, ids=[query['name'] for query in ENDPOINT_QUERIES])
+def test_endpoint_query_uses_index(mongo_db, query):
+    async def _explain():
+        client, db = mongo_db()
+        try:
+            await ensure_indexes(db)
+            # مستند واحد على الأقل حتى لا تكون الخطة EOF لمجموعة غير موجودة
+            await db[query['collection']].insert_one({"explain_seed": True})
+            return await explain_query(db, query)
+        finally:
+            client.close()
+    
+    plan = run(_explain())
+    assert find_bad_stages(plan) == [], f"{query['name']}: {plan}"
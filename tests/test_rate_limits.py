@@ -0,0 +1,154 @@
+"""
+اختبارات دلاء التحديد: الإعداد، انتظار الرصيد في acquire، وتحديث الدلو في MongoDB
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+import rate_limits
+from pymongo.errors import DuplicateKeyError
+from rate_limits import BucketConfig, QuotaExceeded, QuotaTracker, RateLimiter, RateLimitExceeded, _bucket_config
+from tests.conftest import run
+
+@pytest.mark.parametrize("env", [
+    {"GEMINI_RATE_LIMIT_PER_MINUTE": "0"},
+    {"GEMINI_RATE_LIMIT_BURST": "0"},
+    {"GEMINI_RATE_LIMIT_PER_MINUTE": "-5"},
+])
+def test_bucket_config_rejects_non_positive_values(monkeypatch, env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    with pytest.raises(ValueError, match="GEMINI_RATE_LIMIT"):
+        _bucket_config("gemini", burst=60, per_minute=30)
+
+def test_bucket_config_reads_environment(monkeypatch):
+    monkeypatch.setenv("YOUTUBE_RATE_LIMIT_BURST", "5")
+    monkeypatch.setenv("YOUTUBE_RATE_LIMIT_PER_MINUTE", "120")
+    assert _bucket_config("youtube", burst=20, per_minute=10) == BucketConfig(capacity=5.0, refill_per_second=2.0)
+
+class ScriptedLimiter(RateLimiter):
+    """يرفض أول محاولات ثم يسمح؛ يكفي لاختبار منطق الانتظار دون Mongo"""
+
+    def __init__(self, rejections: int, retry_after: float):
+        super().__init__({}, enabled=True)
+        self.rejections = rejections
+        self.retry_after = retry_after
+        self.calls = 0
+
+    async def consume(self, db, user_id, provider, cost=1):
+        self.calls += 1
+        if self.calls <= self.rejections:
+            raise RateLimitExceeded("limited", self.retry_after)
+        return 0.0
+
+def test_acquire_waits_for_refill(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(rate_limits.asyncio, "sleep", fake_sleep)
+    limiter = ScriptedLimiter(rejections=2, retry_after=0.5)
+    run(limiter.acquire(None, "user-1", "gemini", max_wait=10))
+    assert limiter.calls == 3
+    assert sleeps == [0.5, 0.5]
+
+def test_acquire_gives_up_past_deadline():
+    limiter = ScriptedLimiter(rejections=1, retry_after=30)
+    with pytest.raises(RateLimitExceeded):
+        run(limiter.acquire(None, "user-1", "gemini", max_wait=1))
+    assert limiter.calls == 1
+
+# دلو سعته 3 ويمتلئ بمعدل رمز كل ثانيتين
+TEST_BUCKET = BucketConfig(capacity=3, refill_per_second=0.5)
+
+def _with_db(mongo_db, scenario):
+    async def _run():
+        client, db = mongo_db()
+        try:
+            return await scenario(db)
+        finally:
+            client.close()
+    return run(_run())
+
+def test_bucket_drains_then_refills(mongo_db):
+    limiter = RateLimiter({"gemini": TEST_BUCKET}, enabled=True)
+    
+    async def scenario(db):
+        remaining = [await limiter.consume(db, "user-1", "gemini") for _ in range(3)]
+        with pytest.raises(RateLimitExceeded) as exc:
+            await limiter.consume(db, "user-1", "gemini")
+        rejected = await db.rate_limits.find_one({"_id": "gemini:user-1"})
+        
+        # إرجاع آخر تحديث 3 ثوانٍ: 1.5 رمز، فيكفي لطلب واحد فقط
+        await db.rate_limits.update_one(
+            {"_id": "gemini:user-1"},
+            {"$set": {"updated_at": rejected['updated_at'] - timedelta(seconds=3)}}
+        )
+        after_refill = await limiter.consume(db, "user-1", "gemini")
+        with pytest.raises(RateLimitExceeded):
+            await limiter.consume(db, "user-1", "gemini")
+        other_user = await limiter.consume(db, "user-2", "gemini")
+        return remaining, exc.value.retry_after, rejected, after_refill, other_user
+    
+    remaining, retry_after, rejected, after_refill, other_user = _with_db(mongo_db, scenario)
+    assert remaining == pytest.approx([2, 1, 0], abs=0.05)
+    assert 0 < retry_after <= 2
+    assert rejected['expires_at'] > datetime.now(timezone.utc).replace(tzinfo=None)
+    assert after_refill == pytest.approx(0.5, abs=0.05)
+    assert other_user == pytest.approx(2, abs=0.05)
+
+def test_bucket_allows_exactly_capacity_under_concurrency(mongo_db):
+    limiter = RateLimiter({"gemini": TEST_BUCKET}, enabled=True)
+    
+    async def attempt(db):
+        try:
+            await limiter.consume(db, "user-1", "gemini")
+            return True
+        except RateLimitExceeded:
+            return False
+    
+    async def scenario(db):
+        return await asyncio.gather(*(attempt(db) for _ in range(10)))
+    
+    assert sum(_with_db(mongo_db, scenario)) == 3
+
+class RacingCollection:
+    """يحاكي upsert متزامناً: طلب آخر أنشأ المستند أولاً فيفشل upsert هذا الطلب"""
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    async def find_one_and_update(self, query, update, upsert=False, **kwargs):
+        if upsert:
+            await self.collection.find_one_and_update(query, update, upsert=True, **kwargs)
+            raise DuplicateKeyError("E11000 duplicate key error")
+        return await self.collection.find_one_and_update(query, update, **kwargs)
+    
+    async def update_one(self, *args, **kwargs):
+        return await self.collection.update_one(*args, **kwargs)
+
+class RacingDB:
+    def __init__(self, db):
+        self.rate_limits = RacingCollection(db.rate_limits)
+        self.quota_usage = RacingCollection(db.quota_usage)
+
+def test_duplicate_key_upsert_retries_against_existing_document(mongo_db):
+    limiter = RateLimiter({"gemini": TEST_BUCKET}, enabled=True)
+    quota = QuotaTracker("youtube", {"search.list": 100}, daily_budget=250, user_daily_budget=1000)
+    
+    async def scenario(db):
+        racing = RacingDB(db)
+        # الطلب "المنافس" خصم رمزاً، ثم أعاد هذا الطلب المحاولة على المستند الموجود
+        remaining = await limiter.consume(racing, "user-1", "gemini")
+        units = await quota.consume(racing, "key", "search.list")
+        with pytest.raises(QuotaExceeded):
+            await quota.consume(db, "key", "search.list")
+        return remaining, units
+    
+    remaining, units = _with_db(mongo_db, scenario)
+    assert remaining == pytest.approx(1, abs=0.05)
+    assert units == 100
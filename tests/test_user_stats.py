@@ -0,0 +1,62 @@
+"""
+مطابقة عدادات لوحة التحكم: لا تطغى على $inc متزامن، وعملية واحدة تطابق في كل دورة
+"""
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+import user_stats
+from tests.conftest import run
+from user_stats import apply_stats_delta, reconcile_all_user_stats, reconcile_user_stats
+
+def _with_db(mongo_db, scenario):
+    async def _run():
+        client, db = mongo_db()
+        try:
+            return await scenario(db)
+        finally:
+            client.close()
+    return run(_run())
+
+def test_reconcile_retries_when_a_delta_lands_during_the_aggregate(mongo_db, monkeypatch):
+    compute = user_stats.compute_dashboard_stats
+    calls = []
+    
+    async def racing_compute(db, user_id):
+        stats = await compute(db, user_id)
+        if not calls:
+            # فيديو جديد وصل بعد أن قرأ التجميع المجموعة
+            await db.videos.insert_one({"id": "v2", "user_id": user_id, "status": "pending"})
+            await apply_stats_delta(db, user_id, {"total_videos": 1, "pending_videos": 1})
+        calls.append(stats)
+        return stats
+    
+    async def scenario(db):
+        await db.videos.insert_one({"id": "v1", "user_id": "user-1", "status": "published", "analytics": {"views": 5}})
+        await reconcile_user_stats(db, "user-1")
+        monkeypatch.setattr(user_stats, "compute_dashboard_stats", racing_compute)
+        await reconcile_user_stats(db, "user-1")
+        return await db.user_stats.find_one({"_id": "user-1"})
+    
+    doc = _with_db(mongo_db, scenario)
+    assert len(calls) == 2
+    assert doc['total_videos'] == 2
+    assert doc['pending_videos'] == 1
+    assert doc['published_videos'] == 1
+    assert doc['total_views'] == 5
+
+def test_reconcile_all_runs_in_one_process_per_interval(mongo_db):
+    async def scenario(db):
+        await db.users.insert_many([{"id": "user-1"}, {"id": "user-2"}])
+        concurrent = await asyncio.gather(reconcile_all_user_stats(db), reconcile_all_user_stats(db))
+        too_soon = await reconcile_all_user_stats(db, min_interval=timedelta(hours=1))
+        due = await reconcile_all_user_stats(db)
+        return concurrent, too_soon, due
+    
+    concurrent, too_soon, due = _with_db(mongo_db, scenario)
+    assert sorted(concurrent, key=lambda count: count or 0) == [None, 2]
+    assert too_soon is None
+    assert due == 2